@@ -0,0 +1,256 @@
+import streamlit as st
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+import numpy as np
+from dataclasses import dataclass, field
+from liquidity import LIQUIDATION_TARGETS, MAX_DAYS_DISPLAY, build_liquidity_table, select_liquidity
+from formatting import BRL_FORMAT, INTEGER_FORMAT, PERCENT_FORMAT, RATIO_FORMAT, millions_format
+
+# Quantidade de análises (combinações de carteira e cotações) mantidas em cache
+ANALYSIS_CACHE_ENTRIES = 32
+
+# Formatação das tabelas exibidas (aplicada só na renderização, ver formatting.style_table)
+VALUATION_FORMATS = {
+    'Quantidade': INTEGER_FORMAT,
+    'Preço': BRL_FORMAT,
+    'Valor Total': BRL_FORMAT,
+    'Peso (%)': PERCENT_FORMAT,
+}
+VOLUME_FORMATS = {
+    'Volume Atual': millions_format,
+    'Mediana (até 45d)': millions_format,
+    'Relação (%)': RATIO_FORMAT,
+}
+
+
+@dataclass(frozen=True)
+class PortfolioAnalysis:
+    """
+    Resultado da análise de uma carteira com as cotações obtidas.
+    valuation: ativos com preço (Quantidade, Preço, Valor Total, Peso (%), Fonte).
+    not_found: ativos sem cotação.
+    volume: volume financeiro atual x mediana por ativo.
+    liquidity: tabela de dias para liquidar (ver liquidity.build_liquidity_table).
+    display_valuation / display_volume: colunas e ordem exibidas, ainda numéricas
+    (formatar com VALUATION_FORMATS / VOLUME_FORMATS).
+    figures: gráficos prontos para exibição ('pie', 'top_positions', 'volume_comparison').
+    """
+
+    valuation: pd.DataFrame
+    not_found: pd.DataFrame
+    total_value: float
+    display_valuation: pd.DataFrame
+    volume: pd.DataFrame
+    display_volume: pd.DataFrame
+    liquidity: pd.DataFrame
+    figures: dict = field(default_factory=dict)
+
+
+def build_valuation(portfolio_df, prices, sources):
+    """
+    Aplica os preços à carteira e calcula valor total e peso de cada ativo.
+    Retorna (ativos encontrados, ativos não encontrados).
+    """
+    portfolio_df = portfolio_df.copy()
+    portfolio_df['Preço'] = portfolio_df['Ativo_API'].map(prices)
+    portfolio_df['Fonte'] = portfolio_df['Ativo_API'].map(sources)
+
+    found = portfolio_df['Preço'].notna()
+    df_found = portfolio_df[found].copy()
+    df_not_found = portfolio_df[~found].copy()
+
+    df_found['Valor Total'] = df_found['Quantidade'] * df_found['Preço']
+    df_found['Peso (%)'] = (df_found['Valor Total'] / df_found['Valor Total'].sum()) * 100
+    return df_found, df_not_found
+
+
+def build_volume_table(valuation, volume_data):
+    """
+    Monta a tabela de volume financeiro (atual, mediana, relação e histórico) dos ativos avaliados.
+    """
+    rows = valuation[valuation['Ativo_API'].isin(list(volume_data))]
+    entries = [volume_data[t] for t in rows['Ativo_API']]
+    current = np.array([e['current_volume'] for e in entries], dtype=float)
+    median = np.array([e['median_volume'] for e in entries], dtype=float)
+    days = np.array([e.get('days_analyzed', 0) for e in entries], dtype=int)
+    has_hist = np.array([e.get('has_historical', False) for e in entries], dtype=bool)
+
+    # Relação apenas com histórico válido; sem histórico, considera 100% (neutro)
+    ratio = np.full(len(entries), 100.0)
+    np.divide(current * 100, median, out=ratio, where=has_hist & (median > 0))
+
+    return pd.DataFrame({
+        'Ativo': rows['Ativo'].to_numpy(),
+        'Volume Atual': current,
+        'Mediana (até 45d)': median,
+        'Relação (%)': ratio,
+        'Dias Analisados': days,
+        'Tem Histórico': np.where(has_hist, '✅', '❌'),
+    })
+
+
+def source_breakdown(valuation, sources):
+    """
+    Valor de cada ativo em cada origem (arquivo / conta de custódia) a partir do
+    detalhamento do upload (Ativo, Quantidade, Origem) e dos preços da avaliação.
+    """
+    detail = sources.merge(valuation[['Ativo', 'Preço']], on='Ativo', how='inner')
+    detail['Valor Total'] = detail['Quantidade'] * detail['Preço']
+    return detail.sort_values('Valor Total', ascending=False)[['Origem', 'Ativo', 'Quantidade', 'Preço', 'Valor Total']]
+
+
+def source_summary(detail):
+    """
+    Totais por origem: número de ativos, valor e peso na carteira.
+    """
+    summary = detail.groupby('Origem', as_index=False).agg(
+        Ativos=('Ativo', 'nunique'),
+        **{'Valor Total': ('Valor Total', 'sum')}
+    )
+    summary['Peso (%)'] = summary['Valor Total'] / summary['Valor Total'].sum() * 100
+    return summary.sort_values('Valor Total', ascending=False)
+
+
+def valuation_view(valuation):
+    """
+    Colunas de composição exibidas na tela, ordenadas por peso (valores numéricos).
+    """
+    return valuation.sort_values('Peso (%)', ascending=False)[
+        ['Ativo', 'Quantidade', 'Preço', 'Valor Total', 'Peso (%)', 'Fonte']
+    ]
+
+
+def volume_view(volume):
+    """
+    Tabela de volume exibida na tela, ordenada pela relação percentual (valores numéricos).
+    """
+    return volume.sort_values('Relação (%)', ascending=False)
+
+
+def pie_figure(valuation):
+    """Gráfico de pizza da distribuição da carteira por ativo."""
+    fig_pie = px.pie(
+        valuation,
+        names='Ativo',
+        values='Valor Total',
+        title='🥧 Distribuição da Carteira por Ativo',
+        hole=0.4,
+        color_discrete_sequence=px.colors.qualitative.Set3
+    )
+    fig_pie.update_traces(
+        textposition='inside',
+        textinfo='percent+label',
+        hovertemplate="<b>%{label}</b><br>Valor: R$ %{value:,.2f}<br>Peso: %{percent}<extra></extra>"
+    )
+    fig_pie.update_layout(
+        font=dict(size=12),
+        showlegend=True,
+        legend=dict(orientation="v", yanchor="middle", y=0.5)
+    )
+    return fig_pie
+
+
+def top_positions_figure(valuation, n=10):
+    """Gráfico de barras horizontais com as maiores posições."""
+    fig_bar = px.bar(
+        valuation.nlargest(n, 'Valor Total'),
+        x='Valor Total',
+        y='Ativo',
+        orientation='h',
+        title=f'📊 Top {n} Maiores Posições',
+        color='Valor Total',
+        color_continuous_scale='Viridis'
+    )
+    fig_bar.update_layout(
+        yaxis={'categoryorder': 'total ascending'},
+        font=dict(size=12),
+        showlegend=False
+    )
+    fig_bar.update_traces(
+        hovertemplate="<b>%{y}</b><br>Valor: R$ %{x:,.2f}<extra></extra>"
+    )
+    return fig_bar
+
+
+def volume_comparison_figure(volume):
+    """Gráfico de barras do volume financeiro atual x mediana (R$ milhões)."""
+    fig_volume_comparison = go.Figure()
+    fig_volume_comparison.add_trace(go.Bar(
+        name='Volume Atual',
+        x=volume['Ativo'],
+        y=volume['Volume Atual']/1000000,  # Em milhões
+        marker_color='lightblue'
+    ))
+    fig_volume_comparison.add_trace(go.Bar(
+        name='Mediana (45d)',
+        x=volume['Ativo'],
+        y=volume['Mediana (até 45d)']/1000000,  # Em milhões
+        marker_color='orange'
+    ))
+    fig_volume_comparison.update_layout(
+        title='💰 Volume Financeiro: Atual vs Mediana (R$ Milhões)',
+        xaxis_title='Ativos',
+        yaxis_title='Volume Financeiro (R$ Milhões)',
+        barmode='group',
+        font=dict(size=10)
+    )
+    return fig_volume_comparison
+
+
+def liquidity_figure(liquidity, window, participation_rate, target=1.0):
+    """
+    Gráfico de dias para zerar cada posição com a janela, participação e alvo escolhidos.
+    """
+    df_dias = select_liquidity(liquidity, window, participation_rate, target)
+    df_dias['Dias para Zerar'] = df_dias['Dias para Liquidar'].clip(upper=MAX_DAYS_DISPLAY)  # Limita para visualização
+
+    fig_dias = px.bar(
+        df_dias,
+        x='Ativo',
+        y='Dias para Zerar',
+        title=f'⏱️ Dias para Zerar {target:.0%} da Posição ({participation_rate:.0%} da Mediana {window}d)',
+        color='Dias para Zerar',
+        color_continuous_scale='RdYlBu_r'
+    )
+    fig_dias.update_layout(
+        xaxis_title='Ativos',
+        yaxis_title='Dias',
+        font=dict(size=10),
+        showlegend=False
+    )
+    fig_dias.update_traces(
+        hovertemplate="<b>%{x}</b><br>Dias para zerar: %{y:.1f}<extra></extra>"
+    )
+    return fig_dias
+
+
+@st.cache_data(show_spinner=False, max_entries=ANALYSIS_CACHE_ENTRIES)
+def analyze_portfolio(portfolio_df, prices, volume_data, sources):
+    """
+    Calcula toda a análise da carteira (avaliação, volume, liquidez e gráficos)
+    a partir da carteira agrupada (Ativo, Quantidade, Ativo_API) e das cotações.
+    Não exibe nada: o resultado é guardado em cache pelas entradas e apenas
+    renderizado pela interface, sem recálculo a cada interação.
+    """
+    df_found, df_not_found = build_valuation(portfolio_df, prices, sources)
+    volume = build_volume_table(df_found, volume_data)
+    liquidity = build_liquidity_table(df_found, volume_data, targets=LIQUIDATION_TARGETS)
+
+    figures = {}
+    if not df_found.empty:
+        figures['pie'] = pie_figure(df_found)
+        figures['top_positions'] = top_positions_figure(df_found)
+    if not volume.empty:
+        figures['volume_comparison'] = volume_comparison_figure(volume)
+
+    return PortfolioAnalysis(
+        valuation=df_found,
+        not_found=df_not_found,
+        total_value=float(df_found['Valor Total'].sum()),
+        display_valuation=valuation_view(df_found),
+        volume=volume,
+        display_volume=volume_view(volume),
+        liquidity=liquidity,
+        figures=figures,
+    )
@@ -0,0 +1,149 @@
+"""
+Verificação do buscador concorrente da brapi.dev contra um servidor falso local.
+
+Uso:
+    python benchmark_brapi.py
+    python benchmark_brapi.py --rps 10 --latencia 0.1 --taxa-erro 0.05
+
+O servidor falso imita os endpoints /api/quote/{ticker} e
+/api/quote/historical/{ticker}, aplica sua própria cota de requisições por
+segundo (respondendo 429 quando excedida) e injeta erros 503 aleatórios.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+import pandas as pd
+
+from market_data import TokenBucket, get_brapi_quotes
+from benchmark_yfinance import load_index_tickers
+
+UNKNOWN_TICKERS = ["XPTO3.SA", "FAKE11.SA"]
+
+
+class FakeBrapiServer(ThreadingHTTPServer):
+    """
+    Servidor HTTP que imita a brapi.dev com cota, latência e falhas configuráveis.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, tickers, quota_rps, latency, error_rate):
+        super().__init__(("127.0.0.1", 0), FakeBrapiHandler)
+        self.tickers = {t.replace('.SA', '') for t in tickers}
+        self.quota = TokenBucket(quota_rps)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.stats = {'requests': 0, '429': 0, '503': 0}
+        self.stats_lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def count(self, key):
+        with self.stats_lock:
+            self.stats[key] += 1
+
+    def over_quota(self):
+        with self.quota.lock:
+            now = time.monotonic()
+            self.quota.tokens = min(self.quota.capacity,
+                                    self.quota.tokens + (now - self.quota.updated_at) * self.quota.rate)
+            self.quota.updated_at = now
+            if self.quota.tokens >= 1:
+                self.quota.tokens -= 1
+                return False
+            return True
+
+
+class FakeBrapiHandler(BaseHTTPRequestHandler):
+    """
+    Responde aos endpoints de cotação e histórico da brapi.dev.
+    """
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, payload=None, headers=None):
+        body = json.dumps(payload or {}).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        server = self.server
+        server.count('requests')
+        time.sleep(server.latency)
+
+        if server.over_quota():
+            server.count('429')
+            return self._send(429, {'error': 'Too Many Requests'})
+        if random.random() < server.error_rate:
+            server.count('503')
+            return self._send(503, {'error': 'Service Unavailable'})
+
+        parts = urlparse(self.path).path.strip('/').split('/')
+        ticker = parts[-1]
+        if ticker not in server.tickers:
+            return self._send(404, {'error': f'Ticker {ticker} not found'})
+
+        rng = random.Random(ticker)
+        price = round(rng.uniform(5, 80), 2)
+        if parts[:3] == ['api', 'quote', 'historical']:
+            historical = [
+                {'date': int(day.timestamp()), 'close': round(price * rng.uniform(0.95, 1.05), 2),
+                 'volume': rng.randint(100_000, 5_000_000)}
+                for day in pd.bdate_range(end=pd.Timestamp.today().normalize(), periods=30)
+            ]
+            return self._send(200, {'results': [{'symbol': ticker, 'historical': historical}]})
+
+        return self._send(200, {'results': [{
+            'symbol': ticker,
+            'regularMarketPrice': price,
+            'regularMarketVolume': rng.randint(100_000, 5_000_000),
+        }]})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Buscador brapi.dev contra servidor falso")
+    parser.add_argument("--rps", type=float, default=10, help="cota do servidor e do token bucket (req/s)")
+    parser.add_argument("--latencia", type=float, default=0.1, help="latência por requisição (s)")
+    parser.add_argument("--taxa-erro", type=float, default=0.05, help="fração de respostas 503")
+    parser.add_argument("--indice", default="IDIV", help="índice usado como lista de tickers")
+    args = parser.parse_args()
+
+    known = load_index_tickers(args.indice)
+    server = FakeBrapiServer(known, args.rps, args.latencia, args.taxa_erro)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    tickers = known + UNKNOWN_TICKERS
+    start = time.perf_counter()
+    prices, not_found, volume_data = get_brapi_quotes(
+        tickers, "token-falso", requests_per_second=args.rps, base_url=server.base_url, use_store=False
+    )
+    elapsed = time.perf_counter() - start
+    server.shutdown()
+
+    # Modo antigo: 2 requisições em série + 0,4 s de pausa fixa por ticker
+    sequential_estimate = len(tickers) * (2 * args.latencia + 0.4)
+    print(f"concorrente: {elapsed:6.2f}s  {server.stats['requests']} requisições  "
+          f"{server.stats['429']}x 429  {server.stats['503']}x 503")
+    print(f"sequencial (estimado): {sequential_estimate:6.2f}s")
+
+    assert sorted(not_found) == sorted(UNKNOWN_TICKERS), f"Não encontrados inesperados: {not_found}"
+    assert set(prices) == set(known), "Faltam cotações de tickers conhecidos"
+    assert all(v['has_historical'] for v in volume_data.values()), "Histórico de volume ausente"
+    print(f"✅ {len(prices)} cotações obtidas; apenas tickers inexistentes ficaram de fora")
+
+
+if __name__ == "__main__":
+    main()
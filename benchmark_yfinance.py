@@ -0,0 +1,167 @@
+"""
+Benchmark dos modos de busca do yfinance (sequencial x lote).
+
+Uso:
+    python benchmark_yfinance.py                        # usa dados sintéticos
+    python benchmark_yfinance.py --gravar               # grava a fixture a partir do Yahoo Finance
+    python benchmark_yfinance.py --fixture CAMINHO.csv  # reproduz uma fixture gravada
+
+A reprodução substitui o yfinance por um falso que serve os dados (sintéticos ou
+da fixture) e simula a latência de rede de cada requisição (--latencia).
+"""
+import argparse
+import glob
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import yfinance as yf
+
+import market_data
+from market_data import get_yfinance_quotes
+from providers import load_history_file
+from quote_cache import get_quote_cache
+
+FIXTURE_PATH = os.path.join("fixtures", "yfinance_idiv_6mo.csv")
+OHLCV_COLUMNS = ["Open", "High", "Low", "Close", "Volume"]
+
+
+def load_index_tickers(index_name="IDIV"):
+    """
+    Lê os tickers da composição mais recente do índice em compositions/indices/.
+    """
+    files = sorted(glob.glob(os.path.join("compositions", "indices", f"{index_name}_*.json")))
+    if not files:
+        raise SystemExit(f"❌ Nenhuma composição encontrada para {index_name}")
+    with open(files[-1], encoding="utf-8") as f:
+        composition = json.load(f)
+    return [f"{item['Ativo']}.SA" for item in composition["data"]]
+
+
+def record_fixture(tickers, path):
+    """
+    Grava o histórico (market_data.YFINANCE_PERIOD) de cada ticker em um CSV no formato longo.
+    """
+    frames = []
+    for ticker in tickers:
+        hist_data = yf.Ticker(ticker).history(period=market_data.YFINANCE_PERIOD, interval="1d")
+        if hist_data.empty:
+            print(f"⚠️ Sem dados para {ticker}")
+            continue
+        hist_data = hist_data[OHLCV_COLUMNS].copy()
+        hist_data.index = hist_data.index.tz_localize(None).normalize()
+        hist_data.index.name = "Date"
+        hist_data["Ticker"] = ticker
+        frames.append(hist_data.reset_index())
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    pd.concat(frames, ignore_index=True).to_csv(path, index=False)
+    print(f"✅ Fixture gravada em {path} ({len(frames)} ativos)")
+
+
+def synthetic_fixture(tickers, days=126, seed=42):
+    """
+    Gera históricos sintéticos determinísticos (passeio aleatório) para os tickers.
+    """
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range(end=pd.Timestamp.today().normalize(), periods=days, name="Date")
+    histories = {}
+    for ticker in tickers:
+        close = 20 * np.exp(np.cumsum(rng.normal(0, 0.015, days)))
+        histories[ticker] = pd.DataFrame({
+            "Open": close,
+            "High": close * 1.01,
+            "Low": close * 0.99,
+            "Close": close,
+            "Volume": rng.integers(100_000, 5_000_000, days).astype(float),
+        }, index=dates)
+    return histories
+
+
+class ReplayYFinance:
+    """
+    Substituto do módulo yfinance que serve os dados da fixture com latência simulada.
+    """
+
+    def __init__(self, histories, latency):
+        self.histories = histories
+        self.latency = latency
+        self.requests = 0
+
+    def _request(self):
+        self.requests += 1
+        time.sleep(self.latency)
+
+    def Ticker(self, ticker):
+        replay = self
+
+        class _Ticker:
+            def history(self, period=None, interval=None, start=None):
+                replay._request()
+                return replay.histories.get(ticker, pd.DataFrame(columns=OHLCV_COLUMNS)).copy()
+
+        return _Ticker()
+
+    def download(self, tickers, **kwargs):
+        self._request()
+        frames = {t: self.histories[t] for t in tickers if t in self.histories}
+        if not frames:
+            return pd.DataFrame()
+        return pd.concat(frames, axis=1)
+
+
+def run_mode(mode, tickers):
+    """
+    Executa get_yfinance_quotes sem cache nem histórico salvo e retorna (tempo, resultado).
+    """
+    get_quote_cache().clear()
+    start = time.perf_counter()
+    result = get_yfinance_quotes(tickers, mode=mode, use_store=False)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark yfinance: sequencial x lote")
+    parser.add_argument("--gravar", action="store_true", help="grava a fixture via Yahoo Finance")
+    parser.add_argument("--fixture", help=f"reproduz a fixture em vez de dados sintéticos (--gravar usa {FIXTURE_PATH})")
+    parser.add_argument("--latencia", type=float, default=0.25, help="latência simulada por requisição (s)")
+    parser.add_argument("--indice", default="IDIV", help="índice usado como lista de tickers")
+    args = parser.parse_args()
+
+    tickers = load_index_tickers(args.indice)
+
+    if args.gravar:
+        record_fixture(tickers, args.fixture or FIXTURE_PATH)
+        return
+
+    if args.fixture is None:
+        histories = synthetic_fixture(tickers)
+    elif os.path.exists(args.fixture):
+        histories = load_history_file(args.fixture)
+    else:
+        raise SystemExit(f"❌ Fixture não encontrada: {args.fixture}. Grave uma com --gravar.")
+
+    replay = ReplayYFinance(histories, args.latencia)
+    market_data.yf = replay
+
+    results = {}
+    for mode in market_data.YFINANCE_MODES:
+        replay.requests = 0
+        elapsed, results[mode] = run_mode(mode, tickers)
+        print(f"{mode:>10}: {elapsed:6.2f}s  {replay.requests:3d} requisições  "
+              f"{len(results[mode][0])} cotações")
+
+    prices_batch, not_found_batch, volume_batch = results["batch"]
+    prices_seq, not_found_seq, volume_seq = results["sequential"]
+    assert sorted(not_found_batch) == sorted(not_found_seq), "Tickers não encontrados divergem"
+    for ticker, price in prices_seq.items():
+        assert np.isclose(prices_batch[ticker], price), f"Preço diverge para {ticker}"
+        assert np.isclose(volume_batch[ticker]['median_volume'], volume_seq[ticker]['median_volume']), \
+            f"Mediana de volume diverge para {ticker}"
+    print("✅ Resultados idênticos nos dois modos")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,506 @@
+import streamlit as st
+import codecs
+import csv
+import hashlib
+import numpy as np
+import openpyxl
+import os
+import pandas as pd
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from itertools import islice
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from tickers import normalize_tickers
+
+# Colunas alvo que queremos encontrar e padronizar
+TARGET_COLUMNS = ["Ativo", "Quantidade"]
+
+# Detecção do formato do CSV a partir de uma amostra do início do arquivo
+CSV_SAMPLE_BYTES = 64 * 1024
+CSV_ENCODINGS = ('utf-8', 'cp1252')  # latin-1 é o último recurso (decodifica qualquer byte)
+CSV_DELIMITERS = (';', ',', '\t', '|')
+HEADER_SCAN_ROWS = 20  # Linhas iniciais em que o cabeçalho é procurado
+
+# Leitura em blocos: as quantidades são somadas por ativo a cada bloco
+CHUNK_ROWS = 50_000
+
+# Arquivos já lidos mantidos em cache (pelo hash do conteúdo)
+UPLOAD_CACHE_ENTRIES = 16
+HASH_BLOCK_BYTES = 1024 * 1024
+UPLOAD_MAX_WORKERS = 4  # Arquivos lidos em paralelo no envio em lote
+
+# Coluna opcional que identifica um extrato de movimentações (compras e vendas)
+SIDE_COLUMN = "Tipo"
+LEDGER_SIDE_COLUMNS = ('tipo', 'operação', 'operacao', 'c/v', 'compra/venda', 'natureza', 'movimentação', 'movimentacao')
+BUY_SIDES = frozenset({'c', 'compra', 'buy', 'crédito', 'credito', 'entrada'})
+SELL_SIDES = frozenset({'v', 'venda', 'sell', 'débito', 'debito', 'saída', 'saida'})
+
+
+@dataclass(frozen=True)
+class CsvDialect:
+    """
+    Formato detectado de um CSV: encoding, separador e linha do cabeçalho (base 0).
+    """
+
+    encoding: str
+    delimiter: str
+    header_row: int
+
+    def describe(self):
+        delimiter = 'tab' if self.delimiter == '\t' else self.delimiter
+        return f"encoding='{self.encoding}', separador='{delimiter}', linhas puladas={self.header_row}"
+
+
+@dataclass(frozen=True)
+class ExcelLayout:
+    """
+    Posição dos dados em uma planilha Excel: aba e linha do cabeçalho (base 0).
+    """
+
+    sheet_name: str
+    header_row: int
+
+    def describe(self):
+        return f"aba='{self.sheet_name}', linhas puladas={self.header_row}"
+
+
+@dataclass(frozen=True)
+class ParsedUpload:
+    """
+    Resultado da leitura de um arquivo enviado: posições consolidadas
+    (Ativo, Quantidade), formato detectado e estatísticas da leitura.
+    error traz a mensagem quando o arquivo não pôde ser lido (positions é None).
+    """
+
+    file_name: str
+    file_format: str
+    positions: pd.DataFrame = None
+    dialect: CsvDialect = None
+    layout: ExcelLayout = None
+    sheet_names: tuple = ()
+    rows_read: int = 0
+    rows_ignored: int = 0
+    is_ledger: bool = False
+    error: str = None
+
+    def describe(self):
+        if self.dialect is not None:
+            return self.dialect.describe()
+        if self.layout is not None:
+            return self.layout.describe()
+        return ""
+
+
+def normalize_column_name(col_name):
+    """Normaliza o nome da coluna para comparação (minúsculas, sem espaços extras)."""
+    if pd.isna(col_name):  # Tratar casos onde o nome da coluna pode ser NaN
+        return ""
+    return str(col_name).strip().lower()
+
+
+def find_and_select_target_columns(df, target_names_list):
+    """
+    Verifica se as colunas alvo (normalizadas) existem no DataFrame (com colunas normalizadas).
+    Se sim, retorna um novo DataFrame contendo apenas essas colunas,
+    renomeadas para os nomes originais em target_names_list.
+    Caso contrário, retorna None.
+    """
+    df_cols_normalized_map = {normalize_column_name(col): col for col in df.columns}
+    target_names_normalized_map = {normalize_column_name(name): name for name in target_names_list}
+
+    found_original_col_names_for_selection = []
+    rename_map_to_standard = {}
+
+    all_targets_found = True
+    for norm_target_name, original_target_name in target_names_normalized_map.items():
+        if norm_target_name in df_cols_normalized_map:
+            original_df_col_name = df_cols_normalized_map[norm_target_name]
+            found_original_col_names_for_selection.append(original_df_col_name)
+            rename_map_to_standard[original_df_col_name] = original_target_name
+        else:
+            all_targets_found = False
+            break
+
+    if all_targets_found:
+        selected_df = df[found_original_col_names_for_selection]
+        return selected_df.rename(columns=rename_map_to_standard)
+    else:
+        return None
+
+
+def find_target_positions(row, target_columns=TARGET_COLUMNS):
+    """
+    Posições (índices) das colunas alvo em uma linha de cabeçalho, na ordem de
+    target_columns, ou None se alguma não estiver presente.
+    """
+    positions = {}
+    for index, value in enumerate(row):
+        positions.setdefault(normalize_column_name(value), index)
+    try:
+        return [positions[normalize_column_name(name)] for name in target_columns]
+    except KeyError:
+        return None
+
+
+def find_header_row(rows, target_columns=TARGET_COLUMNS):
+    """
+    Índice da primeira linha (lista de valores) que contém todas as colunas alvo, ou None.
+    """
+    for index, row in enumerate(rows):
+        if find_target_positions(row, target_columns) is not None:
+            return index
+    return None
+
+
+def detect_encoding(sample):
+    """
+    Encoding de uma amostra de bytes: UTF-8 (com ou sem BOM), cp1252 ou, por fim, latin-1.
+    A amostra pode terminar no meio de um caractere.
+    """
+    if sample.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    for encoding in CSV_ENCODINGS:
+        try:
+            codecs.getincrementaldecoder(encoding)().decode(sample, final=False)
+            return encoding
+        except UnicodeDecodeError:
+            continue
+    return 'latin-1'
+
+
+def detect_csv_dialect(sample, target_columns=TARGET_COLUMNS):
+    """
+    Detecta encoding, separador e linha do cabeçalho de um CSV a partir de uma
+    amostra do início do arquivo, sem ler o arquivo inteiro.
+    Retorna um CsvDialect ou None se o cabeçalho com as colunas alvo não for encontrado.
+    """
+    encoding = detect_encoding(sample)
+    text = codecs.getincrementaldecoder(encoding)(errors='replace').decode(sample, final=False)
+    lines = text.replace('\r\n', '\n').replace('\r', '\n').split('\n')[:HEADER_SCAN_ROWS]
+
+    for delimiter in CSV_DELIMITERS:
+        header_row = find_header_row(csv.reader(lines, delimiter=delimiter, skipinitialspace=True), target_columns)
+        if header_row is not None:
+            return CsvDialect(encoding, delimiter, header_row)
+    return None
+
+
+class PositionAggregator:
+    """
+    Soma as quantidades por ativo (com o código normalizado) à medida que os
+    blocos de linhas são lidos, sem manter todas as linhas em memória.
+    Se o arquivo tiver uma coluna de tipo com compras e vendas, ele é tratado
+    como extrato de movimentações e o resultado é a posição líquida (compras - vendas);
+    caso contrário, cada linha é uma posição e linhas com quantidade inválida
+    ou não positiva são descartadas.
+    """
+
+    def __init__(self):
+        self.totals = pd.Series(dtype=float)
+        self.rows_read = 0
+        self.rows_ignored = 0
+        self.is_ledger = None  # Definido no primeiro bloco
+
+    def add(self, chunk):
+        """
+        Acumula um bloco com as colunas Ativo, Quantidade e, opcionalmente, Tipo.
+        """
+        self.rows_read += len(chunk)
+        quantity = pd.to_numeric(chunk['Quantidade'], errors='coerce')
+
+        side = chunk[SIDE_COLUMN].astype(str).str.strip().str.lower() if SIDE_COLUMN in chunk else None
+        if self.is_ledger is None:
+            self.is_ledger = side is not None and bool(side.isin(BUY_SIDES | SELL_SIDES).any())
+
+        if self.is_ledger:
+            sign = np.select([side.isin(BUY_SIDES), side.isin(SELL_SIDES)], [1.0, -1.0], np.nan)
+            quantity = quantity.abs() * sign
+            valid = quantity.notna()
+        else:
+            valid = quantity > 0
+        valid &= chunk['Ativo'].notna()
+
+        self.rows_ignored += int((~valid).sum())
+        grouped = quantity[valid].groupby(normalize_tickers(chunk.loc[valid, 'Ativo'])).sum()
+        self.totals = self.totals.add(grouped, fill_value=0)
+
+    def result(self):
+        """
+        DataFrame (Ativo, Quantidade) com as posições positivas consolidadas.
+        """
+        totals = self.totals[self.totals > 0]
+        return pd.DataFrame({
+            'Ativo': totals.index.astype(str),
+            'Quantidade': totals.to_numpy().astype(int),
+        })
+
+
+def _standardize_chunk(chunk, target_columns):
+    """
+    Renomeia as colunas alvo (e a de tipo, se houver) de um bloco lido do CSV.
+    """
+    selected = find_and_select_target_columns(chunk, target_columns)
+    for col in chunk.columns:
+        if normalize_column_name(col) in LEDGER_SIDE_COLUMNS:
+            selected = selected.assign(**{SIDE_COLUMN: chunk[col]})
+            break
+    return selected
+
+
+def read_csv_positions(file, dialect, target_columns=TARGET_COLUMNS, chunksize=CHUNK_ROWS):
+    """
+    Lê o CSV uma única vez com o formato detectado, em blocos de chunksize linhas,
+    carregando apenas as colunas alvo (e a de tipo) e consolidando por ativo.
+    Retorna o PositionAggregator com as posições e as estatísticas da leitura.
+    """
+    wanted = {normalize_column_name(name) for name in target_columns} | set(LEDGER_SIDE_COLUMNS)
+    aggregator = PositionAggregator()
+    with pd.read_csv(
+        file,
+        sep=dialect.delimiter,
+        encoding=dialect.encoding,
+        encoding_errors='replace',
+        skiprows=dialect.header_row,
+        skipinitialspace=True,
+        usecols=lambda col: normalize_column_name(col) in wanted,
+        on_bad_lines='warn',
+        chunksize=chunksize
+    ) as reader:
+        for chunk in reader:
+            aggregator.add(_standardize_chunk(chunk, target_columns))
+    return aggregator
+
+
+def find_side_position(row):
+    """
+    Posição da coluna de tipo de movimentação (compra/venda) no cabeçalho, ou None.
+    """
+    for index, value in enumerate(row):
+        if normalize_column_name(value) in LEDGER_SIDE_COLUMNS:
+            return index
+    return None
+
+
+def _iter_row_chunks(rows, positions, target_columns, chunksize):
+    """
+    Agrupa as linhas restantes da planilha em DataFrames de até chunksize linhas
+    com as colunas alvo (e a de tipo, se houver na posição extra), ignorando linhas vazias.
+    """
+    columns = list(target_columns) + ([SIDE_COLUMN] if len(positions) > len(target_columns) else [])
+    width = max(positions) + 1
+    values = []
+    for row in rows:
+        if len(row) < width:
+            row = tuple(row) + (None,) * (width - len(row))
+        selected = [row[i] for i in positions]
+        if any(value is not None for value in selected):
+            values.append(selected)
+            if len(values) >= chunksize:
+                yield pd.DataFrame(values, columns=columns)
+                values = []
+    if values:
+        yield pd.DataFrame(values, columns=columns)
+
+
+def _aggregate_sheet_rows(rows, target_columns, chunksize):
+    """
+    Procura o cabeçalho nas primeiras linhas e consolida as linhas seguintes do mesmo iterador.
+    Retorna (PositionAggregator, linha do cabeçalho) ou (None, None).
+    """
+    for header_row, row in enumerate(islice(rows, HEADER_SCAN_ROWS)):
+        positions = find_target_positions(row, target_columns)
+        if positions is not None:
+            side_position = find_side_position(row)
+            if side_position is not None:
+                positions = positions + [side_position]
+            aggregator = PositionAggregator()
+            for chunk in _iter_row_chunks(rows, positions, target_columns, chunksize):
+                aggregator.add(chunk)
+            return aggregator, header_row
+    return None, None
+
+
+def _read_xlsx_positions(file, sheet_name, target_columns, chunksize):
+    """
+    Lê um .xlsx em modo somente leitura (streaming), linha a linha.
+    """
+    workbook = openpyxl.load_workbook(file, read_only=True, data_only=True)
+    try:
+        sheet_names = list(workbook.sheetnames)
+        for name in ([sheet_name] if sheet_name in sheet_names else sheet_names):
+            aggregator, header_row = _aggregate_sheet_rows(
+                workbook[name].iter_rows(values_only=True), target_columns, chunksize
+            )
+            if aggregator is not None:
+                return aggregator, ExcelLayout(name, header_row), sheet_names
+        return None, None, sheet_names
+    finally:
+        workbook.close()
+
+
+def _read_xls_positions(file, sheet_name, target_columns, chunksize):
+    """
+    Lê um .xls (formato antigo, sem leitura em streaming) uma única vez por aba.
+    """
+    with pd.ExcelFile(file) as excel_file:
+        sheet_names = list(excel_file.sheet_names)
+        for name in ([sheet_name] if sheet_name in sheet_names else sheet_names):
+            raw = excel_file.parse(name, header=None)
+            rows = raw.astype(object).where(raw.notna(), None).itertuples(index=False, name=None)
+            aggregator, header_row = _aggregate_sheet_rows(rows, target_columns, chunksize)
+            if aggregator is not None:
+                return aggregator, ExcelLayout(name, header_row), sheet_names
+        return None, None, sheet_names
+
+
+def read_excel_positions(file, file_name, sheet_name=None, target_columns=TARGET_COLUMNS, chunksize=CHUNK_ROWS):
+    """
+    Abre a planilha uma única vez, localiza o cabeçalho com as colunas alvo e
+    consolida as posições por ativo em blocos de chunksize linhas.
+    Sem sheet_name (ou com uma aba inexistente), usa a primeira aba que contém o cabeçalho.
+    Retorna (PositionAggregator, ExcelLayout, nomes das abas); agregador e layout
+    são None se o cabeçalho não for encontrado.
+    """
+    if file_name.lower().endswith('.xls'):
+        return _read_xls_positions(file, sheet_name, target_columns, chunksize)
+    return _read_xlsx_positions(file, sheet_name, target_columns, chunksize)
+
+
+def parse_upload(file, file_name, sheet_name=None, target_columns=TARGET_COLUMNS):
+    """
+    Lê um arquivo CSV ou Excel e consolida as posições por ativo.
+    Nunca levanta exceção: falhas são devolvidas em ParsedUpload.error.
+    """
+    lower_name = file_name.lower()
+    if lower_name.endswith('.csv'):
+        dialect = detect_csv_dialect(file.read(CSV_SAMPLE_BYTES), target_columns)
+        file.seek(0)
+        if dialect is None:
+            return ParsedUpload(file_name, 'CSV', error=f"Não foi possível identificar o cabeçalho do arquivo CSV '{file_name}'.")
+        try:
+            aggregator = read_csv_positions(file, dialect, target_columns)
+        except Exception as e:
+            return ParsedUpload(file_name, 'CSV', dialect=dialect, error=f"Erro ao ler o arquivo CSV '{file_name}': {e}")
+        return ParsedUpload(
+            file_name, 'CSV', aggregator.result(), dialect=dialect,
+            rows_read=aggregator.rows_read, rows_ignored=aggregator.rows_ignored, is_ledger=bool(aggregator.is_ledger)
+        )
+
+    if lower_name.endswith(('.xlsx', '.xls')):
+        try:
+            aggregator, layout, sheet_names = read_excel_positions(file, file_name, sheet_name, target_columns)
+        except Exception as e:
+            return ParsedUpload(file_name, 'Excel', error=f"Erro ao ler o arquivo Excel '{file_name}': {e}")
+        if aggregator is None:
+            return ParsedUpload(
+                file_name, 'Excel', sheet_names=tuple(sheet_names),
+                error=f"Não foi possível encontrar as colunas 'Ativo' e 'Quantidade' no arquivo Excel '{file_name}'."
+            )
+        return ParsedUpload(
+            file_name, 'Excel', aggregator.result(), layout=layout, sheet_names=tuple(sheet_names),
+            rows_read=aggregator.rows_read, rows_ignored=aggregator.rows_ignored, is_ledger=bool(aggregator.is_ledger)
+        )
+
+    return ParsedUpload(
+        file_name, '', error=f"Formato de arquivo não suportado: '{file_name}'. Apenas .csv, .xlsx e .xls são aceitos."
+    )
+
+
+def content_hash(file):
+    """
+    SHA-256 do conteúdo de um arquivo, lido em blocos; o ponteiro volta ao início.
+    """
+    digest = hashlib.sha256()
+    file.seek(0)
+    for block in iter(lambda: file.read(HASH_BLOCK_BYTES), b''):
+        digest.update(block)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+@st.cache_data(show_spinner=False, max_entries=UPLOAD_CACHE_ENTRIES)
+def _parse_upload_cached(digest, file_name, sheet_name, _file):
+    return parse_upload(_file, file_name, sheet_name)
+
+
+def load_upload(file, file_name, sheet_name=None):
+    """
+    parse_upload com cache pelo hash do conteúdo: reexecuções da página (cliques,
+    digitação) e reenvios do mesmo arquivo não refazem a leitura.
+    """
+    return _parse_upload_cached(content_hash(file), file_name, sheet_name, file)
+
+
+def upload_labels(files):
+    """
+    Nome de cada arquivo enviado, na ordem do envio. Nomes repetidos (ex.: o mesmo
+    'posicao.xlsx' exportado por duas contas) recebem o número do envio antes da
+    extensão ('posicao (1).xlsx', 'posicao (2).xlsx') para identificar cada arquivo.
+    """
+    counts = Counter(f.name for f in files)
+    seen = Counter()
+    labels = []
+    for f in files:
+        if counts[f.name] == 1:
+            labels.append(f.name)
+            continue
+        seen[f.name] += 1
+        stem, extension = os.path.splitext(f.name)
+        labels.append(f"{stem} ({seen[f.name]}){extension}")
+    return labels
+
+
+def load_uploads(files, sheet_names=None):
+    """
+    Lê vários arquivos em paralelo (threads), cada um com o cache de load_upload.
+    Cada ParsedUpload recebe o nome de upload_labels (único mesmo com nomes repetidos).
+    sheet_names: {nome de upload_labels: aba escolhida}.
+    Retorna a lista de ParsedUpload na ordem dos arquivos.
+    """
+    sheet_names = sheet_names or {}
+    labeled = list(zip(files, upload_labels(files)))
+    if len(files) <= 1:
+        return [load_upload(f, label, sheet_names.get(label)) for f, label in labeled]
+
+    # As threads herdam o contexto da sessão para usar o cache do Streamlit
+    ctx = get_script_run_ctx(suppress_warning=True)
+    with ThreadPoolExecutor(
+        max_workers=min(UPLOAD_MAX_WORKERS, len(files)),
+        initializer=lambda: add_script_run_ctx(threading.current_thread(), ctx)
+    ) as executor:
+        return list(executor.map(lambda item: load_upload(item[0], item[1], sheet_names.get(item[1])), labeled))
+
+
+def upload_report(parsed_uploads):
+    """
+    Tabela com o resultado da leitura de cada arquivo (formato detectado, linhas e validação).
+    """
+    return pd.DataFrame([{
+        'Arquivo': parsed.file_name,
+        'Formato': parsed.file_format or '-',
+        'Parâmetros': parsed.describe() or '-',
+        'Tipo': 'Extrato' if parsed.is_ledger else 'Posições',
+        'Linhas Lidas': parsed.rows_read,
+        'Linhas Ignoradas': parsed.rows_ignored,
+        'Ativos': 0 if parsed.positions is None else len(parsed.positions),
+        'Status': f"❌ {parsed.error}" if parsed.error else '✅ OK',
+    } for parsed in parsed_uploads])
+
+
+def consolidate_uploads(parsed_uploads):
+    """
+    Junta as posições dos arquivos lidos com sucesso.
+    Retorna (consolidado Ativo/Quantidade, detalhamento Ativo/Quantidade/Origem)
+    ou (None, None) se nenhum arquivo pôde ser lido.
+    """
+    frames = [
+        parsed.positions.assign(Origem=parsed.file_name)
+        for parsed in parsed_uploads if parsed.positions is not None
+    ]
+    if not frames:
+        return None, None
+    breakdown = pd.concat(frames, ignore_index=True)
+    consolidated = breakdown.groupby('Ativo', as_index=False)['Quantidade'].sum()
+    return consolidated, breakdown
@@ -0,0 +1,47 @@
+# Troca vírgula e ponto de uma só vez: 1,234.56 -> 1.234,56
+_BR_SEPARATORS = str.maketrans(',.', '.,')
+
+# Formatos de exibição das colunas (str.format no padrão americano;
+# style_table converte os separadores para o padrão brasileiro)
+INTEGER_FORMAT = '{:,.0f}'
+BRL_FORMAT = 'R$ {:,.2f}'
+PERCENT_FORMAT = '{:,.2f}%'
+RATIO_FORMAT = '{:,.1f}%'
+
+
+def millions_format(value):
+    """Formato de coluna para valores em reais exibidos em milhões (R$ 1,23M)."""
+    return f"R$ {value/1000000:,.2f}M"
+
+
+def format_number(value, decimals=2, prefix="", suffix=""):
+    """
+    Formata um número no padrão brasileiro (1.234,56), com prefixo e sufixo opcionais.
+    """
+    return f"{prefix}{f'{value:,.{decimals}f}'.translate(_BR_SEPARATORS)}{suffix}"
+
+
+def format_brl(value, decimals=2):
+    """Formata um valor em reais (R$ 1.234,56)."""
+    return format_number(value, decimals, prefix="R$ ")
+
+
+def format_millions(value, decimals=1):
+    """Formata um valor em reais em milhões (R$ 1,2M)."""
+    return format_number(value / 1000000, decimals, prefix="R$ ", suffix="M")
+
+
+def format_percent(value, decimals=1):
+    """Formata um percentual (12,3%)."""
+    return format_number(value, decimals, suffix="%")
+
+
+def style_table(df, formats):
+    """
+    Formata as colunas de uma tabela no padrão brasileiro apenas na exibição.
+    Os valores continuam numéricos, então a ordenação (inclusive ao clicar no
+    cabeçalho da tabela) é feita pelos números e não pelos textos.
+    formats: {coluna: formato str.format ou função}; colunas ausentes são ignoradas.
+    """
+    formats = {col: fmt for col, fmt in formats.items() if col in df.columns}
+    return df.style.format(formats, thousands='.', decimal=',', na_rep='-')
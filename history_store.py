@@ -0,0 +1,124 @@
+import streamlit as st
+import pandas as pd
+import os
+import sqlite3
+import threading
+
+# Banco local com as barras diárias (fechamento e volume) de cada ticker
+HISTORY_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "market_history.sqlite")
+
+
+class HistoryStore:
+    """
+    Armazenamento persistente de barras diárias (fechamento e volume) em SQLite,
+    separadas por fonte: a brapi.dev devolve fechamentos sem ajuste e o yfinance
+    fechamentos ajustados, que não podem se misturar no mesmo histórico.
+    Permite atualizar apenas os pregões que faltam desde a última barra salva.
+    """
+
+    def __init__(self, path=HISTORY_DB_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(bars)")]
+            if columns and 'source' not in columns:
+                # Bancos antigos não registravam a fonte de cada barra: o histórico
+                # é descartado e refeito na próxima busca
+                conn.execute("DROP TABLE bars")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS bars (
+                    source TEXT NOT NULL,
+                    ticker TEXT NOT NULL,
+                    date TEXT NOT NULL,
+                    close REAL,
+                    volume REAL,
+                    PRIMARY KEY (source, ticker, date)
+                ) WITHOUT ROWID
+            """)
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def date_ranges(self, source, tickers):
+        """
+        Retorna {ticker: (pd.Timestamp da primeira barra, pd.Timestamp da última barra)}
+        para os tickers com histórico salvo da fonte.
+        """
+        if not tickers:
+            return {}
+        placeholders = ",".join("?" * len(tickers))
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT ticker, MIN(date), MAX(date) FROM bars "
+                f"WHERE source = ? AND ticker IN ({placeholders}) GROUP BY ticker",
+                [source, *tickers]
+            ).fetchall()
+        return {ticker: (pd.Timestamp(first_date), pd.Timestamp(last_date)) for ticker, first_date, last_date in rows}
+
+    def known_tickers(self):
+        """
+        Tickers que já tiveram barras salvas (buscas anteriores bem-sucedidas).
+        """
+        with self._connect() as conn:
+            return [ticker for (ticker,) in conn.execute("SELECT DISTINCT ticker FROM bars")]
+
+    def save(self, source, ticker, hist_data):
+        """
+        Grava (ou substitui) as barras de um ticker obtidas da fonte.
+        hist_data deve ter índice de datas e colunas 'Close' e 'Volume'.
+        """
+        if hist_data is None or hist_data.empty:
+            return
+        index = pd.DatetimeIndex(hist_data.index)
+        if index.tz is not None:
+            index = index.tz_localize(None)
+        rows = [
+            (source, ticker, date, float(close), float(volume))
+            for date, close, volume in zip(
+                index.strftime("%Y-%m-%d"),
+                hist_data['Close'].to_numpy(),
+                hist_data['Volume'].fillna(0).to_numpy()
+            )
+            if pd.notna(close)
+        ]
+        with self.lock, self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO bars (source, ticker, date, close, volume) VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+
+    def load(self, source, tickers, start_date=None):
+        """
+        Lê as barras salvas da fonte a partir de start_date.
+        Retorna {ticker: DataFrame com colunas 'Close' e 'Volume' indexado por data}.
+        """
+        if not tickers:
+            return {}
+        placeholders = ",".join("?" * len(tickers))
+        query = f"SELECT ticker, date, close, volume FROM bars WHERE source = ? AND ticker IN ({placeholders})"
+        params = [source, *tickers]
+        if start_date is not None:
+            query += " AND date >= ?"
+            params.append(pd.Timestamp(start_date).strftime("%Y-%m-%d"))
+        query += " ORDER BY ticker, date"
+
+        with self._connect() as conn:
+            df = pd.read_sql_query(query, conn, params=params, parse_dates=['date'])
+
+        histories = {}
+        for ticker, group in df.groupby('ticker', sort=False):
+            histories[ticker] = group.set_index('date')[['close', 'volume']].rename(
+                columns={'close': 'Close', 'volume': 'Volume'}
+            )
+        return histories
+
+
+@st.cache_resource
+def get_history_store():
+    """
+    Retorna a instância do armazenamento de histórico compartilhada entre sessões.
+    """
+    return HistoryStore()
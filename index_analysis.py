@@ -0,0 +1,152 @@
+import pandas as pd
+import plotly.express as px
+import numpy as np
+from dataclasses import dataclass
+from formatting import INTEGER_FORMAT, PERCENT_FORMAT, style_table
+
+# Faixas de concentração (participação somada dos N maiores pesos)
+CONCENTRATION_TOP_N = (5, 10)
+
+# Quantidade de ativos exibidos no gráfico de desvios
+DEVIATION_CHART_ROWS = 20
+
+# Situação de cada ativo na comparação
+IN_BOTH = "Carteira e índice"
+ONLY_PORTFOLIO = "Só na carteira"
+ONLY_INDEX = "Só no índice"
+
+COMPARISON_FORMATS = {
+    'Peso Carteira (%)': PERCENT_FORMAT,
+    'Peso Índice (%)': PERCENT_FORMAT,
+    'Peso Ativo (%)': PERCENT_FORMAT,
+}
+
+# Formato de cada linha (métrica) da tabela de concentração
+CONCENTRATION_FORMATS = {
+    'Ativos': INTEGER_FORMAT,
+    'HHI': INTEGER_FORMAT,
+    'Nº efetivo de ativos': '{:,.1f}',
+    **{f'Top {n} (%)': PERCENT_FORMAT for n in CONCENTRATION_TOP_N},
+}
+
+
+@dataclass(frozen=True)
+class IndexComparison:
+    """
+    Comparação da carteira com a composição de um índice.
+    table: um ativo por linha (pesos na carteira e no índice, peso ativo e situação),
+    ordenada pelo desvio absoluto.
+    overlap: soma dos menores pesos entre carteira e índice (%).
+    active_share: metade da soma dos desvios absolutos (%).
+    missing / extra: ativos só no índice / só na carteira.
+    concentration: métricas de concentração da carteira e do índice.
+    """
+
+    index_name: str
+    date: pd.Timestamp
+    table: pd.DataFrame
+    overlap: float
+    active_share: float
+    missing: list
+    extra: list
+    concentration: pd.DataFrame
+
+
+def concentration_metrics(weights):
+    """
+    HHI (em pontos, de 0 a 10.000), número efetivo de ativos e participação dos
+    maiores pesos de uma série de pesos em % (zeros são ignorados).
+    """
+    w = np.sort(np.asarray(weights, dtype=float))[::-1]
+    w = w[w > 0]
+    shares = w / w.sum() if len(w) else w
+    hhi = float(np.sum(shares ** 2))
+    metrics = {
+        'Ativos': float(len(w)),
+        'HHI': hhi * 10000,
+        'Nº efetivo de ativos': 1 / hhi if hhi > 0 else 0.0,
+    }
+    for n in CONCENTRATION_TOP_N:
+        metrics[f'Top {n} (%)'] = float(shares[:n].sum() * 100)
+    return metrics
+
+
+def compare_with_index(valuation, composition):
+    """
+    Junta a carteira avaliada (Ativo, Peso (%)) com a composição do índice
+    (index_compositions.IndexComposition) em um único merge e calcula pesos
+    ativos, sobreposição, ativos faltantes/extras e concentração.
+    """
+    index_weights = composition.weights.rename(columns={'Peso': 'Peso Índice (%)'})
+    # Pesos do índice renormalizados para 100% (as composições salvas podem somar 99,9x%)
+    total_index = index_weights['Peso Índice (%)'].sum()
+    if total_index > 0:
+        index_weights['Peso Índice (%)'] = index_weights['Peso Índice (%)'] / total_index * 100
+
+    merged = valuation[['Ativo', 'Peso (%)']].rename(columns={'Peso (%)': 'Peso Carteira (%)'}).merge(
+        index_weights, on='Ativo', how='outer', indicator='Situação'
+    )
+    portfolio = merged['Peso Carteira (%)'].fillna(0.0).to_numpy()
+    index = merged['Peso Índice (%)'].fillna(0.0).to_numpy()
+    active = portfolio - index
+
+    merged['Peso Carteira (%)'] = portfolio
+    merged['Peso Índice (%)'] = index
+    merged['Peso Ativo (%)'] = active
+    merged['Situação'] = merged['Situação'].map(
+        {'both': IN_BOTH, 'left_only': ONLY_PORTFOLIO, 'right_only': ONLY_INDEX}
+    ).astype(str)
+
+    table = merged.iloc[np.argsort(-np.abs(active), kind='stable')].reset_index(drop=True)
+
+    concentration = pd.DataFrame({
+        'Carteira': concentration_metrics(portfolio),
+        'Índice': concentration_metrics(index),
+    })
+    concentration.index.name = 'Métrica'
+
+    return IndexComparison(
+        index_name=composition.index_name,
+        date=composition.date,
+        table=table,
+        overlap=float(np.minimum(portfolio, index).sum()),
+        active_share=float(np.abs(active).sum() / 2),
+        missing=sorted(table.loc[table['Situação'] == ONLY_INDEX, 'Ativo']),
+        extra=sorted(table.loc[table['Situação'] == ONLY_PORTFOLIO, 'Ativo']),
+        concentration=concentration.reset_index(),
+    )
+
+
+def style_concentration(concentration):
+    """
+    Formata a tabela de concentração (Métrica, Carteira, Índice) linha a linha,
+    com CONCENTRATION_FORMATS: contagens sem casas decimais, participações em %.
+    """
+    styler = style_table(concentration, {})
+    for metric, fmt in CONCENTRATION_FORMATS.items():
+        rows = concentration.index[concentration['Métrica'] == metric]
+        styler = styler.format(fmt, subset=pd.IndexSlice[rows, ['Carteira', 'Índice']],
+                               thousands='.', decimal=',', na_rep='-')
+    return styler
+
+
+def active_weight_figure(comparison, n=DEVIATION_CHART_ROWS):
+    """Gráfico de barras horizontais com os maiores desvios de peso em relação ao índice."""
+    top = comparison.table.head(n).copy()
+    top['Desvio'] = np.where(top['Peso Ativo (%)'] >= 0, 'Acima do índice', 'Abaixo do índice')
+    fig = px.bar(
+        top,
+        x='Peso Ativo (%)',
+        y='Ativo',
+        orientation='h',
+        color='Desvio',
+        color_discrete_map={'Acima do índice': 'seagreen', 'Abaixo do índice': 'indianred'},
+        title=f'🎯 Maiores Desvios vs {comparison.index_name} ({comparison.date:%d/%m/%Y})',
+        hover_data={'Peso Carteira (%)': ':.2f', 'Peso Índice (%)': ':.2f'}
+    )
+    fig.update_layout(
+        yaxis={'categoryorder': 'array', 'categoryarray': top['Ativo'][::-1].tolist()},
+        xaxis_title='Peso ativo (p.p.)',
+        font=dict(size=12)
+    )
+    return fig
@@ -0,0 +1,262 @@
+import streamlit as st
+import pandas as pd
+import numpy as np
+import bisect
+import glob
+import json
+import os
+import threading
+from dataclasses import dataclass
+
+# Diretório com as composições de índices (um JSON por índice e data: IDIV_2025-06-12.json)
+COMPOSITIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "compositions", "indices")
+
+# Fração mínima dos ativos da carteira presentes no índice para sugeri-lo como referência
+# (cobertura, e não Jaccard: carteiras com poucos ativos de um índice grande também contam)
+MIN_MATCH_COVERAGE = 0.6
+
+
+def _to_day(value):
+    """Converte uma data (str, date, Timestamp) para datetime64 em dias."""
+    return np.datetime64(pd.Timestamp(value).date(), 'D')
+
+
+@dataclass(frozen=True)
+class IndexComposition:
+    """
+    Composição de um índice em uma data: DataFrame com Ativo e Peso (%), ordenado por Ativo.
+    """
+
+    index_name: str
+    date: pd.Timestamp
+    weights: pd.DataFrame
+
+
+def read_snapshot_file(path):
+    """
+    Lê um arquivo de composição e retorna (índice, data, tickers, pesos).
+    Índice e data vêm do conteúdo ou, na falta, do nome do arquivo (INDICE_AAAA-MM-DD.json).
+    """
+    with open(path, encoding="utf-8") as f:
+        composition = json.load(f)
+    stem = os.path.splitext(os.path.basename(path))[0]
+    name_part, _, date_part = stem.rpartition("_")
+    index_name = composition.get('index_type') or name_part
+    reference_date = composition.get('reference_date') or date_part
+    data = composition.get('data', [])
+    tickers = [str(item['Ativo']).strip().upper() for item in data]
+    weights = [float(item.get('Peso', 0) or 0) for item in data]
+    return index_name, reference_date, tickers, weights
+
+
+class CompositionStore:
+    """
+    Composições de índices por data, em forma colunar.
+    Para cada índice guarda as datas ordenadas e, alinhado a elas, um bloco por
+    data com os tickers ordenados e os pesos (arrays NumPy). Um índice invertido
+    ticker -> [(índice, data, peso)] ordenado responde o histórico de um ativo.
+    - weights_as_of: busca binária nas datas do índice (O(log n))
+    - weight: busca binária nas datas e nos tickers do bloco (O(log n))
+    - ticker_history: acesso direto ao índice invertido
+    - match: similaridade de uma carteira com todas as composições via índice invertido
+    Novas composições são inseridas sem recarregar as demais.
+    """
+
+    def __init__(self):
+        self.dates = {}     # índice -> np.ndarray datetime64[D] ordenado
+        self.blocks = {}    # índice -> [(tickers ordenados, pesos)] alinhado a dates
+        self.postings = {}  # ticker -> [(índice, data, peso)] ordenado
+        self.totals = {}    # (índice, data) -> soma dos pesos (calculada sob demanda)
+        self.loaded_paths = set()
+        self.lock = threading.RLock()
+
+    @classmethod
+    def from_directory(cls, directory=COMPOSITIONS_DIR):
+        store = cls()
+        store.load_directory(directory)
+        return store
+
+    def load_directory(self, directory=COMPOSITIONS_DIR):
+        """
+        Carrega os arquivos de composição ainda não lidos do diretório.
+        Retorna quantas composições novas foram adicionadas.
+        """
+        added = 0
+        for path in sorted(glob.glob(os.path.join(directory, "*.json"))):
+            if path in self.loaded_paths:
+                continue
+            index_name, reference_date, tickers, weights = read_snapshot_file(path)
+            self.add_snapshot(index_name, reference_date, tickers, weights)
+            with self.lock:
+                self.loaded_paths.add(path)
+            added += 1
+        return added
+
+    def add_snapshot(self, index_name, date, tickers, weights):
+        """
+        Adiciona (ou substitui) a composição de um índice em uma data.
+        """
+        index_name = index_name.upper()
+        day = _to_day(date)
+        tickers = np.asarray(tickers, dtype=object)
+        weights = np.asarray(weights, dtype=float)
+        order = np.argsort(tickers, kind='stable')
+        tickers, weights = tickers[order], weights[order]
+
+        with self.lock:
+            dates = self.dates.get(index_name, np.array([], dtype='datetime64[D]'))
+            blocks = self.blocks.setdefault(index_name, [])
+            pos = int(np.searchsorted(dates, day))
+            if pos < len(dates) and dates[pos] == day:
+                self._remove_postings(index_name, day, blocks[pos][0])
+                blocks[pos] = (tickers, weights)
+                self.totals.pop((index_name, day), None)
+            else:
+                self.dates[index_name] = np.insert(dates, pos, day)
+                blocks.insert(pos, (tickers, weights))
+            for ticker, weight in zip(tickers, weights):
+                bisect.insort(self.postings.setdefault(ticker, []), (index_name, day, float(weight)))
+
+    def _remove_postings(self, index_name, day, tickers):
+        for ticker in tickers:
+            entries = self.postings.get(ticker, [])
+            self.postings[ticker] = [e for e in entries if not (e[0] == index_name and e[1] == day)]
+
+    def indices(self):
+        """Índices com ao menos uma composição."""
+        with self.lock:
+            return sorted(self.dates)
+
+    def snapshot_dates(self, index_name):
+        """Datas das composições de um índice, em ordem crescente."""
+        with self.lock:
+            return [pd.Timestamp(d) for d in self.dates.get(index_name.upper(), [])]
+
+    def weights_as_of(self, index_name, date=None):
+        """
+        Composição vigente do índice na data (a mais recente até ela; sem data, a última).
+        Retorna IndexComposition ou None se não houver composição até a data.
+        """
+        index_name = index_name.upper()
+        with self.lock:
+            dates = self.dates.get(index_name)
+            if dates is None or not len(dates):
+                return None
+            pos = len(dates) - 1 if date is None else int(np.searchsorted(dates, _to_day(date), side='right')) - 1
+            if pos < 0:
+                return None
+            tickers, weights = self.blocks[index_name][pos]
+            snapshot_date = pd.Timestamp(dates[pos])
+        return IndexComposition(index_name, snapshot_date, pd.DataFrame({'Ativo': tickers.astype(str), 'Peso': weights}))
+
+    def weight(self, index_name, date, ticker):
+        """
+        Peso (%) de um ativo no índice na data (0.0 se não fizer parte), ou None sem composição.
+        """
+        index_name = index_name.upper()
+        with self.lock:
+            dates = self.dates.get(index_name)
+            if dates is None:
+                return None
+            pos = int(np.searchsorted(dates, _to_day(date), side='right')) - 1
+            if pos < 0:
+                return None
+            tickers, weights = self.blocks[index_name][pos]
+        i = int(np.searchsorted(tickers, ticker))
+        return float(weights[i]) if i < len(tickers) and tickers[i] == ticker else 0.0
+
+    def ticker_history(self, ticker, index_name=None):
+        """
+        Histórico do peso de um ativo: DataFrame com Índice, Data e Peso (%).
+        """
+        with self.lock:
+            entries = list(self.postings.get(ticker.upper(), []))
+        if index_name is not None:
+            entries = [e for e in entries if e[0] == index_name.upper()]
+        return pd.DataFrame({
+            'Índice': [e[0] for e in entries],
+            'Data': pd.to_datetime([e[1] for e in entries]),
+            'Peso': [e[2] for e in entries],
+        })
+
+    def match(self, tickers, weights=None):
+        """
+        Compara um conjunto de tickers com todas as composições salvas usando o
+        índice invertido: só as composições que contêm algum dos tickers são visitadas.
+        weights (opcional, em %, alinhado a tickers) permite calcular a sobreposição
+        de pesos (soma dos menores pesos) além da similaridade de Jaccard.
+        Cobertura é a fração dos ativos da carteira presentes na composição.
+        Retorna DataFrame (Índice, Data, Em Comum, Cobertura, Jaccard, Sobreposição (%))
+        ordenado da composição mais parecida para a menos parecida.
+        """
+        tickers = [str(t).upper() for t in tickers]
+        if weights is None:
+            portfolio = dict.fromkeys(tickers, 0.0)
+        else:
+            portfolio = {}
+            for ticker, weight in zip(tickers, weights):
+                portfolio[ticker] = portfolio.get(ticker, 0.0) + float(weight)
+        portfolio_total = sum(portfolio.values())
+
+        common = {}
+        overlap = {}
+        with self.lock:
+            for ticker, portfolio_weight in portfolio.items():
+                share = portfolio_weight / portfolio_total * 100 if portfolio_total > 0 else 0.0
+                for index_name, day, weight in self.postings.get(ticker, ()):
+                    key = (index_name, day)
+                    common[key] = common.get(key, 0) + 1
+                    overlap[key] = overlap.get(key, 0.0) + min(share, weight / self._total(index_name, day) * 100)
+            sizes = {key: self._size(*key) for key in common}
+
+        keys = list(common)
+        in_common = np.array([common[k] for k in keys], dtype=float)
+        union = len(portfolio) + np.array([sizes[k] for k in keys], dtype=float) - in_common
+        result = pd.DataFrame({
+            'Índice': [k[0] for k in keys],
+            'Data': pd.to_datetime([k[1] for k in keys]),
+            'Em Comum': in_common.astype(int),
+            'Cobertura': in_common / len(portfolio) if keys else np.array([]),
+            'Jaccard': in_common / union if keys else np.array([]),
+            'Sobreposição (%)': [overlap[k] for k in keys] if weights is not None else np.nan,
+        })
+        sort_by = ['Sobreposição (%)', 'Jaccard', 'Data'] if weights is not None else ['Jaccard', 'Data']
+        return result.sort_values(sort_by, ascending=False).reset_index(drop=True)
+
+    def best_match(self, tickers, weights=None, min_coverage=MIN_MATCH_COVERAGE):
+        """
+        Índice mais parecido com a carteira (pela composição mais parecida) entre
+        as composições que contêm ao menos min_coverage dos ativos da carteira,
+        ou None se nenhuma atingir a cobertura mínima.
+        Retorna a linha de match() como dicionário.
+        """
+        matches = self.match(tickers, weights)
+        matches = matches[matches['Cobertura'] >= min_coverage]
+        return None if matches.empty else matches.iloc[0].to_dict()
+
+    def _position(self, index_name, day):
+        return int(np.searchsorted(self.dates[index_name], day))
+
+    def _size(self, index_name, day):
+        return len(self.blocks[index_name][self._position(index_name, day)][0])
+
+    def _total(self, index_name, day):
+        total = self.totals.get((index_name, day))
+        if total is None:
+            total = float(self.blocks[index_name][self._position(index_name, day)][1].sum()) or 1.0
+            self.totals[(index_name, day)] = total
+        return total
+
+    def all_tickers(self):
+        """Todos os tickers presentes em alguma composição."""
+        with self.lock:
+            return {ticker for ticker, entries in self.postings.items() if entries}
+
+
+@st.cache_resource
+def get_composition_store():
+    """
+    Retorna o armazenamento de composições compartilhado entre sessões.
+    Arquivos adicionados depois ao diretório são lidos com load_directory().
+    """
+    return CompositionStore.from_directory()
@@ -0,0 +1,132 @@
+import numpy as np
+import pandas as pd
+from volume_engine import VOLUME_WINDOWS
+
+# Parâmetros de liquidez oferecidos no dashboard
+PARTICIPATION_RATES = (0.05, 0.10, 0.20, 0.30, 0.50)
+DEFAULT_PARTICIPATION = 0.20
+LIQUIDATION_TARGETS = (0.25, 0.50, 1.00)
+DEFAULT_LIQUIDITY_WINDOW = 45
+MAX_DAYS_DISPLAY = 999  # Limite de dias nos gráficos
+
+
+def median_volume_frame(volume_data, windows=VOLUME_WINDOWS):
+    """
+    Monta um DataFrame (índice Ativo_API, uma coluna por janela) com a mediana
+    de volume financeiro de cada ativo. Janelas sem dias suficientes usam a
+    'median_volume' do ativo, como no cálculo original.
+    """
+    tickers = list(volume_data)
+    fallback = np.array([volume_data[t]['median_volume'] for t in tickers], dtype=float)
+    medians = np.array(
+        [[volume_data[t].get('medians', {}).get(w, np.nan) for w in windows] for t in tickers],
+        dtype=float
+    ).reshape(len(tickers), len(windows))
+    medians = np.where(np.isfinite(medians), medians, fallback[:, None])
+    return pd.DataFrame(medians, index=pd.Index(tickers, name='Ativo_API'), columns=list(windows))
+
+
+def available_windows(volume_data, windows=VOLUME_WINDOWS):
+    """
+    Janelas com mediana própria para ao menos um ativo; as demais só repetiriam
+    a 'median_volume' de median_volume_frame e não são oferecidas no dashboard.
+    """
+    return [
+        w for w in windows
+        if any(np.isfinite(entry.get('medians', {}).get(w, np.nan)) for entry in volume_data.values())
+    ]
+
+
+def build_liquidity_table(positions, volume_data, participation_rates=PARTICIPATION_RATES,
+                          windows=VOLUME_WINDOWS, targets=(1.0,)):
+    """
+    Calcula os dias para liquidar cada posição para todas as combinações de
+    janela da mediana, participação no volume diário e alvo (fração da posição).
+    positions deve ter as colunas 'Ativo', 'Ativo_API' e 'Valor Total'.
+    Retorna uma tabela longa com uma linha por (ativo, janela, participação, alvo).
+    """
+    medians = median_volume_frame(volume_data, windows)
+    merged = positions[['Ativo', 'Ativo_API', 'Valor Total']].merge(
+        medians, left_on='Ativo_API', right_index=True, how='inner'
+    )
+
+    n_windows, n_rates, n_targets = len(windows), len(participation_rates), len(targets)
+    values = merged['Valor Total'].to_numpy(dtype=float)
+    median_matrix = merged[list(windows)].to_numpy(dtype=float)
+
+    # Dimensões: (ativo, janela, participação, alvo)
+    capacity = median_matrix[:, :, None, None] * np.asarray(participation_rates, dtype=float)[None, None, :, None]
+    amount = values[:, None, None, None] * np.asarray(targets, dtype=float)[None, None, None, :]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        days = np.where(capacity > 0, amount / capacity, np.inf)
+
+    shape = (len(merged), n_windows, n_rates, n_targets)
+    return pd.DataFrame({
+        'Ativo': np.repeat(merged['Ativo'].to_numpy(), n_windows * n_rates * n_targets),
+        'Ativo_API': np.repeat(merged['Ativo_API'].to_numpy(), n_windows * n_rates * n_targets),
+        'Valor Total': np.broadcast_to(values[:, None, None, None], shape).ravel(),
+        'Janela (dias)': np.broadcast_to(np.asarray(windows)[None, :, None, None], shape).ravel(),
+        'Participação': np.broadcast_to(np.asarray(participation_rates)[None, None, :, None], shape).ravel(),
+        'Alvo': np.broadcast_to(np.asarray(targets)[None, None, None, :], shape).ravel(),
+        'Mediana': np.broadcast_to(median_matrix[:, :, None, None], shape).ravel(),
+        'Volume Diário': np.broadcast_to(capacity, shape).ravel(),
+        'Dias para Liquidar': days.ravel(),
+    })
+
+
+def select_liquidity(table, window, participation_rate, target=1.0):
+    """
+    Filtra a tabela de liquidez para uma combinação de janela, participação e alvo.
+    """
+    mask = (
+        (table['Janela (dias)'] == window)
+        & np.isclose(table['Participação'], participation_rate)
+        & np.isclose(table['Alvo'], target)
+    )
+    return table[mask].reset_index(drop=True)
+
+
+def book_liquidation_days(table, window, participation_rate, targets=LIQUIDATION_TARGETS):
+    """
+    Dias para liquidar cada fração (alvo) do valor total da carteira vendendo
+    todas as posições em paralelo, cada uma limitada à participação no seu volume diário.
+    Retorna {alvo: dias} (inf quando o alvo não é atingível).
+    """
+    positions = select_liquidity(table, window, participation_rate, 1.0)
+    values = positions['Valor Total'].to_numpy(dtype=float)
+    capacity = positions['Volume Diário'].to_numpy(dtype=float)
+    total_value = values.sum()
+
+    finite = capacity > 0
+    values_finite = values[finite]
+    capacity_finite = capacity[finite]
+    days_full = values_finite / capacity_finite
+
+    # Entre pontos de quebra (dias em que uma posição zera) o valor liquidado cresce linearmente
+    order = np.argsort(days_full)
+    breakpoints = days_full[order]
+    remaining_capacity = capacity_finite.sum() - np.cumsum(capacity_finite[order])
+    liquidated_at = np.cumsum(values_finite[order]) + breakpoints * remaining_capacity
+
+    # Com todas as posições liquidáveis, o total vem da mesma soma acumulada dos pontos
+    # de quebra (values.sum() soma em outra ordem e pode passar alguns ULPs do último ponto)
+    all_finite = bool(finite.all()) and len(breakpoints) > 0
+    if all_finite:
+        total_value = liquidated_at[-1]
+
+    needs = np.asarray(targets, dtype=float) * total_value
+    k = np.searchsorted(liquidated_at, needs)
+    result = {}
+    for target, need, idx in zip(targets, needs, k):
+        if total_value <= 0:
+            result[target] = 0.0
+            continue
+        if idx >= len(breakpoints):
+            # Só é inatingível se alguma posição não tem capacidade de venda
+            result[target] = breakpoints[-1] if all_finite else np.inf
+            continue
+        previous_day = breakpoints[idx - 1] if idx > 0 else 0.0
+        previous_liquidated = liquidated_at[idx - 1] if idx > 0 else 0.0
+        speed = remaining_capacity[idx - 1] if idx > 0 else capacity_finite.sum()
+        result[target] = previous_day + (need - previous_liquidated) / speed
+    return result
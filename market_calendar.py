@@ -0,0 +1,119 @@
+from datetime import date, datetime, time as dtime, timedelta
+from functools import lru_cache
+from zoneinfo import ZoneInfo
+
+# Fuso e horário do pregão da B3 (inclui call de fechamento e ajustes pós-pregão)
+B3_TIMEZONE = ZoneInfo("America/Sao_Paulo")
+SESSION_OPEN = dtime(10, 0)
+SESSION_CLOSE = dtime(18, 0)
+
+# Validade das cotações durante o pregão; fora dele valem até a próxima abertura
+SESSION_QUOTE_TTL = 60
+MIN_OFF_HOURS_TTL = 300
+
+# Após o fechamento as fontes ainda publicam os últimos negócios (atraso de ~15 min);
+# nesse intervalo as cotações mantêm a validade curta do pregão
+POST_CLOSE_GRACE = timedelta(minutes=30)
+
+
+def _easter(year):
+    """
+    Data do domingo de Páscoa (algoritmo de Meeus/Jones/Butcher).
+    """
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+
+@lru_cache(maxsize=32)
+def b3_holidays(year):
+    """
+    Feriados sem pregão na B3 em um ano: feriados nacionais, Carnaval,
+    Sexta-feira Santa, Corpus Christi, véspera de Natal e último dia do ano.
+    """
+    easter = _easter(year)
+    holidays = {
+        date(year, 1, 1),    # Confraternização Universal
+        date(year, 4, 21),   # Tiradentes
+        date(year, 5, 1),    # Dia do Trabalho
+        date(year, 9, 7),    # Independência
+        date(year, 10, 12),  # Nossa Senhora Aparecida
+        date(year, 11, 2),   # Finados
+        date(year, 11, 15),  # Proclamação da República
+        date(year, 12, 24),  # Véspera de Natal
+        date(year, 12, 25),  # Natal
+        date(year, 12, 31),  # Último dia útil do ano
+        easter - timedelta(days=48),  # Carnaval (segunda)
+        easter - timedelta(days=47),  # Carnaval (terça)
+        easter - timedelta(days=2),   # Sexta-feira Santa
+        easter + timedelta(days=60),  # Corpus Christi
+    }
+    if year >= 2024:
+        holidays.add(date(year, 11, 20))  # Dia da Consciência Negra
+    return frozenset(holidays)
+
+
+def is_trading_day(day):
+    """
+    Indica se há pregão na B3 na data informada.
+    """
+    return day.weekday() < 5 and day not in b3_holidays(day.year)
+
+
+def now_b3():
+    """
+    Data e hora atuais no fuso da B3.
+    """
+    return datetime.now(B3_TIMEZONE)
+
+
+def is_market_open(moment=None):
+    """
+    Indica se o pregão está aberto no instante informado (padrão: agora).
+    """
+    moment = moment or now_b3()
+    return is_trading_day(moment.date()) and SESSION_OPEN <= moment.time() < SESSION_CLOSE
+
+
+def next_market_open(moment=None):
+    """
+    Próxima abertura do pregão a partir do instante informado (padrão: agora).
+    """
+    moment = moment or now_b3()
+    day = moment.date()
+    if moment.time() >= SESSION_OPEN:
+        day += timedelta(days=1)
+    while not is_trading_day(day):
+        day += timedelta(days=1)
+    return datetime.combine(day, SESSION_OPEN, tzinfo=B3_TIMEZONE)
+
+
+def in_post_close_grace(moment=None):
+    """
+    Indica se o instante informado (padrão: agora) está logo após o fechamento de
+    um pregão, enquanto as cotações atrasadas ainda podem mudar.
+    """
+    moment = moment or now_b3()
+    grace_end = (datetime.combine(moment.date(), SESSION_CLOSE) + POST_CLOSE_GRACE).time()
+    return is_trading_day(moment.date()) and SESSION_CLOSE <= moment.time() < grace_end
+
+
+def quote_ttl(moment=None):
+    """
+    Validade (em segundos) de uma cotação obtida no instante informado:
+    curta durante o pregão e logo após o fechamento (POST_CLOSE_GRACE) e,
+    depois disso, até a próxima abertura.
+    """
+    moment = moment or now_b3()
+    if is_market_open(moment) or in_post_close_grace(moment):
+        return SESSION_QUOTE_TTL
+    seconds_to_open = (next_market_open(moment) - moment).total_seconds()
+    return max(MIN_OFF_HOURS_TTL, seconds_to_open)
@@ -0,0 +1,659 @@
+import streamlit as st
+import pandas as pd
+import numpy as np
+import random
+import requests
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+import yfinance as yf
+from history_store import get_history_store
+from volume_engine import MIN_HISTORICAL_DAYS, VOLUME_WINDOWS, compute_volume_stats, min_window_days, stack_histories
+from quote_cache import get_quote_cache
+
+# Janela de histórico buscada (6 meses, ~125 pregões, cobrem a maior janela de
+# VOLUME_WINDOWS; buscas completas começam em history_window_start()) e janela
+# usada na mediana de volume financeiro
+HISTORY_MONTHS = 6
+YFINANCE_PERIOD = f"{HISTORY_MONTHS}mo"
+VOLUME_WINDOW_DAYS = 45
+
+# Modos de busca suportados pelo yfinance
+YFINANCE_MODES = ("batch", "sequential")
+
+# Configuração da brapi.dev
+BRAPI_BASE_URL = "https://brapi.dev"
+BRAPI_HISTORY_DAYS = 150  # Dias corridos (~100 pregões)
+
+# Folga (dias corridos) entre o início da janela e a primeira barra salva: fins de
+# semana e feriados no começo da janela não contam como histórico faltando
+HISTORY_START_TOLERANCE_DAYS = 7
+BRAPI_REQUESTS_PER_SECOND = 5.0  # Ajuste conforme a cota do plano contratado
+BRAPI_MAX_WORKERS = 8
+BRAPI_MAX_RETRIES = 4
+BRAPI_BACKOFF_BASE = 0.5  # Segundos; dobra a cada nova tentativa
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+def _volume_entry_without_history(current_volume_financial):
+    """
+    Dados de volume de um ativo sem histórico suficiente: a mediana cai para o volume atual.
+    """
+    return {
+        'median_volume': current_volume_financial,
+        'volumes': np.empty(0),
+        'current_volume': current_volume_financial,
+        'days_analyzed': 0,
+        'has_historical': False,
+        'ratio': 100.0,
+        'medians': {window: np.nan for window in VOLUME_WINDOWS}
+    }
+
+
+def build_volume_entries(histories, current_volumes=None, window=VOLUME_WINDOW_DAYS):
+    """
+    Calcula preço atual e dados de volume financeiro de todos os históricos de uma vez
+    (DataFrames com colunas 'Close' e 'Volume'), usando o volume_engine.
+    current_volumes ({ticker: R$}) substitui o volume financeiro do último pregão.
+    Os volumes diários da janela ficam em um array float, e 'medians' traz a mediana
+    de cada janela de VOLUME_WINDOWS (NaN quando o histórico não cobre a janela,
+    ver volume_engine.min_window_days).
+    Retorna {ticker: (preço atual, dicionário de volume)}.
+    """
+    tickers, close, volume = stack_histories(histories)
+    if not tickers:
+        return {}
+
+    current_volume = None
+    if current_volumes is not None:
+        current_volume = [current_volumes[t] for t in tickers]
+    stats = compute_volume_stats(close, volume, current_volume=current_volume)
+
+    results = {}
+    for i, ticker in enumerate(tickers):
+        current_volume_financial = stats['current_volume'][i]
+        days_analyzed = int(stats['days'][window][i])
+        if days_analyzed < MIN_HISTORICAL_DAYS:
+            results[ticker] = (stats['current_price'][i], _volume_entry_without_history(current_volume_financial))
+            continue
+
+        window_valid = stats['valid'][i, -window:]
+        results[ticker] = (stats['current_price'][i], {
+            'median_volume': stats['median'][window][i],
+            'volumes': stats['financial'][i, -window:][window_valid],
+            'current_volume': current_volume_financial,
+            'days_analyzed': days_analyzed,
+            'has_historical': True,
+            'ratio': stats['ratio'][window][i],
+            'medians': {
+                w: stats['median'][w][i] if stats['days'][w][i] >= min_window_days(w) else np.nan
+                for w in VOLUME_WINDOWS
+            }
+        })
+
+    return results
+
+
+def split_batch_history(data, tickers):
+    """
+    Separa o DataFrame retornado por yf.download(group_by='ticker') em um
+    histórico por ticker, descartando os dias sem pregão de cada ativo.
+    """
+    histories = {}
+    if data is None or data.empty:
+        return histories
+
+    if not isinstance(data.columns, pd.MultiIndex):
+        # Versões antigas do yfinance não agrupam quando há um único ticker
+        if len(tickers) == 1:
+            histories[tickers[0]] = data.dropna(subset=['Close'])
+        return histories
+
+    available = set(data.columns.get_level_values(0))
+    for ticker in tickers:
+        if ticker not in available:
+            continue
+        hist_data = data[ticker].dropna(subset=['Close'])
+        if not hist_data.empty:
+            histories[ticker] = hist_data
+
+    return histories
+
+
+def history_window_start():
+    """
+    Data inicial da janela de histórico usada no yfinance (HISTORY_MONTHS atrás).
+    """
+    return pd.Timestamp.today().normalize() - pd.DateOffset(months=HISTORY_MONTHS)
+
+
+def incremental_start_dates(store, source, tickers, window_start):
+    """
+    Para os tickers cujo histórico salvo da fonte cobre a janela (começa até o início
+    dela e ainda não saiu dela), retorna {ticker: última barra salva}, de onde a busca
+    recomeça (inclusive, para atualizar o pregão parcial). Os demais, inclusive os
+    salvos por uma busca com janela menor, são buscados desde o início da janela.
+    """
+    if store is None:
+        return {}
+    window_start = pd.Timestamp(window_start)
+    latest_first = window_start + pd.Timedelta(days=HISTORY_START_TOLERANCE_DAYS)
+    return {
+        ticker: last_date
+        for ticker, (first_date, last_date) in store.date_ranges(source, tickers).items()
+        if first_date <= latest_first and last_date >= window_start
+    }
+
+
+def _fetch_yfinance_sequential(tickers, progress_bar, start_dates, window_start):
+    """
+    Busca o histórico de cada ticker individualmente (uma requisição por ativo).
+    Tickers em start_dates buscam apenas a partir da data informada; os demais,
+    a janela inteira desde window_start.
+    """
+    histories = {}
+    for i, original_ticker in enumerate(tickers):
+        progress_text = f"📈 Buscando: {original_ticker.replace('.SA', '')} ({i + 1}/{len(tickers)})"
+        progress_bar.progress((i + 1) / len(tickers), text=progress_text)
+
+        try:
+            ticker_obj = yf.Ticker(original_ticker)
+            if original_ticker in start_dates:
+                hist_data = ticker_obj.history(start=start_dates[original_ticker].strftime("%Y-%m-%d"), interval="1d")
+            else:
+                hist_data = ticker_obj.history(start=window_start.strftime("%Y-%m-%d"), interval="1d")
+            if not hist_data.empty:
+                histories[original_ticker] = hist_data
+        except Exception:
+            pass
+
+        time.sleep(0.1)  # Pausa pequena para não sobrecarregar
+
+    return histories
+
+
+def _fetch_yfinance_batch(tickers, progress_bar, start_dates, window_start):
+    """
+    Busca o histórico dos tickers em requisições agrupadas e separa o resultado
+    por ativo: um lote com a janela completa (desde window_start) para quem não
+    tem histórico salvo que a cubra e outro apenas com os pregões faltantes para os demais.
+    """
+    full = [t for t in tickers if t not in start_dates]
+    incremental = [t for t in tickers if t in start_dates]
+
+    batches = []
+    if full:
+        batches.append((full, {'start': window_start.strftime("%Y-%m-%d")}))
+    if incremental:
+        start = min(start_dates[t] for t in incremental)
+        batches.append((incremental, {'start': start.strftime("%Y-%m-%d")}))
+
+    histories = {}
+    for i, (batch, window) in enumerate(batches):
+        progress_bar.progress((i + 0.5) / len(batches), text=f"📦 Buscando {len(batch)} ativos em lote...")
+        try:
+            data = yf.download(
+                batch,
+                interval="1d",
+                group_by='ticker',
+                auto_adjust=True,
+                threads=True,
+                progress=False,
+                **window
+            )
+        except Exception:
+            continue
+        histories.update(split_batch_history(data, batch))
+
+    progress_bar.progress(1.0, text="✅ Lote recebido")
+    return histories
+
+
+def _download_yfinance_histories(tickers, mode, store, progress_bar):
+    """
+    Baixa o histórico diário dos tickers no modo escolhido, passando pelo
+    histórico em disco quando há um store.
+    Retorna {ticker: histórico} apenas para os tickers atualizados nesta busca.
+    """
+    window_start = history_window_start()
+    start_dates = incremental_start_dates(store, "yfinance", tickers, window_start)
+
+    if mode == "batch":
+        histories = _fetch_yfinance_batch(tickers, progress_bar, start_dates, window_start)
+    else:
+        histories = _fetch_yfinance_sequential(tickers, progress_bar, start_dates, window_start)
+
+    if store is not None:
+        for ticker, hist_data in histories.items():
+            store.save("yfinance", ticker, hist_data)
+        # Só considera encontrados os tickers atualizados nesta busca
+        stored = store.load("yfinance", list(histories), window_start)
+        histories = {t: stored.get(t, h) for t, h in histories.items()}
+
+    return histories
+
+
+def _fetch_yfinance_quotes(tickers, mode, store, progress_bar):
+    """
+    Busca os tickers no yfinance e retorna {ticker: (preço, dados de volume)}
+    para os encontrados.
+    """
+    histories = _download_yfinance_histories(tickers, mode, store, progress_bar)
+    return build_volume_entries(histories)
+
+
+class _SilentProgress:
+    """
+    Barra de progresso nula, usada nas atualizações em segundo plano
+    (threads sem contexto do Streamlit não podem desenhar na página).
+    """
+
+    def progress(self, *args, **kwargs):
+        pass
+
+    def empty(self):
+        pass
+
+
+def _stale_from_store(store, source, tickers, start_date):
+    """
+    Última cotação conhecida de cada ticker a partir do histórico em disco da fonte.
+    Retorna {ticker: (preço, dados de volume)} para os tickers com barras salvas.
+    """
+    return build_volume_entries(store.load(source, tickers, start_date))
+
+
+def _refresh_in_background(quote_cache, source, tickers, fetch):
+    """
+    Atualiza as cotações dos tickers em uma thread e grava o resultado no cache.
+    fetch(tickers) deve retornar {ticker: (preço, dados de volume)}.
+    Retorna quantos tickers tiveram a atualização disparada agora.
+    """
+    claimed = quote_cache.claim_refresh(source, tickers)
+    if not claimed:
+        return 0
+
+    def refresh():
+        try:
+            for ticker, (price, volume_entry) in fetch(claimed).items():
+                quote_cache.put(source, ticker, price, volume_entry)
+        except Exception:
+            pass  # A próxima leitura tentará novamente
+        finally:
+            quote_cache.release_refresh(source, claimed)
+
+    threading.Thread(target=refresh, daemon=True).start()
+    return len(claimed)
+
+
+def _split_cached_quotes(quote_cache, source, tickers, store, stale_start, stale_while_revalidate):
+    """
+    Separa os tickers entre cotações prontas para exibir e tickers a buscar agora.
+    Com stale_while_revalidate, cotações expiradas (ou, após reinício, a última
+    barra do histórico em disco) são exibidas e ficam listadas para atualização
+    em segundo plano.
+    Retorna ({ticker: (preço, dados de volume)}, [a buscar], [a revalidar]).
+    """
+    fresh, stale, missing = quote_cache.get_many(source, tickers)
+    if not stale_while_revalidate:
+        return fresh, [t for t in tickers if t not in fresh], []
+
+    if store is not None and missing:
+        stale.update(_stale_from_store(store, source, missing, stale_start))
+    ready = {**fresh, **stale}
+    return ready, [t for t in tickers if t not in ready], list(stale)
+
+
+def _report_cache_usage(ready_count, revalidating_count):
+    """
+    Informa quantas cotações vieram do cache e quantas estão sendo atualizadas.
+    """
+    if ready_count - revalidating_count > 0:
+        st.info(f"⚡ {ready_count - revalidating_count} cotações reaproveitadas do cache")
+    if revalidating_count:
+        st.info(f"🔄 {revalidating_count} cotações exibidas da última consulta e sendo atualizadas "
+                f"em segundo plano. Busque novamente em instantes para ver os valores novos.")
+
+
+def get_yfinance_quotes(tickers, mode="batch", use_store=True, stale_while_revalidate=False):
+    """
+    Busca cotações e dados históricos usando yfinance.
+    mode='batch' baixa todos os tickers em uma única requisição agrupada;
+    mode='sequential' faz uma requisição por ticker.
+    Cotações ainda válidas no cache por ticker não são buscadas novamente; com
+    stale_while_revalidate=True, as expiradas são retornadas na hora e atualizadas
+    em segundo plano.
+    Com use_store=True, o histórico fica salvo em disco e só os pregões
+    posteriores à última barra salva são buscados (a janela inteira quando o
+    histórico salvo não chega ao início dela).
+    Retorna um dicionário com os tickers, seus preços e dados de volume financeiro.
+    """
+    if not tickers:
+        return {}, [], {}
+    if mode not in YFINANCE_MODES:
+        raise ValueError(f"Modo inválido: {mode}. Use um de {YFINANCE_MODES}")
+
+    quote_cache = get_quote_cache()
+    store = get_history_store() if use_store else None
+
+    # Reaproveita as cotações por ticker já conhecidas no cache compartilhado
+    results, tickers_to_fetch, tickers_to_revalidate = _split_cached_quotes(
+        quote_cache, "yfinance", tickers, store, history_window_start(), stale_while_revalidate
+    )
+    _refresh_in_background(
+        quote_cache, "yfinance", tickers_to_revalidate,
+        lambda stale_tickers: _fetch_yfinance_quotes(stale_tickers, mode, store, _SilentProgress())
+    )
+    _report_cache_usage(len(results), len(tickers_to_revalidate))
+
+    not_found_tickers = []
+    if tickers_to_fetch:
+        st.info(f"🔍 Buscando cotações e dados históricos via yfinance para {len(tickers_to_fetch)} ativos...")
+        progress_bar = st.progress(0, text="🚀 Iniciando busca via yfinance...")
+        fetched = _fetch_yfinance_quotes(tickers_to_fetch, mode, store, progress_bar)
+        progress_bar.empty()
+
+        for ticker, (price, volume_entry) in fetched.items():
+            quote_cache.put("yfinance", ticker, price, volume_entry)
+        results.update(fetched)
+        not_found_tickers = [t for t in tickers_to_fetch if t not in fetched]
+
+    prices = {t: results[t][0] for t in tickers if t in results}
+    volume_data = {t: results[t][1] for t in tickers if t in results}
+
+    # Mensagem de sucesso
+    historical_count = len([v for v in volume_data.values() if v.get('has_historical', False)])
+    total_days = sum([v.get('days_analyzed', 0) for v in volume_data.values()])
+
+    st.success(f"✅ yfinance: {len(prices)} cotações encontradas.")
+    st.info(f"📊 Volume financeiro: {historical_count} ativos com dados históricos (total: {total_days} dias analisados)")
+
+    if not_found_tickers:
+        st.warning(f"⚠️ Não foi possível encontrar cotações para: {', '.join(not_found_tickers)}")
+
+    return prices, not_found_tickers, volume_data
+
+
+class TokenBucket:
+    """
+    Limitador de taxa do tipo token bucket, seguro para uso entre threads.
+    Libera até `rate` requisições por segundo, com rajadas de até `capacity`.
+    """
+
+    def __init__(self, rate, capacity=None):
+        if rate <= 0:
+            raise ValueError("A taxa de requisições deve ser positiva")
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Bloqueia até haver um token disponível e o consome.
+        """
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+@st.cache_resource
+def get_brapi_rate_limiter(requests_per_second=BRAPI_REQUESTS_PER_SECOND):
+    """
+    Retorna o token bucket da brapi.dev compartilhado entre todas as sessões.
+    """
+    return TokenBucket(requests_per_second)
+
+
+def _retry_delay(attempt, response=None):
+    """
+    Calcula a espera antes da próxima tentativa: respeita o Retry-After quando
+    presente, senão usa backoff exponencial com jitter.
+    """
+    if response is not None:
+        retry_after = response.headers.get('Retry-After')
+        if retry_after:
+            try:
+                return float(retry_after)
+            except ValueError:
+                pass
+    return BRAPI_BACKOFF_BASE * (2 ** attempt) * random.uniform(0.5, 1.5)
+
+
+def brapi_get(session, url, limiter, max_retries=BRAPI_MAX_RETRIES):
+    """
+    Faz um GET na brapi.dev respeitando o limitador de taxa.
+    Respostas 429/5xx e falhas de conexão são repetidas com backoff;
+    as demais respostas são devolvidas como vieram.
+    """
+    for attempt in range(max_retries + 1):
+        limiter.acquire()
+        try:
+            response = session.get(url, timeout=15)
+        except requests.exceptions.RequestException:
+            if attempt == max_retries:
+                raise
+            time.sleep(_retry_delay(attempt))
+            continue
+
+        if response.status_code in RETRYABLE_STATUS_CODES and attempt < max_retries:
+            time.sleep(_retry_delay(attempt, response))
+            continue
+        return response
+
+
+_brapi_sessions = threading.local()
+
+
+def _get_brapi_session(api_key):
+    """
+    Retorna uma requests.Session por thread, já com o cabeçalho de autorização.
+    """
+    session = getattr(_brapi_sessions, 'session', None)
+    if session is None:
+        session = requests.Session()
+        _brapi_sessions.session = session
+    session.headers['Authorization'] = f'Bearer {api_key}'
+    return session
+
+
+def brapi_bars(historical):
+    """
+    Converte a lista 'historical' da brapi.dev em um DataFrame com colunas
+    'Close' e 'Volume' indexado por data.
+    """
+    df = pd.DataFrame(historical)
+    if df.empty or not {'date', 'close', 'volume'} <= set(df.columns):
+        return None
+    if pd.api.types.is_numeric_dtype(df['date']):
+        dates = pd.to_datetime(df['date'], unit='s')
+    else:
+        dates = pd.to_datetime(df['date'], utc=True).dt.tz_localize(None)
+    return pd.DataFrame({
+        'Close': pd.to_numeric(df['close'], errors='coerce').to_numpy(),
+        'Volume': pd.to_numeric(df['volume'], errors='coerce').to_numpy()
+    }, index=pd.DatetimeIndex(dates).normalize())
+
+
+def fetch_brapi_ticker(original_ticker, api_key, limiter, start_date, end_date, base_url=BRAPI_BASE_URL):
+    """
+    Busca cotação atual e histórico diário de um ticker na brapi.dev.
+    Retorna (ticker, preço, volume financeiro atual, barras, erro);
+    preço None indica ticker não encontrado.
+    """
+    # A API da brapi não usa o sufixo .SA, então o removemos
+    ticker_clean = original_ticker.replace('.SA', '')
+    session = _get_brapi_session(api_key)
+
+    try:
+        response_quote = brapi_get(session, f"{base_url}/api/quote/{ticker_clean}", limiter)
+        if response_quote.status_code == 404:
+            # Erros 404 (Not Found) são comuns para tickers inválidos, não são um erro fatal.
+            return original_ticker, None, None, None, None
+        response_quote.raise_for_status()
+        results_quote = response_quote.json().get('results', [])
+    except requests.exceptions.RequestException as e:
+        return original_ticker, None, None, None, f"{ticker_clean}: {e}"
+
+    if not results_quote or results_quote[0].get('regularMarketPrice') is None:
+        return original_ticker, None, None, None, None
+
+    current_price = results_quote[0]['regularMarketPrice']
+    current_volume_shares = results_quote[0].get('regularMarketVolume') or 0
+    current_volume_financial = current_volume_shares * current_price  # Volume financeiro atual
+
+    # Busca dados históricos usando o endpoint /historical/
+    bars = None
+    try:
+        url_historical = f"{base_url}/api/quote/historical/{ticker_clean}?start={start_date}&end={end_date}&interval=1d"
+        response_hist = brapi_get(session, url_historical, limiter)
+
+        if response_hist.status_code == 200:
+            results_hist = response_hist.json().get('results', [])
+
+            if results_hist and results_hist[0].get('historical'):
+                bars = brapi_bars(results_hist[0]['historical'])
+    except (requests.exceptions.RequestException, ValueError):
+        # Sem histórico, a mediana cai para o volume atual
+        bars = None
+
+    return original_ticker, current_price, current_volume_financial, bars, None
+
+
+def _download_brapi_quotes(tickers, api_key, limiter, base_url, store, start_date, end_date, progress_bar):
+    """
+    Busca cotação e histórico dos tickers na brapi.dev em paralelo.
+    Retorna ({ticker: (preço, dados de volume)}, não encontrados, erros).
+    """
+    results = {}
+    not_found_tickers = []
+    errors = []
+
+    # Com histórico salvo cobrindo a janela, pede apenas a partir da última barra (inclusive)
+    ticker_start_dates = {
+        ticker: last_date.strftime("%Y-%m-%d")
+        for ticker, last_date in incremental_start_dates(store, "brapi", tickers, start_date).items()
+    }
+
+    quotes = {}
+    fetched_bars = {}
+    with ThreadPoolExecutor(max_workers=min(BRAPI_MAX_WORKERS, len(tickers))) as executor:
+        futures = [
+            executor.submit(fetch_brapi_ticker, ticker, api_key, limiter,
+                            ticker_start_dates.get(ticker, start_date), end_date, base_url)
+            for ticker in tickers
+        ]
+        for i, future in enumerate(as_completed(futures)):
+            original_ticker, current_price, current_volume_financial, bars, error = future.result()
+            progress_text = f"📈 Recebido: {original_ticker.replace('.SA', '')} ({i + 1}/{len(tickers)})"
+            progress_bar.progress((i + 1) / len(tickers), text=progress_text)
+
+            if current_price is None:
+                not_found_tickers.append(original_ticker)
+                if error:
+                    errors.append(error)
+                continue
+
+            quotes[original_ticker] = (current_price, current_volume_financial)
+            fetched_bars[original_ticker] = bars
+
+    if store is not None:
+        for ticker, bars in fetched_bars.items():
+            store.save("brapi", ticker, bars)
+        stored = store.load("brapi", list(quotes), start_date)
+        fetched_bars = {t: stored.get(t, bars) for t, bars in fetched_bars.items()}
+
+    # Preço e volume atuais vêm da cotação; o histórico entra só nas medianas
+    current_volumes = {t: current_volume_financial for t, (_, current_volume_financial) in quotes.items()}
+    histories = {t: bars for t, bars in fetched_bars.items() if bars is not None}
+    entries = build_volume_entries(histories, current_volumes={t: current_volumes[t] for t in histories})
+    for ticker, (current_price, current_volume_financial) in quotes.items():
+        if ticker in entries:
+            results[ticker] = (current_price, entries[ticker][1])
+        else:
+            results[ticker] = (current_price, _volume_entry_without_history(current_volume_financial))
+
+    return results, not_found_tickers, errors
+
+
+def get_brapi_quotes(tickers, api_key, requests_per_second=BRAPI_REQUESTS_PER_SECOND,
+                     base_url=BRAPI_BASE_URL, use_store=True, stale_while_revalidate=False):
+    """
+    Busca cotações de múltiplos ativos na API da brapi.dev em paralelo,
+    limitadas por um token bucket compartilhado (requests_per_second).
+    Respostas 429 e 5xx são repetidas com backoff em vez de interromper a busca.
+    Cotações ainda válidas no cache por ticker não são buscadas novamente; com
+    stale_while_revalidate=True, as expiradas são retornadas na hora e atualizadas
+    em segundo plano.
+    Com use_store=True, o histórico só é pedido a partir da última barra salva em disco
+    quando o histórico salvo cobre a janela de BRAPI_HISTORY_DAYS.
+    Retorna um dicionário com os tickers, seus preços e dados de volume financeiro.
+    """
+    if not tickers:
+        return {}, [], {}
+
+    # Calcula datas para os últimos BRAPI_HISTORY_DAYS dias
+    end_date = datetime.today().strftime("%Y-%m-%d")
+    start_date = (datetime.today() - timedelta(days=BRAPI_HISTORY_DAYS)).strftime("%Y-%m-%d")
+
+    quote_cache = get_quote_cache()
+    store = get_history_store() if use_store else None
+    limiter = get_brapi_rate_limiter(requests_per_second)
+
+    # Reaproveita as cotações por ticker já conhecidas no cache compartilhado
+    results, tickers_to_fetch, tickers_to_revalidate = _split_cached_quotes(
+        quote_cache, "brapi", tickers, store, start_date, stale_while_revalidate
+    )
+    _refresh_in_background(
+        quote_cache, "brapi", tickers_to_revalidate,
+        lambda stale_tickers: _download_brapi_quotes(
+            stale_tickers, api_key, limiter, base_url, store, start_date, end_date, _SilentProgress()
+        )[0]
+    )
+    _report_cache_usage(len(results), len(tickers_to_revalidate))
+
+    not_found_tickers = []
+    errors = []
+    if tickers_to_fetch:
+        st.info(f"🔍 Buscando cotações e dados históricos para {len(tickers_to_fetch)} ativos...")
+        progress_bar = st.progress(0, text="🚀 Iniciando busca de cotações e volume financeiro...")
+        fetched, not_found_tickers, errors = _download_brapi_quotes(
+            tickers_to_fetch, api_key, limiter, base_url, store, start_date, end_date, progress_bar
+        )
+        progress_bar.empty() # Limpa a barra de progresso
+
+        for ticker, (price, volume_entry) in fetched.items():
+            quote_cache.put("brapi", ticker, price, volume_entry)
+        results.update(fetched)
+
+    prices = {t: results[t][0] for t in tickers if t in results}
+    volume_data = {t: results[t][1] for t in tickers if t in results}
+
+    # Mantém a ordem original dos tickers na lista de não encontrados
+    missing = set(not_found_tickers)
+    not_found_tickers = [t for t in tickers if t in missing]
+
+    # Mensagem de sucesso mais informativa
+    historical_count = len([v for v in volume_data.values() if v.get('has_historical', False)])
+    total_days = sum([v.get('days_analyzed', 0) for v in volume_data.values()])
+
+    st.success(f"✅ Busca concluída! {len(prices)} cotações encontradas.")
+    st.info(f"📊 Volume financeiro: {historical_count} ativos com dados históricos (total: {total_days} dias analisados)")
+    st.info(f"📅 Período analisado: {start_date} até {end_date}")
+
+    if errors:
+        st.error(f"❌ Erros HTTP após {BRAPI_MAX_RETRIES} novas tentativas: {'; '.join(errors)}")
+
+    if not_found_tickers:
+        st.warning(f"⚠️ Não foi possível encontrar cotações para: {', '.join(not_found_tickers)}")
+
+    return prices, not_found_tickers, volume_data
@@ -1,10 +1,131 @@
 import streamlit as st
 import gspread
+from gspread.utils import numericise_all
 import pandas as pd
 from datetime import datetime
 import json
+import threading
+import time
 from google.oauth2.service_account import Credentials
 
+# Intervalo mínimo entre verificações de alteração remota da planilha (segundos)
+REMOTE_CHECK_SECONDS = 30
+
+# Aba de controle com uma linha por (portfólio, versão) e o intervalo de linhas da versão
+INDEX_SHEET = "_index"
+INDEX_COLUMNS = ['portfolio', 'version', 'upload_date', 'assets_count', 'total_quantity', 'first_row', 'last_row']
+
+
+class SheetCache:
+    """
+    Cache write-through do conteúdo das abas (registros já convertidos em DataFrame),
+    compartilhado entre sessões. Gravações do próprio app atualizam o cache;
+    alterações feitas por fora são detectadas pela data de modificação da planilha
+    (uma chamada leve de metadados, no máximo a cada REMOTE_CHECK_SECONDS).
+    Guarda também a planilha aberta e o diretório nome -> aba, válidos enquanto o
+    processo estiver de pé.
+    """
+
+    def __init__(self):
+        self.spreadsheet = None
+        self.worksheets = None  # título -> Worksheet (None = lista ainda não lida)
+        self.frames = {}
+        self.versions = {}  # (aba, versão) -> linhas da versão (versões gravadas não mudam)
+        self.modified_time = None
+        self.checked_at = 0.0
+        self.lock = threading.RLock()
+
+    def validate(self, spreadsheet):
+        """
+        Descarta o cache se a planilha foi alterada desde a última verificação.
+        """
+        now = time.monotonic()
+        with self.lock:
+            if now - self.checked_at < REMOTE_CHECK_SECONDS:
+                return
+            self.checked_at = now
+        modified_time = self._remote_modified_time(spreadsheet)
+        with self.lock:
+            if modified_time is None or modified_time != self.modified_time:
+                self.frames.clear()
+                self.versions.clear()
+                self.worksheets = None
+            self.modified_time = modified_time
+
+    def mark_written(self, spreadsheet):
+        """
+        Registra a data de modificação após uma gravação do próprio app, para que
+        ela não seja confundida com uma alteração externa.
+        """
+        modified_time = self._remote_modified_time(spreadsheet)
+        with self.lock:
+            self.modified_time = modified_time
+            self.checked_at = time.monotonic()
+
+    @staticmethod
+    def _remote_modified_time(spreadsheet):
+        try:
+            if hasattr(spreadsheet, 'get_lastUpdateTime'):  # gspread >= 6
+                return spreadsheet.get_lastUpdateTime()
+            return spreadsheet.lastUpdateTime
+        except Exception:
+            return None
+
+    def set_worksheets(self, worksheets):
+        with self.lock:
+            self.worksheets = dict(worksheets)
+
+    def register_worksheet(self, worksheet):
+        with self.lock:
+            if self.worksheets is not None:
+                self.worksheets[worksheet.title] = worksheet
+
+    def unregister_worksheet(self, title):
+        with self.lock:
+            if self.worksheets is not None:
+                self.worksheets.pop(title, None)
+
+    def get(self, title):
+        with self.lock:
+            return self.frames.get(title)
+
+    def put(self, title, df):
+        with self.lock:
+            self.frames[title] = df
+
+    def append(self, title, df):
+        """
+        Acrescenta linhas gravadas a uma aba já em cache (abas fora do cache são
+        lidas da planilha na próxima consulta).
+        """
+        with self.lock:
+            cached = self.frames.get(title)
+            if cached is not None:
+                self.frames[title] = df.copy() if cached.empty else pd.concat([cached, df], ignore_index=True)
+
+    def get_version(self, title, version):
+        with self.lock:
+            return self.versions.get((title, version))
+
+    def put_version(self, title, version, df):
+        with self.lock:
+            self.versions[(title, version)] = df
+
+    def discard(self, title):
+        with self.lock:
+            self.frames.pop(title, None)
+            for key in [key for key in self.versions if key[0] == title]:
+                del self.versions[key]
+
+
+@st.cache_resource
+def get_sheet_cache():
+    """
+    Cache de abas compartilhado entre todas as sessões do app.
+    """
+    return SheetCache()
+
+
 class PortfolioManager:
     """
     Gerenciador de portfólios usando Google Sheets como backend
@@ -18,6 +139,7 @@ class PortfolioManager:
         self.sheet_name = "Portfolio_History"
         self.client = None
         self.spreadsheet = None
+        self.cache = get_sheet_cache()
     
     @st.cache_resource
     def get_google_sheets_client(_self):
@@ -45,11 +167,15 @@ class PortfolioManager:
             
         if not self.client:
             return None
+        
+        # Planilha já aberta neste processo
+        if self.cache.spreadsheet is not None:
+            self.spreadsheet = self.cache.spreadsheet
+            return self.spreadsheet
             
         try:
             # Tenta abrir planilha existente
             self.spreadsheet = self.client.open(self.sheet_name)
-            return self.spreadsheet
         except gspread.SpreadsheetNotFound:
             # Cria nova planilha
             st.info("📝 Criando nova planilha no Google Sheets...")
@@ -62,8 +188,188 @@ class PortfolioManager:
                     self.spreadsheet.share(email, perm_type='user', role='writer')
             except:
                 pass  # Ignora se não conseguir compartilhar
-                
-            return self.spreadsheet
+        
+        self.cache.spreadsheet = self.spreadsheet
+        return self.spreadsheet
+    
+    def refresh_worksheets(self, spreadsheet):
+        """
+        Relê a lista de abas da planilha e atualiza o diretório nome -> aba.
+        """
+        directory = {worksheet.title: worksheet for worksheet in spreadsheet.worksheets()}
+        self.cache.set_worksheets(directory)
+        return directory
+    
+    def list_worksheets(self, spreadsheet):
+        """
+        Diretório nome -> aba, lido da planilha apenas quando ainda não está em memória.
+        """
+        self.cache.validate(spreadsheet)
+        directory = self.cache.worksheets
+        return directory if directory is not None else self.refresh_worksheets(spreadsheet)
+    
+    def get_worksheet(self, spreadsheet, title):
+        """
+        Aba pelo nome a partir do diretório em memória; a lista de abas só é relida
+        quando o nome não está nele. Levanta gspread.WorksheetNotFound se não existir.
+        """
+        self.cache.validate(spreadsheet)
+        directory = self.cache.worksheets
+        if directory is None or title not in directory:
+            directory = self.refresh_worksheets(spreadsheet)
+        if title not in directory:
+            raise gspread.WorksheetNotFound(title)
+        return directory[title]
+    
+    def add_worksheet(self, spreadsheet, title, rows, cols):
+        """
+        Cria uma aba e a registra no diretório.
+        """
+        worksheet = spreadsheet.add_worksheet(title=title, rows=rows, cols=cols)
+        self.cache.register_worksheet(worksheet)
+        return worksheet
+    
+    def read_records(self, spreadsheet, portfolio_name):
+        """
+        Registros de uma aba como DataFrame, lidos do cache quando possível.
+        Levanta gspread.WorksheetNotFound se a aba não existir.
+        """
+        self.cache.validate(spreadsheet)
+        df = self.cache.get(portfolio_name)
+        if df is None:
+            worksheet = self.get_worksheet(spreadsheet, portfolio_name)
+            if portfolio_name == INDEX_SHEET:
+                # Nomes de portfólio como "2025" continuam texto (não viram número)
+                df = pd.DataFrame(worksheet.get_all_records(numericise_ignore=[1]))
+            else:
+                df = pd.DataFrame(worksheet.get_all_records())
+            self.cache.put(portfolio_name, df)
+        return df
+    
+    def read_versions(self, spreadsheet, portfolio_name, versions):
+        """
+        Linhas de uma ou mais versões de um portfólio ({versão: DataFrame}).
+        Versões fora do cache são lidas em uma única requisição com o cabeçalho e
+        apenas os intervalos de linhas registrados no índice de versões.
+        Versões sem registro no índice não aparecem no resultado.
+        """
+        self.cache.validate(spreadsheet)
+        result = {}
+        missing = []
+        full = self.cache.get(portfolio_name)
+        for version in versions:
+            df = self.cache.get_version(portfolio_name, version)
+            if df is None and full is not None and 'version' in full.columns:
+                df = full[full['version'] == version]
+            if df is None:
+                missing.append(version)
+            else:
+                result[version] = df
+        if not missing:
+            return result
+        
+        version_index = self.read_version_index(spreadsheet)
+        rows = version_index[
+            (version_index['portfolio'] == str(portfolio_name)) & version_index['version'].isin(missing)
+        ]
+        if rows.empty:
+            return result
+        
+        worksheet = self.get_worksheet(spreadsheet, portfolio_name)
+        ranges = ['1:1'] + [f"{row.first_row}:{row.last_row}" for row in rows.itertuples(index=False)]
+        header, *blocks = worksheet.batch_get(ranges)
+        columns = header[0] if header else []
+        fetched = {}
+        for row, block in zip(rows.itertuples(index=False), blocks):
+            records = [
+                numericise_all((values + [''] * len(columns))[:len(columns)])
+                for values in block
+            ]
+            df = pd.DataFrame(records, columns=columns)
+            if 'version' not in df.columns or len(df) != row.assets_count or not (df['version'] == row.version).all():
+                # Linhas inseridas, removidas ou ordenadas por fora: os intervalos do índice
+                # não valem mais. Lê a aba inteira e recria o índice.
+                return {**result, **self._read_versions_from_sheet(spreadsheet, portfolio_name, missing)}
+            fetched[row.version] = df
+        
+        for version, df in fetched.items():
+            self.cache.put_version(portfolio_name, version, df)
+        result.update(fetched)
+        return result
+    
+    def _read_versions_from_sheet(self, spreadsheet, portfolio_name, versions):
+        """
+        Versões filtradas da leitura completa da aba (descartando o cache dela), com o
+        índice de versões recriado a partir do conteúdo atual da planilha.
+        """
+        self.cache.discard(portfolio_name)
+        full = self.read_records(spreadsheet, portfolio_name)
+        self.rebuild_version_index(spreadsheet)
+        if full.empty or 'version' not in full.columns:
+            return {}
+        return {
+            version: full[full['version'] == version].reset_index(drop=True)
+            for version in versions
+            if (full['version'] == version).any()
+        }
+    
+    @staticmethod
+    def _drop_control_columns(df):
+        """
+        Remove as colunas de controle (data, versão e metadados) para retornar dados limpos.
+        """
+        control_columns = ['upload_date', 'version'] + [col for col in df.columns if col.startswith('meta_')]
+        return df.drop(columns=[col for col in control_columns if col in df.columns])
+    
+    def read_version_index(self, spreadsheet):
+        """
+        Índice de versões de todos os portfólios (aba _index), criado a partir das
+        abas existentes na primeira vez.
+        """
+        try:
+            df = self.read_records(spreadsheet, INDEX_SHEET)
+        except gspread.WorksheetNotFound:
+            df = self.rebuild_version_index(spreadsheet)
+        if df.empty:
+            return pd.DataFrame(columns=INDEX_COLUMNS)
+        return df.assign(portfolio=df['portfolio'].astype(str))
+    
+    def rebuild_version_index(self, spreadsheet):
+        """
+        Recria a aba _index lendo todas as abas de portfólio (uma vez, na migração
+        ou para corrigir um índice desatualizado).
+        """
+        rows = []
+        for worksheet in list(self.list_worksheets(spreadsheet).values()):
+            if worksheet.title.startswith('_'):
+                continue
+            df = self.read_records(spreadsheet, worksheet.title)
+            if df.empty or 'version' not in df.columns:
+                continue
+            # Linha 1 é o cabeçalho; o registro i está na linha i + 2
+            df = df.assign(_row=range(2, len(df) + 2))
+            for (version, upload_date), group in df.groupby(['version', 'upload_date']):
+                rows.append([
+                    worksheet.title,
+                    version,
+                    upload_date,
+                    len(group),
+                    group['Quantidade'].sum() if 'Quantidade' in group.columns else 0,
+                    group['_row'].min(),
+                    group['_row'].max(),
+                ])
+        index_df = pd.DataFrame(rows, columns=INDEX_COLUMNS)
+        
+        try:
+            index_ws = self.get_worksheet(spreadsheet, INDEX_SHEET)
+            index_ws.clear()
+        except gspread.WorksheetNotFound:
+            index_ws = self.add_worksheet(spreadsheet, INDEX_SHEET, rows=1000, cols=len(INDEX_COLUMNS))
+        index_ws.update(range_name='A1', values=[INDEX_COLUMNS] + index_df.astype(object).values.tolist())
+        
+        self.cache.put(INDEX_SHEET, index_df)
+        self.cache.mark_written(spreadsheet)
+        return index_df
     
     def get_portfolio_names(self):
         """
@@ -74,7 +380,7 @@ class PortfolioManager:
             return []
             
         try:
-            worksheets = [ws.title for ws in spreadsheet.worksheets()]
+            worksheets = list(self.list_worksheets(spreadsheet))
             # Remove worksheets de controle
             portfolios = [ws for ws in worksheets if not ws.startswith('_')]
             return sorted(portfolios)
@@ -94,35 +400,72 @@ class PortfolioManager:
             # Prepara dados para salvar
             timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
             
+            # Verifica se worksheet existe
+            created = False
+            try:
+                worksheet = self.get_worksheet(spreadsheet, portfolio_name)
+            except gspread.WorksheetNotFound:
+                # Cria novo worksheet
+                worksheet = self.add_worksheet(
+                    spreadsheet,
+                    portfolio_name, 
+                    rows=1000, 
+                    cols=20
+                )
+                self.cache.put(portfolio_name, pd.DataFrame())
+                created = True
+            
+            # Próxima versão e linha inicial a partir do índice de versões
+            version_index = self.read_version_index(spreadsheet)
+            previous = version_index[version_index['portfolio'] == str(portfolio_name)]
+            if previous.empty and not created:
+                # Aba com versões que não estão no índice: recria o índice antes de numerar
+                existing = self.read_records(spreadsheet, portfolio_name)
+                if not existing.empty and 'version' in existing.columns:
+                    version_index = self.rebuild_version_index(spreadsheet)
+                    previous = version_index[version_index['portfolio'] == str(portfolio_name)]
+            version = int(previous['version'].max()) + 1 if not previous.empty else 1
+            
             # Adiciona colunas de controle
             df_to_save = df_portfolio.copy()
             df_to_save['upload_date'] = timestamp
-            df_to_save['version'] = len(self.get_portfolio_history(portfolio_name)) + 1
+            df_to_save['version'] = version
             
             # Adiciona metadados se fornecidos
             if metadata:
                 for key, value in metadata.items():
                     df_to_save[f'meta_{key}'] = value
             
-            # Verifica se worksheet existe
-            try:
-                worksheet = spreadsheet.worksheet(portfolio_name)
-            except gspread.WorksheetNotFound:
-                # Cria novo worksheet
-                worksheet = spreadsheet.add_worksheet(
-                    title=portfolio_name, 
-                    rows=1000, 
-                    cols=20
-                )
-            
             # Adiciona headers se é o primeiro registro
-            if worksheet.row_count <= 1 or not worksheet.get('A1'):
+            if created or (previous.empty and not worksheet.get('A1')):
                 headers = df_to_save.columns.tolist()
                 worksheet.insert_row(headers, 1)
             
             # Adiciona dados
             values = df_to_save.values.tolist()
-            worksheet.append_rows(values)
+            response = worksheet.append_rows(values)
+            first_row = self._appended_first_row(response)
+            if first_row is None:
+                first_row = int(previous['last_row'].max()) + 1 if not previous.empty else 2
+            
+            # Registra a versão no índice
+            index_row = [
+                portfolio_name,
+                version,
+                timestamp,
+                len(df_to_save),
+                df_to_save['Quantidade'].sum() if 'Quantidade' in df_to_save.columns else 0,
+                first_row,
+                first_row + len(df_to_save) - 1,
+            ]
+            index_row = [value.item() if hasattr(value, 'item') else value for value in index_row]
+            self.get_worksheet(spreadsheet, INDEX_SHEET).append_rows([index_row])
+            
+            # Mantém o cache em dia com a gravação
+            self.cache.append(portfolio_name, df_to_save)
+            self.cache.put_version(portfolio_name, version, df_to_save.reset_index(drop=True))
+            self.cache.append(INDEX_SHEET, pd.DataFrame([index_row], columns=INDEX_COLUMNS))
+            self.cache.mark_written(spreadsheet)
             
             st.success(f"✅ Portfólio '{portfolio_name}' salvo com sucesso!")
             return True
@@ -131,6 +474,19 @@ class PortfolioManager:
             st.error(f"❌ Erro ao salvar portfólio: {e}")
             return False
     
+    @staticmethod
+    def _appended_first_row(response):
+        """
+        Primeira linha gravada por append_rows, lida do intervalo retornado pela API
+        ('IDIV'!A12:F40 -> 12), ou None se a resposta não o informar.
+        """
+        try:
+            updated_range = response['updates']['updatedRange']
+            start = updated_range.split('!')[-1].split(':')[0]
+            return int(''.join(ch for ch in start if ch.isdigit()))
+        except (KeyError, TypeError, ValueError):
+            return None
+    
     def load_portfolio(self, portfolio_name, version='latest'):
         """
         Carrega portfólio do Google Sheets
@@ -140,27 +496,24 @@ class PortfolioManager:
             return None
             
         try:
-            worksheet = spreadsheet.worksheet(portfolio_name)
-            data = worksheet.get_all_records()
-            
-            if not data:
+            version_index = self.read_version_index(spreadsheet)
+            recorded = version_index[version_index['portfolio'] == str(portfolio_name)]
+            
+            if recorded.empty:
+                # Aba sem versões no índice (planilha antiga): leitura completa
+                df = self.read_records(spreadsheet, portfolio_name)
+                if not df.empty and 'version' in df.columns:
+                    df = df[df['version'] == (df['version'].max() if version == 'latest' else version)]
+            else:
+                if version == 'latest':
+                    version = recorded['version'].max()
+                df = self.read_versions(spreadsheet, portfolio_name, [version]).get(version)
+            
+            if df is None or df.empty:
                 st.warning(f"⚠️ Portfólio '{portfolio_name}' está vazio")
                 return None
             
-            df = pd.DataFrame(data)
-            
-            # Filtra por versão se especificado
-            if version != 'latest' and 'version' in df.columns:
-                df = df[df['version'] == version]
-            elif version == 'latest' and 'version' in df.columns:
-                latest_version = df['version'].max()
-                df = df[df['version'] == latest_version]
-            
-            # Remove colunas de controle para retornar dados limpos
-            control_columns = ['upload_date', 'version'] + [col for col in df.columns if col.startswith('meta_')]
-            df_clean = df.drop(columns=[col for col in control_columns if col in df.columns])
-            
-            return df_clean
+            return self._drop_control_columns(df)
             
         except gspread.WorksheetNotFound:
             st.warning(f"⚠️ Portfólio '{portfolio_name}' não encontrado")
@@ -171,39 +524,96 @@ class PortfolioManager:
     
     def get_portfolio_history(self, portfolio_name):
         """
-        Retorna histórico de versões de um portfólio
+        Retorna histórico de versões de um portfólio (mesma leitura de
+        get_all_portfolio_histories, inclusive para abas fora do índice)
+        """
+        return self.get_all_portfolio_histories([str(portfolio_name)]).get(str(portfolio_name), [])
+    
+    def get_all_portfolio_histories(self, portfolio_names=None):
+        """
+        Histórico de versões de vários portfólios ({nome: lista de versões}) a partir
+        de uma única leitura do índice de versões. Abas ainda fora do índice são
+        lidas juntas em uma única requisição de valores.
         """
         spreadsheet = self.get_spreadsheet()
         if not spreadsheet:
-            return []
+            return {}
             
         try:
-            worksheet = spreadsheet.worksheet(portfolio_name)
-            data = worksheet.get_all_records()
-            
-            if not data:
-                return []
-            
-            df = pd.DataFrame(data)
+            if portfolio_names is None:
+                portfolio_names = self.get_portfolio_names()
             
-            if 'upload_date' not in df.columns:
-                return []
+            version_index = self.read_version_index(spreadsheet)
+            histories = {
+                name: self._history_from_index(rows)
+                for name, rows in version_index.groupby('portfolio')
+            }
             
-            # Agrupa por versão/data
-            history = []
-            for _, group in df.groupby(['version', 'upload_date']):
-                history.append({
-                    'version': group['version'].iloc[0],
-                    'date': group['upload_date'].iloc[0],
-                    'assets_count': len(group),
-                    'total_quantity': group['Quantidade'].sum() if 'Quantidade' in group.columns else 0
-                })
+            unindexed = [name for name in portfolio_names if name not in histories]
+            for name, df in self.read_records_batch(spreadsheet, unindexed).items():
+                histories[name] = self._history_from_records(df)
             
-            return sorted(history, key=lambda x: x['version'], reverse=True)
+            return {name: histories.get(name, []) for name in portfolio_names}
             
         except Exception as e:
-            st.error(f"❌ Erro ao obter histórico: {e}")
+            st.error(f"❌ Erro ao obter históricos: {e}")
+            return {}
+    
+    def read_records_batch(self, spreadsheet, portfolio_names):
+        """
+        Registros de várias abas ({nome: DataFrame}); as que não estão em cache são
+        lidas em uma única requisição (values_batch_get).
+        """
+        self.cache.validate(spreadsheet)
+        frames = {name: self.cache.get(name) for name in portfolio_names}
+        pending = [name for name, df in frames.items() if df is None]
+        if pending:
+            quoted = ["'{}'".format(name.replace("'", "''")) for name in pending]
+            response = spreadsheet.values_batch_get(quoted)
+            for name, value_range in zip(pending, response.get('valueRanges', [])):
+                values = value_range.get('values', [])
+                columns = values[0] if values else []
+                records = [
+                    numericise_all((row + [''] * len(columns))[:len(columns)])
+                    for row in values[1:]
+                ]
+                df = pd.DataFrame(records, columns=columns)
+                self.cache.put(name, df)
+                frames[name] = df
+        return frames
+    
+    @staticmethod
+    def _history_from_records(df):
+        """
+        Lista de versões calculada a partir de todas as linhas de uma aba (abas fora do índice).
+        """
+        if df.empty or 'upload_date' not in df.columns or 'version' not in df.columns:
             return []
+        history = []
+        for (version, upload_date), group in df.groupby(['version', 'upload_date']):
+            history.append({
+                'version': version,
+                'date': upload_date,
+                'assets_count': len(group),
+                'total_quantity': group['Quantidade'].sum() if 'Quantidade' in group.columns else 0
+            })
+        return sorted(history, key=lambda x: x['version'], reverse=True)
+    
+    @staticmethod
+    def _history_from_index(rows):
+        """
+        Converte as linhas do índice de um portfólio na lista de versões (mais recente primeiro).
+        """
+        rows = rows.sort_values('version', ascending=False)
+        return [
+            {
+                'version': row.version,
+                'date': row.upload_date,
+                'assets_count': row.assets_count,
+                'total_quantity': row.total_quantity,
+            }
+            for row in rows.itertuples(index=False)
+        ]
     
     def delete_portfolio(self, portfolio_name):
         """
@@ -214,8 +624,19 @@ class PortfolioManager:
             return False
             
         try:
-            worksheet = spreadsheet.worksheet(portfolio_name)
+            worksheet = self.get_worksheet(spreadsheet, portfolio_name)
             spreadsheet.del_worksheet(worksheet)
+            self.cache.unregister_worksheet(portfolio_name)
+            self.cache.discard(portfolio_name)
+            
+            # Remove as versões do portfólio do índice (regrava a aba _index)
+            version_index = self.read_version_index(spreadsheet)
+            remaining = version_index[version_index['portfolio'] != str(portfolio_name)]
+            index_ws = self.get_worksheet(spreadsheet, INDEX_SHEET)
+            index_ws.clear()
+            index_ws.update(range_name='A1', values=[INDEX_COLUMNS] + remaining.astype(object).values.tolist())
+            self.cache.put(INDEX_SHEET, remaining.reset_index(drop=True))
+            self.cache.mark_written(spreadsheet)
             st.success(f"✅ Portfólio '{portfolio_name}' removido com sucesso!")
             return True
         except Exception as e:
@@ -227,8 +648,10 @@ class PortfolioManager:
         Compara duas versões de um portfólio
         """
         try:
-            df1 = self.load_portfolio_version(portfolio_name, version1)
-            df2 = self.load_portfolio_version(portfolio_name, version2)
+            # As duas versões em uma única leitura
+            loaded = self.load_portfolio_versions(portfolio_name, [version1, version2])
+            df1 = loaded.get(version1)
+            df2 = loaded.get(version2)
             
             if df1 is None or df2 is None:
                 return None
@@ -269,31 +692,26 @@ class PortfolioManager:
         """
         Carrega uma versão específica do portfólio
         """
+        return self.load_portfolio_versions(portfolio_name, [version]).get(version)
+    
+    def load_portfolio_versions(self, portfolio_name, versions):
+        """
+        Carrega várias versões de um portfólio em uma única requisição, lendo apenas
+        as linhas de cada versão. Retorna {versão: DataFrame}; versões inexistentes
+        ficam de fora.
+        """
         spreadsheet = self.get_spreadsheet()
         if not spreadsheet:
-            return None
+            return {}
             
         try:
-            worksheet = spreadsheet.worksheet(portfolio_name)
-            data = worksheet.get_all_records()
-            
-            if not data:
-                return None
-            
-            df = pd.DataFrame(data)
-            
-            if 'version' in df.columns:
-                df_version = df[df['version'] == version]
-                if df_version.empty:
-                    return None
-                
-                # Remove colunas de controle
-                control_columns = ['upload_date', 'version'] + [col for col in df.columns if col.startswith('meta_')]
-                df_clean = df_version.drop(columns=[col for col in control_columns if col in df.columns])
-                return df_clean
-            
-            return None
+            loaded = self.read_versions(spreadsheet, portfolio_name, versions)
+            return {
+                version: self._drop_control_columns(df)
+                for version, df in loaded.items()
+                if not df.empty
+            }
             
         except Exception as e:
             st.error(f"❌ Erro ao carregar versão específica: {e}")
-            return None 
\ No newline at end of file
+            return {}
@@ -0,0 +1,124 @@
+import streamlit as st
+import pandas as pd
+import os
+from market_data import build_volume_entries, get_brapi_quotes, get_yfinance_quotes
+
+# Arquivo local usado pela fonte de reprodução (mesmo formato da fixture do benchmark)
+REPLAY_FILE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "yfinance_idiv_6mo.csv")
+
+
+def load_history_file(path):
+    """
+    Lê um CSV de histórico no formato longo (colunas Date, Ticker, Close, Volume)
+    e retorna um dicionário ticker -> histórico indexado por data.
+    """
+    df = pd.read_csv(path, parse_dates=["Date"])
+    return {
+        ticker: group.set_index("Date").drop(columns=["Ticker"]).sort_index()
+        for ticker, group in df.groupby("Ticker")
+    }
+
+
+class MarketDataProvider:
+    """
+    Interface de uma fonte de cotações.
+    fetch(tickers) retorna (preços, tickers não encontrados, dados de volume),
+    no mesmo formato de get_yfinance_quotes e get_brapi_quotes.
+    """
+
+    name = ""
+    label = ""
+
+    def is_available(self):
+        """
+        Indica se a fonte pode ser usada (chave configurada, arquivo presente etc.).
+        """
+        return True
+
+    def fetch(self, tickers, stale_while_revalidate=False):
+        raise NotImplementedError
+
+
+class BrapiProvider(MarketDataProvider):
+    """
+    Cotações e histórico via brapi.dev.
+    """
+
+    name = "brapi"
+    label = "brapi.dev"
+
+    def __init__(self, api_key):
+        self.api_key = api_key
+
+    def is_available(self):
+        return bool(self.api_key) and self.api_key != "COLE_SUA_CHAVE_AQUI"
+
+    def fetch(self, tickers, stale_while_revalidate=False):
+        return get_brapi_quotes(tickers, self.api_key, stale_while_revalidate=stale_while_revalidate)
+
+
+class YFinanceProvider(MarketDataProvider):
+    """
+    Cotações e histórico via yfinance (download em lote).
+    """
+
+    name = "yfinance"
+    label = "yfinance"
+
+    def fetch(self, tickers, stale_while_revalidate=False):
+        return get_yfinance_quotes(tickers, stale_while_revalidate=stale_while_revalidate)
+
+
+class ReplayProvider(MarketDataProvider):
+    """
+    Cotações a partir de um arquivo local de histórico (gravado pelo benchmark_yfinance.py).
+    Útil sem conexão ou para reproduzir uma análise.
+    """
+
+    name = "replay"
+    label = "Arquivo local"
+
+    def __init__(self, path=REPLAY_FILE_PATH):
+        self.path = path
+
+    def is_available(self):
+        return bool(self.path) and os.path.isfile(self.path)
+
+    def fetch(self, tickers, stale_while_revalidate=False):
+        histories = load_history_file(self.path)
+        results = build_volume_entries({t: histories[t] for t in tickers if t in histories})
+        prices = {t: price for t, (price, _) in results.items()}
+        volume_data = {t: volume_entry for t, (_, volume_entry) in results.items()}
+        not_found_tickers = [t for t in tickers if t not in results]
+
+        st.success(f"✅ Arquivo local: {len(prices)} cotações encontradas.")
+        return prices, not_found_tickers, volume_data
+
+
+def fetch_with_fallback(providers, tickers, stale_while_revalidate=False):
+    """
+    Busca os tickers percorrendo as fontes em ordem: cada fonte só recebe os
+    tickers que as anteriores não encontraram.
+    Retorna (preços, não encontrados, dados de volume, fonte de cada ticker).
+    """
+    prices = {}
+    volume_data = {}
+    sources = {}
+    pending = list(tickers)
+
+    for provider in providers:
+        if not pending:
+            break
+        if not provider.is_available():
+            st.warning(f"⚠️ Fonte '{provider.label}' indisponível; seguindo para a próxima.")
+            continue
+
+        found_prices, _, found_volume_data = provider.fetch(pending, stale_while_revalidate=stale_while_revalidate)
+        for ticker, price in found_prices.items():
+            prices[ticker] = price
+            sources[ticker] = provider.label
+            if ticker in found_volume_data:
+                volume_data[ticker] = found_volume_data[ticker]
+        pending = [t for t in pending if t not in found_prices]
+
+    return prices, pending, volume_data, sources
@@ -0,0 +1,107 @@
+import streamlit as st
+import threading
+import time
+from collections import OrderedDict
+from market_calendar import quote_ttl
+
+# Limite de entradas mantidas em memória e idade máxima de uma cotação desatualizada
+QUOTE_CACHE_MAX_ENTRIES = 2000
+QUOTE_CACHE_MAX_STALE_AGE = 7 * 24 * 3600  # Uma semana cobre feriados prolongados
+
+
+class QuoteCache:
+    """
+    Cache de cotações por ticker com expiração e descarte LRU.
+    Cada entrada guarda o preço e os dados de volume de um ticker em uma fonte,
+    de modo que listas diferentes que compartilham tickers reaproveitam as buscas.
+    Sem ttl fixo, a validade segue o calendário da B3 (market_calendar.quote_ttl).
+    Entradas expiradas continuam disponíveis como desatualizadas (stale) até
+    max_stale_age, para exibição imediata enquanto são atualizadas.
+    """
+
+    def __init__(self, ttl=None, max_entries=QUOTE_CACHE_MAX_ENTRIES,
+                 max_stale_age=QUOTE_CACHE_MAX_STALE_AGE):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_stale_age = max_stale_age
+        self.entries = OrderedDict()
+        self.refreshing = set()
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get_many(self, source, tickers):
+        """
+        Retorna (válidas, desatualizadas, ausentes): dois dicionários
+        {ticker: (preço, dados de volume)} e a lista de tickers sem entrada utilizável.
+        """
+        fresh = {}
+        stale = {}
+        missing = []
+        now = time.monotonic()
+        with self.lock:
+            for ticker in tickers:
+                key = (source, ticker)
+                entry = self.entries.get(key)
+                if entry is None:
+                    missing.append(ticker)
+                    continue
+                stored_at, expires_at, value = entry
+                if now - stored_at > self.max_stale_age:
+                    del self.entries[key]
+                    missing.append(ticker)
+                    continue
+                self.entries.move_to_end(key)
+                if now < expires_at:
+                    fresh[ticker] = value
+                else:
+                    stale[ticker] = value
+        return fresh, stale, missing
+
+    def put(self, source, ticker, price, volume_entry, ttl=None):
+        """
+        Guarda a cotação de um ticker, descartando as entradas menos usadas se necessário.
+        ttl=0 grava a entrada já desatualizada (útil para semear valores provisórios).
+        """
+        if ttl is None:
+            ttl = self.ttl if self.ttl is not None else quote_ttl()
+        key = (source, ticker)
+        now = time.monotonic()
+        with self.lock:
+            self.entries[key] = (now, now + ttl, (price, volume_entry))
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def claim_refresh(self, source, tickers):
+        """
+        Marca os tickers como em atualização e retorna apenas os que ainda não estavam,
+        evitando que várias sessões disparem a mesma atualização em segundo plano.
+        """
+        with self.lock:
+            claimed = [t for t in tickers if (source, t) not in self.refreshing]
+            self.refreshing.update((source, t) for t in claimed)
+        return claimed
+
+    def release_refresh(self, source, tickers):
+        """
+        Libera os tickers marcados por claim_refresh.
+        """
+        with self.lock:
+            self.refreshing.difference_update((source, t) for t in tickers)
+
+    def clear(self):
+        """
+        Remove todas as entradas.
+        """
+        with self.lock:
+            self.entries.clear()
+
+
+@st.cache_resource
+def get_quote_cache():
+    """
+    Retorna o cache de cotações compartilhado entre todas as sessões.
+    """
+    return QuoteCache()
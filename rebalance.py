@@ -0,0 +1,168 @@
+import numpy as np
+import pandas as pd
+from dataclasses import dataclass
+from liquidity import DEFAULT_LIQUIDITY_WINDOW, DEFAULT_PARTICIPATION, median_volume_frame
+from formatting import BRL_FORMAT, INTEGER_FORMAT, PERCENT_FORMAT
+from tickers import B3_SUFFIX
+
+# Lote padrão da B3 e lote do mercado fracionário
+ROUND_LOT = 100
+FRACTIONAL_LOT = 1
+
+# Pregões disponíveis para executar as ordens (limite de liquidez = mediana x participação x dias)
+DEFAULT_EXECUTION_DAYS = 1
+
+BUY = "Compra"
+SELL = "Venda"
+HOLD = "Manter"
+
+REBALANCE_FORMATS = {
+    'Quantidade Ordem': INTEGER_FORMAT,
+    'Valor Ordem': BRL_FORMAT,
+    'Quantidade Atual': INTEGER_FORMAT,
+    'Quantidade Final': INTEGER_FORMAT,
+    'Preço': BRL_FORMAT,
+    'Peso Atual (%)': PERCENT_FORMAT,
+    'Peso Final (%)': PERCENT_FORMAT,
+    'Peso Alvo (%)': PERCENT_FORMAT,
+    'Limite de Liquidez': INTEGER_FORMAT,
+}
+
+
+@dataclass(frozen=True)
+class RebalancePlan:
+    """
+    Ordens para aproximar a carteira dos pesos de uma composição.
+    orders: um ativo por linha (operação, quantidade e valor da ordem, pesos atual,
+    final e alvo), ordenado pelo valor da ordem.
+    active_share_before / active_share_after: distância para o índice (%), contando o caixa.
+    unpriced: ativos do índice sem cotação (o peso deles fica em caixa).
+    liquidity_limited: ordens reduzidas pelo limite de participação no volume.
+    """
+
+    orders: pd.DataFrame
+    buy_value: float
+    sell_value: float
+    cash_left: float
+    active_share_before: float
+    active_share_after: float
+    unpriced: list
+    liquidity_limited: int
+
+
+def _liquidity_caps(api_tickers, prices, volume_data, participation_rate, window, execution_days):
+    """
+    Máximo de ações negociáveis por ativo no período: mediana de volume financeiro
+    x participação x dias / preço. Ativos sem dados de volume não têm limite.
+    """
+    caps = np.full(len(api_tickers), np.inf)
+    if volume_data:
+        medians = median_volume_frame(volume_data)[window].reindex(api_tickers).to_numpy(dtype=float)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            limited = np.floor(medians * participation_rate * execution_days / prices)
+        caps = np.where(np.isfinite(limited), limited, caps)
+    return caps
+
+
+def rebalance_to_composition(valuation, composition, prices=None, volume_data=None, cash=0.0,
+                             allow_fractional=False, participation_rate=DEFAULT_PARTICIPATION,
+                             window=DEFAULT_LIQUIDITY_WINDOW, execution_days=DEFAULT_EXECUTION_DAYS):
+    """
+    Calcula as ordens de compra e venda que aproximam a carteira avaliada
+    (Ativo, Ativo_API, Quantidade, Preço) dos pesos da composição
+    (index_compositions.IndexComposition), respeitando:
+    - lotes de 100 ações (ou de 1 ação com o mercado fracionário);
+    - o caixa: compras limitadas ao caixa informado mais o valor das vendas;
+    - a participação máxima na mediana de volume financeiro de cada ativo.
+    prices / volume_data (por Ativo_API) completam as cotações dos ativos do índice
+    que não estão na carteira. O cálculo é vetorizado; só o preenchimento final das
+    sobras de caixa percorre os ativos, um lote por vez.
+    """
+    index_weights = composition.weights[['Ativo', 'Peso']]
+    universe = valuation[['Ativo', 'Ativo_API', 'Quantidade', 'Preço']].merge(index_weights, on='Ativo', how='outer')
+    universe['Ativo_API'] = universe['Ativo_API'].fillna(universe['Ativo'] + B3_SUFFIX)
+    if prices:
+        universe['Preço'] = universe['Preço'].fillna(universe['Ativo_API'].map(prices))
+
+    price = universe['Preço'].to_numpy(dtype=float)
+    quantity = universe['Quantidade'].fillna(0).to_numpy(dtype=float)
+    target_weight = universe['Peso'].fillna(0.0).to_numpy(dtype=float)
+    if target_weight.sum() > 0:
+        target_weight = target_weight / target_weight.sum()
+    priced = np.isfinite(price) & (price > 0)
+    price = np.where(priced, price, 0.0)
+
+    # Patrimônio = posições + caixa; o peso de ativos sem cotação permanece em caixa
+    wealth = float(np.sum(quantity * price)) + cash
+    target_value = target_weight * wealth
+    with np.errstate(divide='ignore', invalid='ignore'):
+        desired = np.where(priced, target_value / price - quantity, 0.0)
+
+    lot = FRACTIONAL_LOT if allow_fractional else ROUND_LOT
+    lot_cost = lot * price
+    caps = _liquidity_caps(universe['Ativo_API'], np.where(priced, price, np.nan), volume_data,
+                           participation_rate, window, execution_days)
+    cap_lots = np.floor(caps / lot)
+    max_sell_lots = np.minimum(cap_lots, np.floor(quantity / lot))
+
+    # Compras arredondadas para baixo (o caixa completa depois); vendas para o lote mais próximo
+    buy_lots = np.minimum(np.floor(np.maximum(desired, 0) / lot), cap_lots)
+    sell_lots = np.minimum(np.round(np.maximum(-desired, 0) / lot), max_sell_lots)
+    limited = (np.floor(np.abs(desired) / lot) > np.where(desired > 0, cap_lots, max_sell_lots)) & (np.abs(desired) >= lot)
+
+    sell_value = float(np.sum(sell_lots * lot_cost))
+    available = cash + sell_value
+    buy_value = float(np.sum(buy_lots * lot_cost))
+    if buy_value > available:
+        # Caixa insuficiente: reduz todas as compras na mesma proporção
+        buy_lots = np.floor(buy_lots * (available / buy_value if available > 0 else 0.0))
+        buy_value = float(np.sum(buy_lots * lot_cost))
+
+    # Sobra de caixa: um lote por vez no ativo mais abaixo do alvo, enquanto o lote
+    # aproximar o ativo do alvo (falta maior que meio lote)
+    remaining = available - buy_value
+    gap = target_value - (quantity + (buy_lots - sell_lots) * lot) * price
+    eligible = priced & (sell_lots == 0)
+    for _ in range(2 * len(universe) + 1):
+        candidates = eligible & (buy_lots < cap_lots) & (lot_cost <= remaining) & (gap > lot_cost / 2)
+        if not candidates.any():
+            break
+        i = int(np.argmax(np.where(candidates, gap, -np.inf)))
+        buy_lots[i] += 1
+        remaining -= lot_cost[i]
+        gap[i] -= lot_cost[i]
+    buy_value = available - remaining
+
+    order = (buy_lots - sell_lots) * lot
+    final_quantity = quantity + order
+    current_weight = quantity * price / wealth * 100 if wealth > 0 else np.zeros_like(price)
+    final_weight = final_quantity * price / wealth * 100 if wealth > 0 else np.zeros_like(price)
+    target_pct = target_weight * 100
+    cash_before = cash / wealth * 100 if wealth > 0 else 0.0
+    cash_after = remaining / wealth * 100 if wealth > 0 else 0.0
+
+    orders = pd.DataFrame({
+        'Ativo': universe['Ativo'].to_numpy(),
+        'Operação': np.where(order > 0, BUY, np.where(order < 0, SELL, HOLD)),
+        'Quantidade Ordem': np.abs(order),
+        'Valor Ordem': np.abs(order) * price,
+        'Quantidade Atual': quantity,
+        'Quantidade Final': final_quantity,
+        'Preço': np.where(priced, price, np.nan),
+        'Peso Atual (%)': current_weight,
+        'Peso Final (%)': final_weight,
+        'Peso Alvo (%)': target_pct,
+        'Limite de Liquidez': np.where(np.isfinite(caps), caps, np.nan),
+        'Limitado por Liquidez': np.where(limited, '⚠️', ''),
+    }).sort_values(['Valor Ordem', 'Peso Alvo (%)'], ascending=False).reset_index(drop=True)
+
+    return RebalancePlan(
+        orders=orders,
+        buy_value=float(buy_value),
+        sell_value=sell_value,
+        cash_left=float(remaining),
+        active_share_before=float((np.abs(current_weight - target_pct).sum() + cash_before) / 2),
+        active_share_after=float((np.abs(final_weight - target_pct).sum() + cash_after) / 2),
+        unpriced=sorted(universe.loc[~priced & (target_weight > 0), 'Ativo']),
+        liquidity_limited=int(limited.sum()),
+    )
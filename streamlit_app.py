@@ -1,16 +1,22 @@
 import streamlit as st
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
 import numpy as np
-from io import BytesIO
-import openpyxl  # Necessário para pd.read_excel
-import requests
 import warnings
-import time
-from datetime import datetime, timedelta
-import yfinance as yf
 from portfolio_manager import PortfolioManager
+from providers import REPLAY_FILE_PATH, BrapiProvider, YFinanceProvider, ReplayProvider, fetch_with_fallback
+from liquidity import (
+    DEFAULT_LIQUIDITY_WINDOW, DEFAULT_PARTICIPATION, LIQUIDATION_TARGETS, PARTICIPATION_RATES,
+    available_windows, book_liquidation_days
+)
+from analysis import (
+    VALUATION_FORMATS, VOLUME_FORMATS, analyze_portfolio, liquidity_figure, source_breakdown, source_summary
+)
+from formatting import format_brl, format_millions, format_number, format_percent, style_table
+from tickers import B3_SUFFIX, STATUS_INVALID, STATUS_KNOWN, STATUS_UNVERIFIED, get_ticker_index, normalize_tickers
+from index_compositions import get_composition_store
+from index_analysis import COMPARISON_FORMATS, active_weight_figure, compare_with_index, style_concentration
+from rebalance import DEFAULT_EXECUTION_DAYS, REBALANCE_FORMATS, rebalance_to_composition
+from file_reader import consolidate_uploads, load_upload, load_uploads, upload_labels, upload_report
 
 # Ignorar warnings de Feature que podem aparecer em algumas versões do pandas
 warnings.simplefilter(action='ignore', category=FutureWarning)
@@ -79,14 +85,14 @@ with st.sidebar:
     st.markdown("### 📊 Sobre o Dashboard")
     st.info(
         "🚀 **Recursos:**\n"
-        "• Cotações em tempo real via brapi.dev\n"
+        "• Cotações via brapi.dev e yfinance, com fallback\n"
         "• Análise de composição da carteira\n"
         "• Gráficos interativos\n"
         "• Formatação brasileira de números"
     )
     
     st.markdown("### 📈 Status da API")
-    st.success("🟢 brapi.dev conectada")
+    st.success("🟢 brapi.dev e yfinance (com fallback entre fontes)")
     
     st.markdown("---")
     st.markdown("*Desenvolvido com ❤️ usando Streamlit*")
@@ -97,365 +103,97 @@ tab1, tab2, tab3 = st.tabs(["📤 Upload de Carteira", "💰 Dividendos", "📚
 if 'portfolio_manager' not in st.session_state:
     st.session_state.portfolio_manager = PortfolioManager()
 
-# Colunas alvo que queremos encontrar e padronizar
-TARGET_COLUMNS = ["Ativo", "Quantidade"]
-
 # --- FUNÇÕES DE CONECTIVIDADE E DADOS ---
 
-@st.cache_data(ttl=300)  # Cache de 5 minutos para evitar requisições repetidas
-def get_yfinance_quotes(tickers):
+def report_parsed_upload(parsed):
     """
-    Busca cotações e dados históricos usando yfinance.
-    Retorna um dicionário com os tickers, seus preços e dados de volume financeiro.
+    Informa quantas linhas foram lidas, se o arquivo era um extrato de movimentações
+    e quantas linhas foram descartadas (parsed: ParsedUpload).
     """
-    if not tickers:
-        return {}, [], {}
-
-    st.info(f"🔍 Buscando cotações e dados históricos via yfinance para {len(tickers)} ativos...")
-    
-    prices = {}
-    volume_data = {}
-    not_found_tickers = []
-    
-    progress_bar = st.progress(0, text="🚀 Iniciando busca via yfinance...")
-
-    for i, original_ticker in enumerate(tickers):
-        progress_text = f"📈 Buscando: {original_ticker.replace('.SA', '')} ({i + 1}/{len(tickers)})"
-        progress_bar.progress((i + 1) / len(tickers), text=progress_text)
-        
-        try:
-            # Busca dados do ticker
-            ticker_obj = yf.Ticker(original_ticker)
-            
-            # Busca dados históricos dos últimos 45 dias
-            hist_data = ticker_obj.history(period="2mo", interval="1d")
-            
-            if not hist_data.empty and len(hist_data) > 0:
-                # Pega o preço mais recente
-                current_price = hist_data['Close'].iloc[-1]
-                current_volume_shares = hist_data['Volume'].iloc[-1]
-                current_volume_financial = current_volume_shares * current_price
-                
-                prices[original_ticker] = current_price
-                
-                # Calcula volume financeiro dos últimos 45 dias
-                hist_data_45d = hist_data.tail(45)  # Últimos 45 dias
-                
-                volumes_financial = []
-                for index, row in hist_data_45d.iterrows():
-                    volume_shares = row['Volume']
-                    close_price = row['Close']
-                    
-                    if volume_shares > 0 and close_price > 0:
-                        volume_financial = volume_shares * close_price
-                        volumes_financial.append(volume_financial)
-                
-                if len(volumes_financial) >= 10:
-                    volume_median = np.median(volumes_financial)
-                    volume_data[original_ticker] = {
-                        'median_volume': volume_median,
-                        'volumes': volumes_financial,
-                        'current_volume': current_volume_financial,
-                        'days_analyzed': len(volumes_financial),
-                        'has_historical': True
-                    }
-                else:
-                    volume_data[original_ticker] = {
-                        'median_volume': current_volume_financial,
-                        'volumes': [],
-                        'current_volume': current_volume_financial,
-                        'days_analyzed': 0,
-                        'has_historical': False
-                    }
-            else:
-                not_found_tickers.append(original_ticker)
-                
-        except Exception as e:
-            not_found_tickers.append(original_ticker)
-        
-        time.sleep(0.1)  # Pausa pequena para não sobrecarregar
-
-    progress_bar.empty()
-    
-    # Mensagem de sucesso
-    historical_count = len([v for v in volume_data.values() if v.get('has_historical', False)])
-    total_days = sum([v.get('days_analyzed', 0) for v in volume_data.values()])
-    
-    st.success(f"✅ yfinance: {len(prices)} cotações encontradas.")
-    st.info(f"📊 Volume financeiro: {historical_count} ativos com dados históricos (total: {total_days} dias analisados)")
-    
-    if not_found_tickers:
-        st.warning(f"⚠️ Não foi possível encontrar cotações para: {', '.join(not_found_tickers)}")
-        
-    return prices, not_found_tickers, volume_data
+    if parsed.is_ledger:
+        st.info(f"🔁 Extrato de movimentações: {format_number(parsed.rows_read, 0)} linhas consolidadas em posições líquidas (compras - vendas)")
+    else:
+        st.info(f"📋 {format_number(parsed.rows_read, 0)} linhas lidas e consolidadas por ativo")
+    if parsed.rows_ignored:
+        st.warning(f"⚠️ {format_number(parsed.rows_ignored, 0)} linhas ignoradas (ativo vazio, quantidade inválida ou tipo de movimentação desconhecido)")
 
-@st.cache_data(ttl=300)  # Cache de 5 minutos para evitar requisições repetidas
-def get_brapi_quotes(tickers, api_key):
+def select_sheet(parsed, label):
     """
-    Busca cotações de múltiplos ativos na API da brapi.dev, fazendo uma requisição por vez
-    para se adequar aos limites do plano gratuito.
-    Retorna um dicionário com os tickers, seus preços e dados de volume financeiro.
+    Exibe a escolha de aba para planilhas com mais de uma aba; a escolha fica
+    guardada pelo nome do arquivo (único por envio) e é usada na próxima leitura.
     """
-    if not tickers:
-        return {}, [], {}
+    if len(parsed.sheet_names) > 1:
+        sheet_names = list(parsed.sheet_names)
+        default_sheet = parsed.layout.sheet_name if parsed.layout else sheet_names[0]
+        st.selectbox(
+            label,
+            options=sheet_names,
+            index=sheet_names.index(default_sheet),
+            key=f"excel_sheet_{parsed.file_name}"
+        )
 
-    st.info(f"🔍 Buscando cotações e dados históricos para {len(tickers)} ativos...")
-    
-    prices = {}
-    volume_data = {}
-    not_found_tickers = []
-    headers = {'Authorization': f'Bearer {api_key}'}
-    
-    # Calcula datas para os últimos 45 dias
-    end_date = datetime.today().strftime("%Y-%m-%d")
-    start_date = (datetime.today() - timedelta(days=45)).strftime("%Y-%m-%d")
+def read_files_batch(uploaded_files):
+    """
+    Lê vários arquivos em paralelo (ex.: um por conta de custódia), exibe o
+    resultado da leitura de cada um e consolida as posições.
+    Retorna (consolidado Ativo/Quantidade, detalhamento por origem) ou (None, None).
+    """
+    st.info(f"📦 Processando {len(uploaded_files)} arquivos em paralelo")
+    sheet_choices = {label: st.session_state.get(f"excel_sheet_{label}") for label in upload_labels(uploaded_files)}
+    parsed_uploads = load_uploads(uploaded_files, sheet_choices)
     
-    progress_bar = st.progress(0, text="🚀 Iniciando busca de cotações e volume financeiro...")
-
-    for i, original_ticker in enumerate(tickers):
-        # A API da brapi não usa o sufixo .SA, então o removemos
-        ticker_clean = original_ticker.replace('.SA', '')
-        
-        progress_text = f"📈 Buscando: {ticker_clean} ({i + 1}/{len(tickers)})"
-        progress_bar.progress((i + 1) / len(tickers), text=progress_text)
-        
-        # Busca cotação atual
-        url_quote = f"https://brapi.dev/api/quote/{ticker_clean}"
-        
-        try:
-            # Cotação atual
-            response_quote = requests.get(url_quote, headers=headers)
-            response_quote.raise_for_status()
-            data_quote = response_quote.json()
-            results_quote = data_quote.get('results', [])
-            
-            if results_quote and results_quote[0].get('regularMarketPrice') is not None:
-                current_price = results_quote[0]['regularMarketPrice']
-                prices[original_ticker] = current_price
-                current_volume_shares = results_quote[0].get('regularMarketVolume', 0)
-                current_volume_financial = current_volume_shares * current_price  # Volume financeiro atual
-                
-                # Aguarda um pouco entre requisições
-                time.sleep(0.15)
-                
-                # Busca dados históricos usando o endpoint /historical/
-                try:
-                    url_historical = f"https://brapi.dev/api/quote/historical/{ticker_clean}?start={start_date}&end={end_date}&interval=1d"
-                    response_hist = requests.get(url_historical, headers=headers)
-                    
-                    if response_hist.status_code == 200:
-                        data_hist = response_hist.json()
-                        results_hist = data_hist.get('results', [])
-                        
-                        if results_hist and results_hist[0].get('historical'):
-                            historical_data = results_hist[0]['historical']
-                            
-                            # Extrai volumes financeiros dos dados históricos
-                            volumes_financial = []
-                            
-                            for day_data in historical_data:
-                                volume_shares = day_data.get('volume')
-                                close_price = day_data.get('close')
-                                
-                                if volume_shares and close_price and volume_shares > 0 and close_price > 0:
-                                    volume_financial = volume_shares * close_price
-                                    volumes_financial.append(volume_financial)
-                            
-                            if len(volumes_financial) >= 10:  # Precisa de pelo menos 10 dias para ser válido
-                                volume_median = np.median(volumes_financial)
-                                volume_data[original_ticker] = {
-                                    'median_volume': volume_median,
-                                    'volumes': volumes_financial,
-                                    'current_volume': current_volume_financial,
-                                    'days_analyzed': len(volumes_financial),
-                                    'has_historical': True
-                                }
-                            else:
-                                # Se não há dados históricos suficientes
-                                volume_data[original_ticker] = {
-                                    'median_volume': current_volume_financial,
-                                    'volumes': [],
-                                    'current_volume': current_volume_financial,
-                                    'days_analyzed': 0,
-                                    'has_historical': False
-                                }
-                        else:
-                            # Se não conseguir estrutura esperada
-                            volume_data[original_ticker] = {
-                                'median_volume': current_volume_financial,
-                                'volumes': [],
-                                'current_volume': current_volume_financial,
-                                'days_analyzed': 0,
-                                'has_historical': False
-                            }
-                    else:
-                        # Se falhar a busca histórica
-                        volume_data[original_ticker] = {
-                            'median_volume': current_volume_financial,
-                            'volumes': [],
-                            'current_volume': current_volume_financial,
-                            'days_analyzed': 0,
-                            'has_historical': False
-                        }
-                        
-                except Exception as hist_error:
-                    # Em caso de erro nos dados históricos
-                    volume_data[original_ticker] = {
-                        'median_volume': current_volume_financial,
-                        'volumes': [],
-                        'current_volume': current_volume_financial,
-                        'days_analyzed': 0,
-                        'has_historical': False
-                    }
-            else:
-                not_found_tickers.append(original_ticker)
-
-        except requests.exceptions.HTTPError as e:
-            # Erros 404 (Not Found) são comuns para tickers inválidos, não são um erro fatal.
-            if e.response.status_code == 404:
-                not_found_tickers.append(original_ticker)
-            else:
-                # Outros erros HTTP (como 429) ainda podem ocorrer e param a execução
-                st.error(f"❌ Erro HTTP ao buscar {ticker_clean}: {e}")
-                # Adiciona todos os restantes à lista de não encontrados e para
-                not_found_tickers.extend(tickers[i:])
-                break 
-        except requests.exceptions.RequestException as e:
-            st.error(f"❌ Erro de conexão ao buscar {ticker_clean}: {e}")
-            not_found_tickers.extend(tickers[i:])
-            break
-        
-        time.sleep(0.25) # Pausa maior devido a múltiplas requisições
-
-    progress_bar.empty() # Limpa a barra de progresso
+    multi_sheet = [parsed for parsed in parsed_uploads if len(parsed.sheet_names) > 1]
+    if multi_sheet:
+        with st.expander("📑 Abas das planilhas"):
+            for parsed in multi_sheet:
+                select_sheet(parsed, f"Aba de {parsed.file_name}")
     
-    # Mensagem de sucesso mais informativa
-    historical_count = len([v for v in volume_data.values() if v.get('has_historical', False)])
-    total_days = sum([v.get('days_analyzed', 0) for v in volume_data.values()])
+    st.markdown("#### 📋 Resultado da Leitura por Arquivo")
+    st.dataframe(upload_report(parsed_uploads), use_container_width=True, hide_index=True)
     
-    st.success(f"✅ Busca concluída! {len(prices)} cotações encontradas.")
-    st.info(f"📊 Volume financeiro: {historical_count} ativos com dados históricos (total: {total_days} dias analisados)")
-    st.info(f"📅 Período analisado: {start_date} até {end_date}")
+    df_consolidated, df_sources = consolidate_uploads(parsed_uploads)
+    if df_consolidated is None:
+        st.error("❌ Nenhum arquivo pôde ser lido. Verifique se os arquivos contêm as colunas 'Ativo' e 'Quantidade'.")
+        return None, None
     
-    if not_found_tickers:
-        st.warning(f"⚠️ Não foi possível encontrar cotações para: {', '.join(not_found_tickers)}")
-        
-    return prices, not_found_tickers, volume_data
-
-
-def normalize_column_name(col_name):
-    """Normaliza o nome da coluna para comparação (minúsculas, sem espaços extras)."""
-    if pd.isna(col_name):  # Tratar casos onde o nome da coluna pode ser NaN
-        return ""
-    return str(col_name).strip().lower()
-
-def find_and_select_target_columns(df, target_names_list):
-    """
-    Verifica se as colunas alvo (normalizadas) existem no DataFrame (com colunas normalizadas).
-    Se sim, retorna um novo DataFrame contendo apenas essas colunas,
-    renomeadas para os nomes originais em target_names_list.
-    Caso contrário, retorna None.
-    """
-    df_cols_normalized_map = {normalize_column_name(col): col for col in df.columns}
-    target_names_normalized_map = {normalize_column_name(name): name for name in target_names_list}
-
-    found_original_col_names_for_selection = []
-    rename_map_to_standard = {}
-
-    all_targets_found = True
-    for norm_target_name, original_target_name in target_names_normalized_map.items():
-        if norm_target_name in df_cols_normalized_map:
-            original_df_col_name = df_cols_normalized_map[norm_target_name]
-            found_original_col_names_for_selection.append(original_df_col_name)
-            rename_map_to_standard[original_df_col_name] = original_target_name
-        else:
-            all_targets_found = False
-            break
-
-    if all_targets_found:
-        selected_df = df[found_original_col_names_for_selection]
-        return selected_df.rename(columns=rename_map_to_standard)
-    else:
-        return None
+    files_ok = sum(parsed.error is None for parsed in parsed_uploads)
+    if files_ok < len(parsed_uploads):
+        st.warning(f"⚠️ {len(parsed_uploads) - files_ok} arquivo(s) com erro foram ignorados na consolidação.")
+    st.success(f"✅ {files_ok} arquivo(s) consolidados em {len(df_consolidated)} ativos")
+    return df_consolidated, df_sources
 
 def read_file_robustly(uploaded_file):
     """
-    Lê um arquivo (Excel ou CSV) de forma robusta, tentando múltiplos encodings e separadores.
-    Retorna DataFrame processado ou None se falhar.
+    Lê um arquivo (Excel ou CSV) de forma robusta.
+    Para CSV, detecta encoding, separador e linha do cabeçalho em uma amostra
+    do início do arquivo e faz uma única leitura completa. Para Excel, abre a
+    planilha uma vez em modo somente leitura, na aba escolhida pelo usuário.
+    As linhas são lidas em blocos e consolidadas por ativo; extratos com
+    compras e vendas viram posições líquidas. O resultado fica em cache pelo
+    conteúdo do arquivo, então reexecuções da página não leem o arquivo de novo.
+    Retorna DataFrame (Ativo, Quantidade) ou None se falhar.
     """
     file_name = uploaded_file.name
-    content = uploaded_file.read()
     
-    possible_encodings = ['utf-8', 'latin-1', 'iso-8859-1', 'cp1252']
-    possible_separators_csv = [';', ',', '\t', None]
-    max_skip_rows_to_try = 5
+    # Aba escolhida anteriormente para este arquivo (None = detecção automática)
+    parsed = load_upload(uploaded_file, file_name, st.session_state.get(f"excel_sheet_{file_name}"))
     
-    # Reset do ponteiro do arquivo
-    uploaded_file.seek(0)
-    
-    if file_name.endswith('.csv'):
+    if parsed.file_format == 'CSV':
         st.info(f"📄 Processando arquivo CSV: {file_name}")
-        
-        for encoding in possible_encodings:
-            for sep in possible_separators_csv:
-                for skiprows_val in range(max_skip_rows_to_try):
-                    try:
-                        # Cria um novo objeto BytesIO para cada tentativa
-                        file_like_object = pd.io.common.BytesIO(content)
-                        
-                        temp_df = pd.read_csv(
-                            file_like_object,
-                            sep=sep,
-                            encoding=encoding,
-                            skiprows=skiprows_val,
-                            skipinitialspace=True,
-                            on_bad_lines='warn'
-                        )
-                        
-                        df_selected_cols = find_and_select_target_columns(temp_df, TARGET_COLUMNS)
-                        if df_selected_cols is not None:
-                            st.success(f"✅ CSV lido com sucesso!")
-                            st.info(f"📋 Parâmetros: encoding='{encoding}', separador='{sep if sep else 'auto'}', linhas puladas={skiprows_val}")
-                            return df_selected_cols
-                            
-                    except Exception as e:
-                        continue
-        
-        st.error(f"❌ Não foi possível ler o arquivo CSV '{file_name}' após várias tentativas.")
-        st.error("Verifique se o arquivo contém as colunas 'Ativo' e 'Quantidade' e se não está corrompido.")
-        return None
-        
-    elif file_name.endswith(('.xlsx', '.xls')):
+    elif parsed.file_format == 'Excel':
         st.info(f"📊 Processando arquivo Excel: {file_name}")
-        
-        for skiprows_val in range(max_skip_rows_to_try):
-            for engine_to_try in [None, 'openpyxl']:
-                try:
-                    # Cria um novo objeto BytesIO para cada tentativa
-                    file_like_object = pd.io.common.BytesIO(content)
-                    
-                    temp_df = pd.read_excel(
-                        file_like_object,
-                        skiprows=skiprows_val,
-                        engine=engine_to_try
-                    )
-                    
-                    df_selected_cols = find_and_select_target_columns(temp_df, TARGET_COLUMNS)
-                    if df_selected_cols is not None:
-                        st.success(f"✅ Excel lido com sucesso!")
-                        st.info(f"📋 Parâmetros: linhas puladas={skiprows_val}, engine='{engine_to_try if engine_to_try else 'auto'}'")
-                        return df_selected_cols
-                        
-                except Exception as e:
-                    continue
-        
-        st.error(f"❌ Não foi possível ler o arquivo Excel '{file_name}' após várias tentativas.")
-        st.error("Verifique se o arquivo contém as colunas 'Ativo' e 'Quantidade' e se não está corrompido.")
-        return None
+        select_sheet(parsed, "📑 Aba da planilha")
     
-    else:
-        st.error(f"❌ Formato de arquivo não suportado: '{file_name}'. Apenas .csv, .xlsx e .xls são aceitos.")
+    if parsed.error:
+        st.error(f"❌ {parsed.error}")
+        if parsed.file_format:
+            st.error("Verifique se o arquivo contém as colunas 'Ativo' e 'Quantidade' nas primeiras linhas e se não está corrompido.")
         return None
+    
+    st.success(f"✅ {parsed.file_format} lido com sucesso!")
+    st.info(f"📋 Parâmetros: {parsed.describe()}")
+    report_parsed_upload(parsed)
+    return parsed.positions
 
 # --- Abas do Dashboard ---
 
@@ -471,14 +209,16 @@ with tab1:
         1. 📤 Faça upload de uma planilha (Excel .xlsx/.xls ou CSV)
         2. 📊 O arquivo deve conter as colunas **'Ativo'** e **'Quantidade'**
         3. 🏢 Os ativos devem estar no formato da B3 (ex: PETR4, VALE3, ITUB4)
-        4. 🔧 Para CSV, o sistema tentará automaticamente diferentes separadores
+        4. 🔧 Para CSV, o sistema detecta automaticamente encoding, separador e linha do cabeçalho
         """)
         
-        uploaded_file = st.file_uploader(
-            "📂 Escolha seu arquivo de dados",
+        uploaded_files = st.file_uploader(
+            "📂 Escolha seu(s) arquivo(s) de dados",
             type=['xlsx', 'xls', 'csv'],
-            help="Upload de arquivo Excel ou CSV com colunas 'Ativo' e 'Quantidade'"
-        )
+            accept_multiple_files=True,
+            help="Upload de um ou mais arquivos Excel ou CSV com colunas 'Ativo' e 'Quantidade' "
+                 "(ex.: um arquivo por conta de custódia); as posições são consolidadas"
+        ) or []
     
     with col2:
         st.markdown("""
@@ -497,75 +237,80 @@ with tab1:
         </div>
         """, unsafe_allow_html=True)
     
-    if uploaded_file is not None:
-        df_uploaded = read_file_robustly(uploaded_file)
+    df_uploaded = None
+    if len(uploaded_files) == 1:
+        df_uploaded = read_file_robustly(uploaded_files[0])
         if df_uploaded is not None:
-            # Garante que a coluna 'Ativo' é string e 'Quantidade' é numérica
-            try:
-                df_uploaded['Ativo'] = df_uploaded['Ativo'].astype(str)
-                df_uploaded['Quantidade'] = pd.to_numeric(df_uploaded['Quantidade'], errors='coerce')
-                
-                # Remove linhas onde a quantidade não pôde ser convertida para número OU é zero
-                df_uploaded = df_uploaded.dropna(subset=['Quantidade'])
-                df_uploaded = df_uploaded[df_uploaded['Quantidade'] > 0]  # Remove quantidades zero
-                df_uploaded['Quantidade'] = df_uploaded['Quantidade'].astype(int)
-
-                st.session_state.portfolio_df = df_uploaded
-                
-                # Detecta automaticamente o nome do portfólio baseado no arquivo
-                portfolio_name = uploaded_file.name.replace('.csv', '').replace('.xlsx', '').replace('.xls', '').upper()
-                
-                # Se contém índices conhecidos, usa eles
-                indices_conhecidos = ['IDIV', 'IFIX', 'IBOV', 'SMALL', 'IVVB', 'BOVA', 'SMAL']
-                portfolio_detected = None
-                for indice in indices_conhecidos:
-                    if indice in portfolio_name:
-                        portfolio_detected = indice
-                        break
-                
-                if not portfolio_detected:
-                    portfolio_detected = portfolio_name
-                
-                # Oferece opção para salvar automaticamente
-                col_save1, col_save2 = st.columns([3, 1])
-                with col_save1:
-                    save_name = st.text_input("💾 Nome para salvar:", value=portfolio_detected, key="save_name")
-                with col_save2:
-                    st.write("")  # Espaçamento
-                    st.write("")  # Espaçamento
-                    if st.button("💾 Salvar Portfólio", type="primary"):
-                        pm = st.session_state.portfolio_manager
-                        metadata = {
-                            'file_name': uploaded_file.name,
-                            'file_size': uploaded_file.size,
-                            'total_assets': len(df_uploaded),
-                            'total_quantity': df_uploaded['Quantidade'].sum()
-                        }
-                        
-                        if pm.save_portfolio(save_name, df_uploaded, metadata):
-                            st.balloons()
-                
-                # Exibição melhorada do sucesso
-                st.markdown("""
-                <div class="success-box">
-                    <h4>✅ Arquivo carregado com sucesso!</h4>
-                    <p>📊 Dados processados e prontos para análise</p>
-                </div>
-                """, unsafe_allow_html=True)
-                
-                # Métricas do arquivo carregado
-                col1, col2, col3 = st.columns(3)
-                with col1:
-                    st.metric("📈 Total de Ativos", len(df_uploaded))
-                with col2:
-                    st.metric("📊 Quantidade Total", f"{df_uploaded['Quantidade'].sum():,}")
-                with col3:
-                    st.metric("📋 Média por Ativo", f"{df_uploaded['Quantidade'].mean():.0f}")
-                
-                st.dataframe(st.session_state.portfolio_df, use_container_width=True, hide_index=True)
-            except Exception as e:
-                st.error(f"❌ Erro ao processar as colunas do arquivo: {e}")
-                st.error("Verifique se a coluna 'Ativo' contém os tickers e 'Quantidade' contém números.")
+            df_sources = df_uploaded.assign(Origem=uploaded_files[0].name)
+    elif len(uploaded_files) > 1:
+        df_uploaded, df_sources = read_files_batch(uploaded_files)
+    
+    if df_uploaded is not None:
+        # Quantidades já consolidadas por ativo, numéricas e positivas
+        try:
+            st.session_state.portfolio_df = df_uploaded
+            st.session_state.portfolio_sources = df_sources
+            
+            # Detecta automaticamente o nome do portfólio baseado no (primeiro) arquivo
+            portfolio_name = uploaded_files[0].name.replace('.csv', '').replace('.xlsx', '').replace('.xls', '').upper()
+            
+            # Índice mais parecido pelo conteúdo (tickers em comum com as composições salvas)
+            composition_store = get_composition_store()
+            composition_store.load_directory()  # Lê apenas composições novas
+            best_match = composition_store.best_match(df_uploaded['Ativo'])
+            if best_match:
+                portfolio_detected = best_match['Índice']
+                if st.session_state.get('benchmark_index') != portfolio_detected:
+                    # Nova carteira: o índice sugerido passa a ser a referência da comparação
+                    st.session_state.benchmark_index = portfolio_detected
+                    st.session_state.benchmark_select = portfolio_detected
+                st.info(
+                    f"🎯 Carteira semelhante ao **{portfolio_detected}** "
+                    f"({best_match['Em Comum']} ativos em comum, {format_percent(best_match['Cobertura'] * 100)} da carteira no índice)"
+                )
+            else:
+                portfolio_detected = portfolio_name
+            
+            # Oferece opção para salvar automaticamente
+            col_save1, col_save2 = st.columns([3, 1])
+            with col_save1:
+                save_name = st.text_input("💾 Nome para salvar:", value=portfolio_detected, key="save_name")
+            with col_save2:
+                st.write("")  # Espaçamento
+                st.write("")  # Espaçamento
+                if st.button("💾 Salvar Portfólio", type="primary"):
+                    pm = st.session_state.portfolio_manager
+                    metadata = {
+                        'file_name': ", ".join(f.name for f in uploaded_files),
+                        'file_size': sum(f.size for f in uploaded_files),
+                        'total_assets': len(df_uploaded),
+                        'total_quantity': df_uploaded['Quantidade'].sum()
+                    }
+                    
+                    if pm.save_portfolio(save_name, df_uploaded, metadata):
+                        st.balloons()
+            
+            # Exibição melhorada do sucesso
+            st.markdown("""
+            <div class="success-box">
+                <h4>✅ Arquivo carregado com sucesso!</h4>
+                <p>📊 Dados processados e prontos para análise</p>
+            </div>
+            """, unsafe_allow_html=True)
+            
+            # Métricas do arquivo carregado
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                st.metric("📈 Total de Ativos", len(df_uploaded))
+            with col2:
+                st.metric("📊 Quantidade Total", f"{df_uploaded['Quantidade'].sum():,}")
+            with col3:
+                st.metric("📋 Média por Ativo", f"{df_uploaded['Quantidade'].mean():.0f}")
+            
+            st.dataframe(st.session_state.portfolio_df, use_container_width=True, hide_index=True)
+        except Exception as e:
+            st.error(f"❌ Erro ao processar as colunas do arquivo: {e}")
+            st.error("Verifique se a coluna 'Ativo' contém os tickers e 'Quantidade' contém números.")
 
 # Aba 2: Dividendos (antiga Análise da Carteira)
 with tab2:
@@ -576,392 +321,150 @@ with tab2:
     else:
         portfolio_df = st.session_state.portfolio_df.copy()
 
+        # Padroniza os códigos (maiúsculas, sem espaços, fracionário -> lote padrão)
+        portfolio_df['Ativo'] = normalize_tickers(portfolio_df['Ativo'])
+
         # Remove ativos com quantidade zero antes do agrupamento
         portfolio_df = portfolio_df[portfolio_df['Quantidade'] > 0]
 
         # Agrupa por ativo, somando as quantidades
         portfolio_df = portfolio_df.groupby('Ativo')['Quantidade'].sum().reset_index()
 
-        # Adiciona o sufixo .SA se não estiver presente (necessário para a API)
-        portfolio_df['Ativo_API'] = portfolio_df['Ativo'].apply(
-            lambda x: f"{x}.SA" if not str(x).upper().endswith('.SA') else str(x)
-        )
+        # Adiciona o sufixo .SA (necessário para a API)
+        portfolio_df['Ativo_API'] = portfolio_df['Ativo'] + B3_SUFFIX
+
+        # Valida os códigos antes de qualquer chamada de rede
+        ticker_index = get_ticker_index()
+        ticker_status = ticker_index.classify(portfolio_df['Ativo'])
+        invalid_tickers = portfolio_df.loc[ticker_status == STATUS_INVALID, 'Ativo'].tolist()
+        unverified_tickers = portfolio_df.loc[ticker_status == STATUS_UNVERIFIED, 'Ativo'].tolist()
+        if invalid_tickers:
+            st.warning(f"⚠️ {len(invalid_tickers)} ativo(s) com código inválido não serão buscados: {', '.join(invalid_tickers)}")
+        only_known_tickers = False
+        if unverified_tickers:
+            st.info(f"🔎 {len(unverified_tickers)} ativo(s) fora do índice de símbolos conhecidos: {', '.join(unverified_tickers)}")
+            only_known_tickers = st.toggle(
+                "🛡️ Buscar apenas ativos conhecidos",
+                value=False,
+                help="Não consulta as fontes para códigos que nunca foram encontrados, economizando requisições."
+            )
+        fetchable = (ticker_status == STATUS_KNOWN) if only_known_tickers else (ticker_status != STATUS_INVALID)
 
-        tickers_list = portfolio_df['Ativo_API'].unique().tolist()
+        tickers_list = portfolio_df.loc[fetchable, 'Ativo_API'].unique().tolist()
         
         # --- BUSCA DE DADOS ---
         st.markdown("### 🚀 Escolha a Fonte de Dados")
         
-        col1, col2 = st.columns(2)
-        
-        with col1:
-            brapi_button = st.button("📊 Buscar via brapi.dev", key="brapi_button", type="primary", use_container_width=True)
+        stale_while_revalidate = st.toggle(
+            "⚡ Exibir as últimas cotações conhecidas enquanto atualiza",
+            value=True,
+            help="Mostra na hora os preços da última consulta e atualiza em segundo plano. "
+                 "Fora do pregão da B3 as cotações são reaproveitadas até a próxima abertura."
+        )
         
-        with col2:
-            yfinance_button = st.button("📈 Buscar via yfinance", key="yfinance_button", type="secondary", use_container_width=True)
+        # Arquivo de histórico da fonte local (CSV gravado com benchmark_yfinance.py --gravar)
+        replay_path = st.text_input(
+            "📂 Arquivo local de histórico (opcional)",
+            value=REPLAY_FILE_PATH,
+            key="replay_path",
+            help="CSV com as colunas Date, Ticker, Close e Volume. "
+                 "A fonte 'Arquivo local' só aparece quando o arquivo existe."
+        )
         
-        # Processamento dos botões
-        if brapi_button:
-            if not BRAPI_API_KEY or BRAPI_API_KEY == "COLE_SUA_CHAVE_AQUI":
-                st.error("❌ Chave da API da brapi.dev não configurada. Por favor, insira no código.")
-            else:
-                # Mapeamento entre ticker da API (com .SA) e ticker original (sem .SA)
-                ticker_map_api_to_original = pd.Series(portfolio_df.Ativo.values, index=portfolio_df.Ativo_API).to_dict()
-
-                prices, not_found_api, volume_data = get_brapi_quotes(tickers_list, BRAPI_API_KEY)
-                st.session_state.data_source = "brapi.dev"
-                
-                if prices:
-                    # Mapeia os preços encontrados de volta para o DataFrame
-                    portfolio_df['Preço'] = portfolio_df['Ativo_API'].map(prices)
-                    
-                    # Para ativos não encontrados, o preço será NaN
-                    df_found = portfolio_df.dropna(subset=['Preço']).copy()
-                    
-                    # Identifica os ativos não encontrados pelo nome original
-                    not_found_original = []
-                    for api_ticker in not_found_api:
-                        if api_ticker in ticker_map_api_to_original:
-                            not_found_original.append(ticker_map_api_to_original[api_ticker])
-                    
-                    df_not_found = portfolio_df[portfolio_df['Ativo'].isin(not_found_original)].copy()
-
-                    if not df_found.empty:
-                        # Cálculos
-                        df_found['Valor Total'] = df_found['Quantidade'] * df_found['Preço']
-                        total_portfolio_value = df_found['Valor Total'].sum()
-                        df_found['Peso (%)'] = (df_found['Valor Total'] / total_portfolio_value) * 100
-                        
-                        # --- MÉTRICAS PRINCIPAIS ---
-                        st.markdown(f"### 💰 Resumo da Carteira (Fonte: brapi.dev)")
-                        col1, col2, col3, col4 = st.columns(4)
-                        
-                        with col1:
-                            st.metric(
-                                "💼 Valor Total", 
-                                f"R$ {total_portfolio_value:,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.'),
-                                delta=None
-                            )
-                        with col2:
-                            st.metric("📈 Ativos Válidos", len(df_found))
-                        with col3:
-                            st.metric("📊 Quantidade Total", f"{df_found['Quantidade'].sum():,}".replace(',', '.'))
-                        with col4:
-                            maior_posicao = df_found.loc[df_found['Valor Total'].idxmax(), 'Ativo']
-                            st.metric("🏆 Maior Posição", maior_posicao)
-                        
-                        # --- EXIBIÇÃO DA TABELA ---
-                        st.markdown("### 📋 Composição da Carteira")
-                        
-                        # Formata as colunas para exibição
-                        display_df = df_found[['Ativo', 'Quantidade', 'Preço', 'Valor Total', 'Peso (%)']].copy()
-                        
-                        # Formatação personalizada para o padrão brasileiro
-                        display_df['Quantidade'] = display_df['Quantidade'].apply(lambda x: f"{x:,.0f}".replace(',', '.'))
-                        display_df['Preço'] = display_df['Preço'].apply(lambda x: f"R$ {x:,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.'))
-                        display_df['Valor Total'] = display_df['Valor Total'].apply(lambda x: f"R$ {x:,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.'))
-                        display_df['Peso (%)'] = display_df['Peso (%)'].map('{:.2f}%'.format).str.replace('.', ',')
+        # Fontes disponíveis; ativos não encontrados na primeira seguem para a próxima
+        providers_by_label = {
+            provider.label: provider
+            for provider in [BrapiProvider(BRAPI_API_KEY), YFinanceProvider(), ReplayProvider(replay_path.strip())]
+            if provider.is_available()
+        }
+        source_order = st.multiselect(
+            "🔗 Ordem das fontes (ativos não encontrados em uma fonte são buscados na seguinte)",
+            options=list(providers_by_label),
+            default=[label for label in ["brapi.dev", "yfinance"] if label in providers_by_label],
+            key="source_order"
+        )
 
-                        # Ordena por Peso (%) do maior para o menor e remove o índice
-                        display_df_sorted = display_df.sort_values(by="Peso (%)", ascending=False, key=lambda x: x.str.replace('%', '').str.replace(',', '.').astype(float))
-                        st.dataframe(display_df_sorted, use_container_width=True, hide_index=True)
-                        
-                        # Salva dados na sessão
-                        st.session_state.analyzed_df = df_found.copy()
-                        st.session_state.total_value = total_portfolio_value
-                        st.session_state.volume_data = volume_data
-                        st.session_state.ticker_map = ticker_map_api_to_original
-                        
-                                            # --- SEÇÃO DE GRÁFICOS ---
-                    st.markdown("---")
-                    st.markdown("## 📈 Resumo Gráfico da Carteira")
-                    
-                    # Métricas principais dos gráficos
-                    col1, col2 = st.columns([1, 1])
-                    with col1:
-                        st.metric(
-                            "💼 Valor Total do Portfólio", 
-                            f"R$ {total_portfolio_value:,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.')
-                        )
-                    with col2:
-                        st.metric("📊 Número de Ativos", len(df_found))
-                    
-                    # Gráficos lado a lado
-                    col1, col2 = st.columns(2)
-                    
-                    with col1:
-                        # Gráfico de Pizza
-                        fig_pie = px.pie(
-                            df_found,
-                            names='Ativo',
-                            values='Valor Total',
-                            title='🥧 Distribuição da Carteira por Ativo',
-                            hole=0.4,
-                            color_discrete_sequence=px.colors.qualitative.Set3
-                        )
-                        fig_pie.update_traces(
-                            textposition='inside', 
-                            textinfo='percent+label',
-                            hovertemplate="<b>%{label}</b><br>Valor: R$ %{value:,.2f}<br>Peso: %{percent}<extra></extra>"
-                        )
-                        fig_pie.update_layout(
-                            font=dict(size=12),
-                            showlegend=True,
-                            legend=dict(orientation="v", yanchor="middle", y=0.5)
-                        )
-                        st.plotly_chart(fig_pie, use_container_width=True)
-                    
-                    with col2:
-                        # Gráfico de Barras - Top 10
-                        top_10 = df_found.nlargest(10, 'Valor Total')
-                        fig_bar = px.bar(
-                            top_10,
-                            x='Valor Total',
-                            y='Ativo',
-                            orientation='h',
-                            title='📊 Top 10 Maiores Posições',
-                            color='Valor Total',
-                            color_continuous_scale='Viridis'
-                        )
-                        fig_bar.update_layout(
-                            yaxis={'categoryorder': 'total ascending'},
-                            font=dict(size=12),
-                            showlegend=False
-                        )
-                        fig_bar.update_traces(
-                            hovertemplate="<b>%{y}</b><br>Valor: R$ %{x:,.2f}<extra></extra>"
-                        )
-                        st.plotly_chart(fig_bar, use_container_width=True)
-                    
-                    # --- SEÇÃO DE VOLUME ---
-                    st.markdown("---")
-                    st.markdown("## 💰 Análise de Volume Financeiro")
-                    st.info(f"📊 Dados de volume obtidos via: **yfinance**")
-                    
-                    if volume_data:
-                        # Prepara dados de volume para análise
-                        volume_analysis = []
-                        for ativo_api in df_found['Ativo_API']:
-                            ativo_original = ticker_map_api_to_original.get(ativo_api, ativo_api.replace('.SA', ''))
-                            if ativo_api in volume_data:
-                                vol_data = volume_data[ativo_api]
-                                has_hist = vol_data.get('has_historical', False)
-                                days_analyzed = vol_data.get('days_analyzed', 0)
-                                
-                                # Calcula relação apenas se tiver dados históricos válidos
-                                if has_hist and vol_data['median_volume'] > 0:
-                                    relacao = (vol_data['current_volume'] / vol_data['median_volume'] * 100)
-                                else:
-                                    relacao = 100  # Se não tem histórico, considera 100% (neutro)
-                                
-                                volume_analysis.append({
-                                    'Ativo': ativo_original,
-                                    'Volume Atual': vol_data['current_volume'],
-                                    'Mediana (até 45d)': vol_data['median_volume'],
-                                    'Relação (%)': relacao,
-                                    'Dias Analisados': days_analyzed,
-                                    'Tem Histórico': '✅' if has_hist else '❌'
-                                })
-                        
-                        df_volume = pd.DataFrame(volume_analysis)
-                        
-                        if not df_volume.empty:
-                            # Métricas de volume
-                            col1, col2, col3, col4 = st.columns(4)
-                            
-                            with col1:
-                                volume_total_atual = df_volume['Volume Atual'].sum()
-                                st.metric("💰 Volume Financeiro Atual", f"R$ {volume_total_atual/1000000:,.1f}M".replace(',', '.'))
-                            
-                            with col2:
-                                volume_mediana_total = df_volume['Mediana (até 45d)'].sum()
-                                st.metric("📊 Mediana Financeira", f"R$ {volume_mediana_total/1000000:,.1f}M".replace(',', '.'))
-                            
-                            with col3:
-                                # Apenas para ativos com histórico válido
-                                df_com_historico = df_volume[df_volume['Tem Histórico'] == '✅']
-                                if not df_com_historico.empty:
-                                    relacao_media = df_com_historico['Relação (%)'].mean()
-                                    st.metric("📈 Relação Média", f"{relacao_media:.1f}%", 
-                                             delta=f"{relacao_media-100:.1f}% vs mediana")
-                                else:
-                                    st.metric("📈 Relação Média", "N/A", delta="Sem dados históricos")
-                            
-                            with col4:
-                                ativos_com_historico = len(df_com_historico)
-                                st.metric("📚 Com Dados Históricos", f"{ativos_com_historico}/{len(df_volume)}")
-                            
-                            # Tabela de volume
-                            st.markdown("### 📋 Detalhamento por Ativo")
-                            
-                            # Formatação da tabela de volume
-                            display_volume_df = df_volume.copy()
-                            display_volume_df['Volume Atual'] = display_volume_df['Volume Atual'].apply(lambda x: f"R$ {x/1000000:,.2f}M".replace(',', '.'))
-                            display_volume_df['Mediana (até 45d)'] = display_volume_df['Mediana (até 45d)'].apply(lambda x: f"R$ {x/1000000:,.2f}M".replace(',', '.'))
-                            display_volume_df['Relação (%)'] = display_volume_df['Relação (%)'].apply(lambda x: f"{x:.1f}%")
-                            
-                            # Ordena pela relação percentual
-                            display_volume_df_sorted = display_volume_df.sort_values(by="Relação (%)", ascending=False, key=lambda x: x.str.replace('%', '').astype(float))
-                            st.dataframe(display_volume_df_sorted, use_container_width=True, hide_index=True)
-                            
-                            # Gráficos de volume financeiro
-                            col1, col2 = st.columns(2)
-                            
-                            with col1:
-                                # Gráfico de barras - Volume atual vs Mediana
-                                fig_volume_comparison = go.Figure()
-                                
-                                fig_volume_comparison.add_trace(go.Bar(
-                                    name='Volume Atual',
-                                    x=df_volume['Ativo'],
-                                    y=df_volume['Volume Atual']/1000000,  # Em milhões
-                                    marker_color='lightblue'
-                                ))
-                                
-                                fig_volume_comparison.add_trace(go.Bar(
-                                    name='Mediana (45d)',
-                                    x=df_volume['Ativo'],
-                                    y=df_volume['Mediana (até 45d)']/1000000,  # Em milhões
-                                    marker_color='orange'
-                                ))
-                                
-                                fig_volume_comparison.update_layout(
-                                    title='💰 Volume Financeiro: Atual vs Mediana (R$ Milhões)',
-                                    xaxis_title='Ativos',
-                                    yaxis_title='Volume Financeiro (R$ Milhões)',
-                                    barmode='group',
-                                    font=dict(size=10)
-                                )
-                                
-                                st.plotly_chart(fig_volume_comparison, use_container_width=True)
-                            
-                            with col2:
-                                # Novo gráfico: Dias para zerar posição
-                                dias_para_zerar = []
-                                for index, row in df_volume.iterrows():
-                                    ativo = row['Ativo']
-                                    volume_mediana = row['Mediana (até 45d)']
-                                    
-                                    # Pega o valor total da posição do ativo
-                                    valor_posicao = df_found[df_found['Ativo'] == ativo]['Valor Total'].iloc[0]
-                                    
-                                    # Calcula 20% da mediana de 45 dias
-                                    volume_mediana_20pct = volume_mediana * 0.20
-                                    
-                                    # Calcula dias para zerar (valor da posição / 20% da mediana)
-                                    if volume_mediana_20pct > 0:
-                                        dias_para_zerar_posicao = valor_posicao / volume_mediana_20pct
-                                    else:
-                                        dias_para_zerar_posicao = float('inf')
-                                    
-                                    dias_para_zerar.append({
-                                        'Ativo': ativo,
-                                        'Dias para Zerar': min(dias_para_zerar_posicao, 999)  # Limita a 999 dias para visualização
-                                    })
-                                
-                                df_dias = pd.DataFrame(dias_para_zerar)
-                                
-                                # Gráfico de barras - Dias para zerar posição
-                                fig_dias = px.bar(
-                                    df_dias,
-                                    x='Ativo',
-                                    y='Dias para Zerar',
-                                    title='⏱️ Dias para Zerar Posição (20% da Mediana)',
-                                    color='Dias para Zerar',
-                                    color_continuous_scale='RdYlBu_r'
-                                )
-                                
-                                fig_dias.update_layout(
-                                    xaxis_title='Ativos',
-                                    yaxis_title='Dias',
-                                    font=dict(size=10),
-                                    showlegend=False
-                                )
-                                
-                                fig_dias.update_traces(
-                                    hovertemplate="<b>%{x}</b><br>Dias para zerar: %{y:.1f}<extra></extra>"
-                                )
-                                
-                                st.plotly_chart(fig_dias, use_container_width=True)
-                        else:
-                            st.warning("⚠️ Não foi possível processar os dados de volume.")
-                    else:
-                        st.warning("⚠️ Dados de volume não disponíveis.")
-                        
-                    if not df_not_found.empty:
-                        st.markdown("### ⚠️ Ativos Não Encontrados")
-                        st.warning(f"Não foi possível obter a cotação para os seguintes ativos:")
-                        st.dataframe(df_not_found[['Ativo', 'Quantidade']], use_container_width=True, hide_index=True)
-                else:
-                    st.error("❌ Não foi possível obter nenhuma cotação. Verifique os tickers ou a API.")
+        fetch_button = st.button("🚀 Buscar Cotações", key="fetch_button", type="primary", use_container_width=True)
         
-        elif yfinance_button:
-            prices, not_found, volume_data = get_yfinance_quotes(tickers_list)
-            st.session_state.data_source = "yfinance"
-            
-            # Para yfinance, o mapeamento é direto
-            ticker_map_api_to_original = {ticker: ticker.replace('.SA', '') for ticker in tickers_list}
+        # Processamento da busca
+        if fetch_button and not source_order:
+            st.error("❌ Selecione ao menos uma fonte de dados.")
+        elif fetch_button:
+            providers = [providers_by_label[label] for label in source_order]
+            prices, not_found, volume_data, sources = fetch_with_fallback(
+                providers, tickers_list, stale_while_revalidate=stale_while_revalidate
+            )
+            ticker_index.add(prices)  # Tickers encontrados passam a ser conhecidos
+            data_source_label = " + ".join(label for label in source_order if label in sources.values())
+            st.session_state.data_source = data_source_label
+            st.session_state.data_sources = sources
             
-            if prices:
-                # Mapeia os preços encontrados de volta para o DataFrame
-                portfolio_df['Preço'] = portfolio_df['Ativo_API'].map(prices)
-                
-                # Para ativos não encontrados, o preço será NaN
-                df_found = portfolio_df.dropna(subset=['Preço']).copy()
-                
-                # Identifica os ativos não encontrados pelo nome original
-                not_found_original = []
-                for api_ticker in not_found:
-                    if api_ticker in ticker_map_api_to_original:
-                        not_found_original.append(ticker_map_api_to_original[api_ticker])
-                
-                df_not_found = portfolio_df[portfolio_df['Ativo'].isin(not_found_original)].copy()
+            # Cotações da última busca, reaproveitadas nas próximas interações
+            st.session_state.market_snapshot = {
+                'tickers': tickers_list,
+                'prices': prices,
+                'volume_data': volume_data,
+                'sources': sources,
+                'data_source': data_source_label,
+            }
+        
+        snapshot = st.session_state.get('market_snapshot')
+        if snapshot is not None and snapshot['tickers'] == tickers_list:
+            if snapshot['prices']:
+                data_source_label = snapshot['data_source']
+                analysis = analyze_portfolio(portfolio_df, snapshot['prices'], snapshot['volume_data'], snapshot['sources'])
+                df_found = analysis.valuation
+                df_not_found = analysis.not_found
+                total_portfolio_value = analysis.total_value
 
                 if not df_found.empty:
-                    # Cálculos
-                    df_found['Valor Total'] = df_found['Quantidade'] * df_found['Preço']
-                    total_portfolio_value = df_found['Valor Total'].sum()
-                    df_found['Peso (%)'] = (df_found['Valor Total'] / total_portfolio_value) * 100
-                    
                     # --- MÉTRICAS PRINCIPAIS ---
-                    st.markdown(f"### 💰 Resumo da Carteira (Fonte: yfinance)")
+                    st.markdown(f"### 💰 Resumo da Carteira (Fonte: {data_source_label})")
                     col1, col2, col3, col4 = st.columns(4)
                     
                     with col1:
                         st.metric(
                             "💼 Valor Total", 
-                            f"R$ {total_portfolio_value:,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.'),
+                            format_brl(total_portfolio_value),
                             delta=None
                         )
                     with col2:
                         st.metric("📈 Ativos Válidos", len(df_found))
                     with col3:
-                        st.metric("📊 Quantidade Total", f"{df_found['Quantidade'].sum():,}".replace(',', '.'))
+                        st.metric("📊 Quantidade Total", format_number(df_found['Quantidade'].sum(), 0))
                     with col4:
                         maior_posicao = df_found.loc[df_found['Valor Total'].idxmax(), 'Ativo']
                         st.metric("🏆 Maior Posição", maior_posicao)
                     
                     # --- EXIBIÇÃO DA TABELA ---
                     st.markdown("### 📋 Composição da Carteira")
-                    
-                    # Formata as colunas para exibição
-                    display_df = df_found[['Ativo', 'Quantidade', 'Preço', 'Valor Total', 'Peso (%)']].copy()
-                    
-                    # Formatação personalizada para o padrão brasileiro
-                    display_df['Quantidade'] = display_df['Quantidade'].apply(lambda x: f"{x:,.0f}".replace(',', '.'))
-                    display_df['Preço'] = display_df['Preço'].apply(lambda x: f"R$ {x:,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.'))
-                    display_df['Valor Total'] = display_df['Valor Total'].apply(lambda x: f"R$ {x:,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.'))
-                    display_df['Peso (%)'] = display_df['Peso (%)'].map('{:.2f}%'.format).str.replace('.', ',')
-
-                    # Ordena por Peso (%) do maior para o menor e remove o índice
-                    display_df_sorted = display_df.sort_values(by="Peso (%)", ascending=False, key=lambda x: x.str.replace('%', '').str.replace(',', '.').astype(float))
-                    st.dataframe(display_df_sorted, use_container_width=True, hide_index=True)
+                    st.dataframe(style_table(analysis.display_valuation, VALUATION_FORMATS), use_container_width=True, hide_index=True)
+                    
+                    # Detalhamento por origem quando a carteira veio de vários arquivos
+                    df_sources = st.session_state.get('portfolio_sources')
+                    if df_sources is not None and df_sources['Origem'].nunique() > 1:
+                        with st.expander("🗂️ Composição por Origem"):
+                            df_source_detail = source_breakdown(df_found, df_sources)
+                            df_source_summary = source_summary(df_source_detail)
+                            st.dataframe(style_table(df_source_summary, VALUATION_FORMATS), use_container_width=True, hide_index=True)
+                            
+                            selected_source = st.selectbox(
+                                "🔎 Detalhar origem:",
+                                options=df_source_summary['Origem'].tolist(),
+                                key="source_drilldown"
+                            )
+                            st.dataframe(
+                                style_table(df_source_detail[df_source_detail['Origem'] == selected_source], VALUATION_FORMATS),
+                                use_container_width=True,
+                                hide_index=True
+                            )
                     
                     # Salva dados na sessão
-                    st.session_state.analyzed_df = df_found.copy()
+                    st.session_state.analyzed_df = df_found
                     st.session_state.total_value = total_portfolio_value
-                    st.session_state.volume_data = volume_data
-                    st.session_state.ticker_map = ticker_map_api_to_original
+                    st.session_state.volume_data = snapshot['volume_data']
+                    st.session_state.ticker_map = pd.Series(portfolio_df.Ativo.values, index=portfolio_df.Ativo_API).to_dict()
+                    st.session_state.liquidity_table = analysis.liquidity
                     
                     # --- SEÇÃO DE GRÁFICOS ---
                     st.markdown("---")
@@ -970,91 +473,158 @@ with tab2:
                     # Métricas principais dos gráficos
                     col1, col2 = st.columns([1, 1])
                     with col1:
-                        st.metric(
-                            "💼 Valor Total do Portfólio", 
-                            f"R$ {total_portfolio_value:,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.')
-                        )
+                        st.metric("💼 Valor Total do Portfólio", format_brl(total_portfolio_value))
                     with col2:
                         st.metric("📊 Número de Ativos", len(df_found))
                     
                     # Gráficos lado a lado
                     col1, col2 = st.columns(2)
-                    
                     with col1:
-                        # Gráfico de Pizza
-                        fig_pie = px.pie(
-                            df_found,
-                            names='Ativo',
-                            values='Valor Total',
-                            title='🥧 Distribuição da Carteira por Ativo',
-                            hole=0.4,
-                            color_discrete_sequence=px.colors.qualitative.Set3
-                        )
-                        fig_pie.update_traces(
-                            textposition='inside', 
-                            textinfo='percent+label',
-                            hovertemplate="<b>%{label}</b><br>Valor: R$ %{value:,.2f}<br>Peso: %{percent}<extra></extra>"
-                        )
-                        fig_pie.update_layout(
-                            font=dict(size=12),
-                            showlegend=True,
-                            legend=dict(orientation="v", yanchor="middle", y=0.5)
-                        )
-                        st.plotly_chart(fig_pie, use_container_width=True)
-                    
+                        st.plotly_chart(analysis.figures['pie'], use_container_width=True)
                     with col2:
-                        # Gráfico de Barras - Top 10
-                        top_10 = df_found.nlargest(10, 'Valor Total')
-                        fig_bar = px.bar(
-                            top_10,
-                            x='Valor Total',
-                            y='Ativo',
-                            orientation='h',
-                            title='📊 Top 10 Maiores Posições',
-                            color='Valor Total',
-                            color_continuous_scale='Viridis'
-                        )
-                        fig_bar.update_layout(
-                            yaxis={'categoryorder': 'total ascending'},
-                            font=dict(size=12),
-                            showlegend=False
+                        st.plotly_chart(analysis.figures['top_positions'], use_container_width=True)
+                    
+                    # --- SEÇÃO DE COMPARAÇÃO COM ÍNDICE ---
+                    composition_store = get_composition_store()
+                    composition_store.load_directory()  # Lê apenas composições novas
+                    benchmark_options = composition_store.indices()
+                    if benchmark_options:
+                        st.markdown("---")
+                        st.markdown("## 🎯 Comparação com Índice")
+                        
+                        default_benchmark = st.session_state.get('benchmark_index')
+                        col1, col2 = st.columns(2)
+                        with col1:
+                            benchmark_index = st.selectbox(
+                                "Índice de referência",
+                                options=benchmark_options,
+                                index=benchmark_options.index(default_benchmark) if default_benchmark in benchmark_options else 0,
+                                key="benchmark_select"
+                            )
+                        with col2:
+                            benchmark_dates = composition_store.snapshot_dates(benchmark_index)
+                            benchmark_date = st.selectbox(
+                                "Composição de",
+                                options=benchmark_dates[::-1],
+                                format_func=lambda d: d.strftime("%d/%m/%Y"),
+                                key="benchmark_date"
+                            )
+                        
+                        benchmark_composition = composition_store.weights_as_of(benchmark_index, benchmark_date)
+                        comparison = compare_with_index(df_found, benchmark_composition)
+                        
+                        col1, col2, col3, col4 = st.columns(4)
+                        with col1:
+                            st.metric("🔗 Sobreposição", format_percent(comparison.overlap))
+                        with col2:
+                            st.metric("↔️ Active Share", format_percent(comparison.active_share))
+                        with col3:
+                            st.metric("🕳️ Fora da Carteira", len(comparison.missing))
+                        with col4:
+                            st.metric("➕ Fora do Índice", len(comparison.extra))
+                        
+                        col1, col2 = st.columns([3, 2])
+                        with col1:
+                            st.plotly_chart(active_weight_figure(comparison), use_container_width=True)
+                        with col2:
+                            st.markdown("### 📐 Concentração")
+                            st.dataframe(style_concentration(comparison.concentration), use_container_width=True, hide_index=True)
+                        
+                        st.markdown("### 📋 Desvios por Ativo")
+                        st.dataframe(style_table(comparison.table, COMPARISON_FORMATS), use_container_width=True, hide_index=True)
+                        
+                        if comparison.missing or comparison.extra:
+                            with st.expander("🔍 Ativos fora da carteira / fora do índice"):
+                                col1, col2 = st.columns(2)
+                                with col1:
+                                    st.markdown(f"**Só no {comparison.index_name}:** " + (", ".join(comparison.missing) or "-"))
+                                with col2:
+                                    st.markdown("**Só na carteira:** " + (", ".join(comparison.extra) or "-"))
+                    
+                        # Rebalanceamento em direção à composição do índice
+                        st.markdown("### ⚖️ Rebalanceamento para o Índice")
+                        col1, col2, col3, col4 = st.columns(4)
+                        with col1:
+                            rebalance_cash = st.number_input(
+                                "Caixa disponível (R$)", min_value=0.0, value=0.0, step=1000.0, key="rebalance_cash"
+                            )
+                        with col2:
+                            rebalance_participation = st.select_slider(
+                                "Participação máx. no volume",
+                                options=PARTICIPATION_RATES,
+                                value=DEFAULT_PARTICIPATION,
+                                format_func=lambda x: f"{x:.0%}",
+                                key="rebalance_participation"
+                            )
+                        with col3:
+                            rebalance_days = st.number_input(
+                                "Pregões para executar", min_value=1, max_value=20, value=DEFAULT_EXECUTION_DAYS, key="rebalance_days"
+                            )
+                        with col4:
+                            st.write("")  # Espaçamento
+                            allow_fractional = st.toggle("Usar mercado fracionário", value=False, key="rebalance_fractional")
+                        
+                        # Ativos do índice fora da carteira precisam de cotação para serem comprados
+                        index_market = st.session_state.get('index_market', {'prices': {}, 'volume_data': {}})
+                        missing_api = [t + B3_SUFFIX for t in comparison.missing if t + B3_SUFFIX not in index_market['prices']]
+                        if missing_api and st.button(f"🔎 Buscar cotações de {len(missing_api)} ativo(s) do índice fora da carteira", key="fetch_index_prices"):
+                            providers = [providers_by_label[label] for label in source_order]
+                            index_prices, _, index_volume, _ = fetch_with_fallback(
+                                providers, missing_api, stale_while_revalidate=stale_while_revalidate
+                            )
+                            ticker_index.add(index_prices)
+                            index_market = {
+                                'prices': {**index_market['prices'], **index_prices},
+                                'volume_data': {**index_market['volume_data'], **index_volume},
+                            }
+                            st.session_state.index_market = index_market
+                        
+                        plan = rebalance_to_composition(
+                            df_found,
+                            benchmark_composition,
+                            prices=index_market['prices'],
+                            volume_data={**index_market['volume_data'], **snapshot['volume_data']},
+                            cash=rebalance_cash,
+                            allow_fractional=allow_fractional,
+                            participation_rate=rebalance_participation,
+                            window=DEFAULT_LIQUIDITY_WINDOW,
+                            execution_days=rebalance_days,
                         )
-                        fig_bar.update_traces(
-                            hovertemplate="<b>%{y}</b><br>Valor: R$ %{x:,.2f}<extra></extra>"
+                        
+                        col1, col2, col3, col4 = st.columns(4)
+                        with col1:
+                            st.metric("🟢 Compras", format_brl(plan.buy_value))
+                        with col2:
+                            st.metric("🔴 Vendas", format_brl(plan.sell_value))
+                        with col3:
+                            st.metric("💵 Caixa Restante", format_brl(plan.cash_left))
+                        with col4:
+                            st.metric(
+                                "↔️ Active Share Final", format_percent(plan.active_share_after),
+                                delta=f"{format_number(plan.active_share_after - plan.active_share_before, 1)} p.p.",
+                                delta_color="inverse"
+                            )
+                        if plan.unpriced:
+                            st.info(f"💵 {len(plan.unpriced)} ativo(s) do índice sem cotação; o peso deles fica em caixa: {', '.join(plan.unpriced)}")
+                        if plan.liquidity_limited:
+                            st.warning(f"⚠️ {plan.liquidity_limited} ordem(ns) limitada(s) pela participação máxima no volume.")
+                        
+                        orders = plan.orders[plan.orders['Quantidade Ordem'] > 0]
+                        st.dataframe(style_table(orders, REBALANCE_FORMATS), use_container_width=True, hide_index=True)
+                        st.download_button(
+                            "📥 Exportar Ordens (CSV)",
+                            data=orders.to_csv(index=False, sep=';', decimal=',').encode('utf-8-sig'),
+                            file_name=f"ordens_rebalanceamento_{comparison.index_name}.csv",
+                            mime="text/csv"
                         )
-                        st.plotly_chart(fig_bar, use_container_width=True)
                     
                     # --- SEÇÃO DE VOLUME ---
                     st.markdown("---")
                     st.markdown("## 💰 Análise de Volume Financeiro")
-                    st.info(f"📊 Dados de volume obtidos via: **yfinance**")
+                    st.info(f"📊 Dados de volume obtidos via: **{data_source_label}**")
                     
-                    if volume_data:
-                        # Prepara dados de volume para análise
-                        volume_analysis = []
-                        for ativo_api in df_found['Ativo_API']:
-                            ativo_original = ticker_map_api_to_original.get(ativo_api, ativo_api.replace('.SA', ''))
-                            if ativo_api in volume_data:
-                                vol_data = volume_data[ativo_api]
-                                has_hist = vol_data.get('has_historical', False)
-                                days_analyzed = vol_data.get('days_analyzed', 0)
-                                
-                                # Calcula relação apenas se tiver dados históricos válidos
-                                if has_hist and vol_data['median_volume'] > 0:
-                                    relacao = (vol_data['current_volume'] / vol_data['median_volume'] * 100)
-                                else:
-                                    relacao = 100  # Se não tem histórico, considera 100% (neutro)
-                                
-                                volume_analysis.append({
-                                    'Ativo': ativo_original,
-                                    'Volume Atual': vol_data['current_volume'],
-                                    'Mediana (até 45d)': vol_data['median_volume'],
-                                    'Relação (%)': relacao,
-                                    'Dias Analisados': days_analyzed,
-                                    'Tem Histórico': '✅' if has_hist else '❌'
-                                })
-                        
-                        df_volume = pd.DataFrame(volume_analysis)
+                    if snapshot['volume_data']:
+                        df_volume = analysis.volume
                         
                         if not df_volume.empty:
                             # Métricas de volume
@@ -1062,19 +632,19 @@ with tab2:
                             
                             with col1:
                                 volume_total_atual = df_volume['Volume Atual'].sum()
-                                st.metric("💰 Volume Financeiro Atual", f"R$ {volume_total_atual/1000000:,.1f}M".replace(',', '.'))
+                                st.metric("💰 Volume Financeiro Atual", format_millions(volume_total_atual))
                             
                             with col2:
                                 volume_mediana_total = df_volume['Mediana (até 45d)'].sum()
-                                st.metric("📊 Mediana Financeira", f"R$ {volume_mediana_total/1000000:,.1f}M".replace(',', '.'))
+                                st.metric("📊 Mediana Financeira", format_millions(volume_mediana_total))
                             
                             with col3:
                                 # Apenas para ativos com histórico válido
                                 df_com_historico = df_volume[df_volume['Tem Histórico'] == '✅']
                                 if not df_com_historico.empty:
                                     relacao_media = df_com_historico['Relação (%)'].mean()
-                                    st.metric("📈 Relação Média", f"{relacao_media:.1f}%", 
-                                             delta=f"{relacao_media-100:.1f}% vs mediana")
+                                    st.metric("📈 Relação Média", format_percent(relacao_media), 
+                                             delta=f"{format_percent(relacao_media-100)} vs mediana")
                                 else:
                                     st.metric("📈 Relação Média", "N/A", delta="Sem dados históricos")
                             
@@ -1084,96 +654,62 @@ with tab2:
                             
                             # Tabela de volume
                             st.markdown("### 📋 Detalhamento por Ativo")
+                            st.dataframe(style_table(analysis.display_volume, VOLUME_FORMATS), use_container_width=True, hide_index=True)
                             
-                            # Formatação da tabela de volume
-                            display_volume_df = df_volume.copy()
-                            display_volume_df['Volume Atual'] = display_volume_df['Volume Atual'].apply(lambda x: f"R$ {x/1000000:,.2f}M".replace(',', '.'))
-                            display_volume_df['Mediana (até 45d)'] = display_volume_df['Mediana (até 45d)'].apply(lambda x: f"R$ {x/1000000:,.2f}M".replace(',', '.'))
-                            display_volume_df['Relação (%)'] = display_volume_df['Relação (%)'].apply(lambda x: f"{x:.1f}%")
-                            
-                            # Ordena pela relação percentual
-                            display_volume_df_sorted = display_volume_df.sort_values(by="Relação (%)", ascending=False, key=lambda x: x.str.replace('%', '').astype(float))
-                            st.dataframe(display_volume_df_sorted, use_container_width=True, hide_index=True)
+                            # Parâmetros do cálculo de dias para liquidar posição
+                            with st.expander("⏱️ Parâmetros de Liquidez"):
+                                col1, col2, col3 = st.columns(3)
+                                with col1:
+                                    participation_rate = st.select_slider(
+                                        "Participação no volume diário",
+                                        options=PARTICIPATION_RATES,
+                                        value=DEFAULT_PARTICIPATION,
+                                        format_func=lambda x: f"{x:.0%}",
+                                        key="participation_rate"
+                                    )
+                                with col2:
+                                    # Só janelas cobertas pelo histórico buscado
+                                    windows = available_windows(snapshot['volume_data']) or [DEFAULT_LIQUIDITY_WINDOW]
+                                    liquidity_window = st.selectbox(
+                                        "Janela da mediana (pregões)",
+                                        options=windows,
+                                        index=windows.index(DEFAULT_LIQUIDITY_WINDOW) if DEFAULT_LIQUIDITY_WINDOW in windows else len(windows) - 1,
+                                        key="liquidity_window"
+                                    )
+                                with col3:
+                                    liquidation_target = st.select_slider(
+                                        "Alvo de liquidação",
+                                        options=LIQUIDATION_TARGETS,
+                                        value=1.0,
+                                        format_func=lambda x: f"{x:.0%}",
+                                        key="liquidation_target"
+                                    )
                             
                             # Gráficos de volume financeiro
                             col1, col2 = st.columns(2)
-                            
                             with col1:
-                                # Gráfico de barras - Volume atual vs Mediana
-                                fig_volume_comparison = go.Figure()
-                                
-                                fig_volume_comparison.add_trace(go.Bar(
-                                    name='Volume Atual',
-                                    x=df_volume['Ativo'],
-                                    y=df_volume['Volume Atual']/1000000,  # Em milhões
-                                    marker_color='lightblue'
-                                ))
-                                
-                                fig_volume_comparison.add_trace(go.Bar(
-                                    name='Mediana (45d)',
-                                    x=df_volume['Ativo'],
-                                    y=df_volume['Mediana (até 45d)']/1000000,  # Em milhões
-                                    marker_color='orange'
-                                ))
-                                
-                                fig_volume_comparison.update_layout(
-                                    title='💰 Volume Financeiro: Atual vs Mediana (R$ Milhões)',
-                                    xaxis_title='Ativos',
-                                    yaxis_title='Volume Financeiro (R$ Milhões)',
-                                    barmode='group',
-                                    font=dict(size=10)
-                                )
-                                
-                                st.plotly_chart(fig_volume_comparison, use_container_width=True)
-                            
+                                st.plotly_chart(analysis.figures['volume_comparison'], use_container_width=True)
                             with col2:
-                                # Novo gráfico: Dias para zerar posição
-                                dias_para_zerar = []
-                                for index, row in df_volume.iterrows():
-                                    ativo = row['Ativo']
-                                    volume_mediana = row['Mediana (até 45d)']
-                                    
-                                    # Pega o valor total da posição do ativo
-                                    valor_posicao = df_found[df_found['Ativo'] == ativo]['Valor Total'].iloc[0]
-                                    
-                                    # Calcula 20% da mediana de 45 dias
-                                    volume_mediana_20pct = volume_mediana * 0.20
-                                    
-                                    # Calcula dias para zerar (valor da posição / 20% da mediana)
-                                    if volume_mediana_20pct > 0:
-                                        dias_para_zerar_posicao = valor_posicao / volume_mediana_20pct
-                                    else:
-                                        dias_para_zerar_posicao = float('inf')
-                                    
-                                    dias_para_zerar.append({
-                                        'Ativo': ativo,
-                                        'Dias para Zerar': min(dias_para_zerar_posicao, 999)  # Limita a 999 dias para visualização
-                                    })
-                                
-                                df_dias = pd.DataFrame(dias_para_zerar)
-                                
-                                # Gráfico de barras - Dias para zerar posição
-                                fig_dias = px.bar(
-                                    df_dias,
-                                    x='Ativo',
-                                    y='Dias para Zerar',
-                                    title='⏱️ Dias para Zerar Posição (20% da Mediana)',
-                                    color='Dias para Zerar',
-                                    color_continuous_scale='RdYlBu_r'
-                                )
-                                
-                                fig_dias.update_layout(
-                                    xaxis_title='Ativos',
-                                    yaxis_title='Dias',
-                                    font=dict(size=10),
-                                    showlegend=False
-                                )
-                                
-                                fig_dias.update_traces(
-                                    hovertemplate="<b>%{x}</b><br>Dias para zerar: %{y:.1f}<extra></extra>"
-                                )
-                                
+                                fig_dias = liquidity_figure(analysis.liquidity, liquidity_window, participation_rate, liquidation_target)
                                 st.plotly_chart(fig_dias, use_container_width=True)
+                            
+                            # Liquidez da carteira como um todo (todas as posições vendidas em paralelo)
+                            st.markdown("### ⏱️ Liquidez da Carteira")
+                            book_days = book_liquidation_days(analysis.liquidity, liquidity_window, participation_rate)
+                            liquidity_cols = st.columns(len(book_days))
+                            for col, (target, days) in zip(liquidity_cols, book_days.items()):
+                                with col:
+                                    st.metric(
+                                        f"Dias para liquidar {target:.0%} da carteira",
+                                        format_number(days, 1) if np.isfinite(days) else "∞"
+                                    )
+                            
+                            st.download_button(
+                                "📥 Exportar Tabela de Liquidez (CSV)",
+                                data=analysis.liquidity.to_csv(index=False, sep=';', decimal=',').encode('utf-8-sig'),
+                                file_name="liquidez_carteira.csv",
+                                mime="text/csv"
+                            )
                         else:
                             st.warning("⚠️ Não foi possível processar os dados de volume.")
                     else:
@@ -1184,7 +720,7 @@ with tab2:
                     st.warning(f"Não foi possível obter a cotação para os seguintes ativos:")
                     st.dataframe(df_not_found[['Ativo', 'Quantidade']], use_container_width=True, hide_index=True)
             else:
-                st.error("❌ Não foi possível obter nenhuma cotação via yfinance.")
+                st.error("❌ Não foi possível obter nenhuma cotação. Verifique os tickers ou as fontes selecionadas.")
 
 # Aba 3: Portfólios Salvos
 with tab3:
@@ -1223,6 +759,7 @@ with tab3:
                     df_loaded = pm.load_portfolio(selected_portfolio)
                     if df_loaded is not None:
                         st.session_state.portfolio_df = df_loaded
+                        st.session_state.pop('portfolio_sources', None)
                         st.success(f"✅ Portfólio '{selected_portfolio}' carregado!")
                         st.balloons()
                     else:
@@ -1240,9 +777,13 @@ with tab3:
         # Histórico detalhado
         st.markdown("### 📈 Histórico de Versões")
         
+        # Resumo de todos os portfólios em uma única leitura
+        histories = pm.get_all_portfolio_histories(portfolio_names)
+        
         for portfolio_name in portfolio_names:
-            with st.expander(f"📊 {portfolio_name}", expanded=False):
-                history = pm.get_portfolio_history(portfolio_name)
+            history_expander = st.expander(f"📊 {portfolio_name}", expanded=False, key=f"history_{portfolio_name}", on_change="rerun")
+            with history_expander:
+                history = histories.get(portfolio_name, [])
                 
                 if history:
                     # Métricas do portfólio
@@ -1254,7 +795,7 @@ with tab3:
                     with col2:
                         st.metric("📈 Ativos", latest['assets_count'])
                     with col3:
-                        st.metric("📊 Quantidade", f"{latest['total_quantity']:,}".replace(',', '.'))
+                        st.metric("📊 Quantidade", format_number(latest['total_quantity'], 0))
                     with col4:
                         st.metric("📅 Última Atualização", latest['date'].split(' ')[0])
                     
@@ -1270,25 +811,26 @@ with tab3:
                     
                     st.dataframe(history_df, use_container_width=True, hide_index=True)
                     
+                    # Dados da última versão: lidos só com o expander aberto
+                    if history_expander.open:
+                        df_view = pm.load_portfolio_version(portfolio_name, latest['version'])
+                        if df_view is not None:
+                            st.markdown(f"#### 📊 Dados de '{portfolio_name}' (versão {latest['version']}):")
+                            st.dataframe(df_view, use_container_width=True, hide_index=True)
+                    
                     # Botões de ação
-                    col1, col2, col3 = st.columns(3)
+                    col1, col2 = st.columns(2)
                     
                     with col1:
                         if st.button(f"📂 Carregar {portfolio_name}", key=f"load_{portfolio_name}"):
                             df_loaded = pm.load_portfolio(portfolio_name)
                             if df_loaded is not None:
                                 st.session_state.portfolio_df = df_loaded
+                                st.session_state.pop('portfolio_sources', None)
                                 st.success(f"✅ '{portfolio_name}' carregado!")
                                 st.rerun()
                     
                     with col2:
-                        if st.button(f"📋 Ver Dados", key=f"view_{portfolio_name}"):
-                            df_view = pm.load_portfolio(portfolio_name)
-                            if df_view is not None:
-                                st.markdown(f"#### 📊 Dados de '{portfolio_name}':")
-                                st.dataframe(df_view, use_container_width=True, hide_index=True)
-                    
-                    with col3:
                         if len(history) > 1:
                             if st.button(f"🔍 Comparar Versões", key=f"compare_{portfolio_name}"):
                                 st.markdown(f"#### 🔍 Comparação de Versões - {portfolio_name}")
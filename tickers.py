@@ -0,0 +1,91 @@
+import streamlit as st
+import pandas as pd
+import threading
+from history_store import get_history_store
+from index_compositions import get_composition_store
+
+# Sufixo dos ativos da B3 nas APIs e formato dos códigos (4 caracteres + 1 ou 2 dígitos)
+B3_SUFFIX = ".SA"
+B3_TICKER_PATTERN = r'[A-Z0-9]{4}\d{1,2}'
+FRACTIONAL_PATTERN = r'^([A-Z0-9]{4}\d{1,2})F$'  # Mercado fracionário: PETR4F -> PETR4
+
+# Situação de cada ticker antes da busca
+STATUS_KNOWN = "conhecido"
+STATUS_UNVERIFIED = "não verificado"
+STATUS_INVALID = "inválido"
+
+
+def normalize_tickers(tickers):
+    """
+    Padroniza os códigos de ativos: maiúsculas, sem espaços, sem o sufixo .SA e
+    com tickers do mercado fracionário convertidos para o lote padrão.
+    Recebe e retorna uma Series (mantendo o índice).
+    """
+    return (
+        pd.Series(tickers, dtype=object).astype(str)
+        .str.upper()
+        .str.replace(r'\s+', '', regex=True)
+        .str.replace(r'\.SA$', '', regex=True)
+        .str.replace(FRACTIONAL_PATTERN, r'\1', regex=True)
+    )
+
+
+def load_composition_symbols():
+    """
+    Símbolos presentes em todas as composições de índices salvas (ver index_compositions).
+    """
+    return set(normalize_tickers(sorted(get_composition_store().all_tickers())))
+
+
+class TickerIndex:
+    """
+    Índice de símbolos conhecidos da B3, usado para validar tickers antes de
+    qualquer chamada de rede. Cresce com os tickers encontrados nas buscas.
+    """
+
+    def __init__(self, symbols=()):
+        self.symbols = set(symbols)
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def __contains__(self, ticker):
+        return ticker in self.symbols
+
+    def add(self, tickers):
+        """
+        Registra tickers encontrados (com ou sem o sufixo .SA).
+        """
+        tickers = list(tickers)
+        if not tickers:
+            return
+        normalized = set(normalize_tickers(tickers))
+        with self.lock:
+            self.symbols.update(normalized)
+
+    def classify(self, tickers):
+        """
+        Situação de cada ticker já normalizado: conhecido, não verificado (formato
+        válido, mas fora do índice) ou inválido (formato que não existe na B3).
+        Retorna uma Series com o mesmo índice.
+        """
+        tickers = pd.Series(tickers, dtype=object).astype(str)
+        with self.lock:
+            known = tickers.isin(self.symbols)
+        valid = tickers.str.fullmatch(B3_TICKER_PATTERN)
+        status = pd.Series(STATUS_UNVERIFIED, index=tickers.index)
+        status[known] = STATUS_KNOWN
+        status[~valid & ~known] = STATUS_INVALID
+        return status
+
+
+@st.cache_resource
+def get_ticker_index():
+    """
+    Índice de símbolos compartilhado entre sessões, criado a partir das composições
+    de índices e dos tickers com histórico salvo (buscas anteriores).
+    """
+    symbols = load_composition_symbols()
+    symbols.update(normalize_tickers(get_history_store().known_tickers()))
+    return TickerIndex(symbols)
@@ -0,0 +1,88 @@
+import math
+import numpy as np
+import warnings
+
+# Janelas (em pregões) para as medianas de volume financeiro
+VOLUME_WINDOWS = (5, 20, 45, 90)
+MIN_HISTORICAL_DAYS = 10
+
+# Fração mínima da janela com dias válidos para a mediana da janela ser exibida
+MIN_WINDOW_COVERAGE = 0.8
+
+
+def min_window_days(window):
+    """
+    Dias válidos necessários para considerar a mediana de uma janela: ao menos
+    MIN_WINDOW_COVERAGE da janela (um histórico de 40 pregões não tem mediana de 90).
+    """
+    return max(min(MIN_HISTORICAL_DAYS, window), math.ceil(window * MIN_WINDOW_COVERAGE))
+
+
+def stack_histories(histories, tickers=None):
+    """
+    Empilha os históricos diários em matrizes (ativos × dias) de fechamento e volume.
+    Cada linha é alinhada à direita (último pregão na última coluna) e completada
+    com NaN à esquerda, de modo que as últimas N colunas equivalem ao tail(N) de cada ativo.
+    Retorna (tickers, close, volume).
+    """
+    if tickers is None:
+        tickers = list(histories)
+    histories = {
+        t: histories[t].dropna(subset=['Close'])
+        for t in tickers if histories.get(t) is not None and not histories[t].empty
+    }
+    tickers = [t for t in tickers if t in histories and not histories[t].empty]
+
+    n_days = max((len(histories[t]) for t in tickers), default=0)
+    close = np.full((len(tickers), n_days), np.nan)
+    volume = np.full((len(tickers), n_days), np.nan)
+    for i, ticker in enumerate(tickers):
+        hist_data = histories[ticker]
+        size = len(hist_data)
+        close[i, n_days - size:] = hist_data['Close'].to_numpy(dtype=float, na_value=np.nan)
+        volume[i, n_days - size:] = hist_data['Volume'].to_numpy(dtype=float, na_value=np.nan)
+    return tickers, close, volume
+
+
+def compute_volume_stats(close, volume, windows=VOLUME_WINDOWS, current_volume=None):
+    """
+    Calcula, de uma vez para todos os ativos, o volume financeiro diário e,
+    para cada janela, a mediana dos dias válidos (volume e preço positivos),
+    o número de dias válidos e a relação volume atual / mediana (%).
+    A relação só é calculada com ao menos min(10, janela) dias válidos; senão vale 100%.
+    current_volume (R$) substitui o volume financeiro do último pregão quando informado.
+    Retorna um dicionário de arrays.
+    """
+    financial = close * volume
+    valid = (close > 0) & (volume > 0) & np.isfinite(financial)
+    financial_masked = np.where(valid, financial, np.nan)
+
+    n_tickers, n_days = financial.shape
+    current_price = close[:, -1] if n_days else np.full(n_tickers, np.nan)
+    if current_volume is None:
+        current_volume = financial[:, -1] if n_days else np.full(n_tickers, np.nan)
+    current_volume = np.asarray(current_volume, dtype=float)
+
+    medians = {}
+    days = {}
+    ratios = {}
+    for window in windows:
+        window_values = financial_masked[:, -window:] if n_days else financial_masked
+        days[window] = valid[:, -window:].sum(axis=1) if n_days else np.zeros(n_tickers, dtype=int)
+        with warnings.catch_warnings():
+            # Linhas sem nenhum dia válido geram NaN, tratado abaixo
+            warnings.simplefilter("ignore", RuntimeWarning)
+            medians[window] = np.nanmedian(window_values, axis=1) if n_days else np.full(n_tickers, np.nan)
+        usable = (days[window] >= min(MIN_HISTORICAL_DAYS, window)) & (medians[window] > 0)
+        ratios[window] = np.full(n_tickers, 100.0)  # Sem histórico, considera 100% (neutro)
+        np.divide(current_volume * 100, medians[window], out=ratios[window], where=usable)
+
+    return {
+        'financial': financial_masked,
+        'valid': valid,
+        'current_price': current_price,
+        'current_volume': current_volume,
+        'median': medians,
+        'days': days,
+        'ratio': ratios,
+    }